@@ -0,0 +1,399 @@
+"""
+扫描性能基准：在本机回环地址上搭建模拟网络，测量各扫描阶段的速度、准确率和资源占用，并与保存的基线比较。
+
+    python benchmarks/scan.py                          # 默认 1024 台主机、每项 3 次，结果写入 benchmarks/last_run.json
+    python benchmarks/scan.py --hosts 4096 --open-ratio 0.05 --filtered-ratio 0.01 --runs 3
+    python benchmarks/scan.py --save-baseline          # 把本次结果保存为 benchmarks/baseline.json
+    python benchmarks/scan.py --only port_scan --only service
+
+模拟网络（127.77.0.0 起的连续地址，Linux 上整个 127.0.0.0/8 都路由到回环网卡）：
+- 每个 (主机, 端口) 按 --open-ratio / --filtered-ratio 随机为开放、过滤或关闭，随机种子固定，结果可复现；
+- 开放端口是真实的监听套接字，2222 端口发送 SSH banner，8080 端口回应 HTTP，9000 端口不发送任何数据；
+- 过滤端口是 backlog 已占满的监听套接字，内核丢弃新的 SYN，效果与防火墙丢包相同（需要 Linux）；
+- 关闭端口没有监听，内核直接回 RST；9999 端口始终关闭。
+--latency / --loss 通过 tc netem 作用于回环网卡（需要 Linux 和 root 权限）；不可用时只在服务回应前加入延迟，
+并在结果中记录 netem 未生效。
+
+测量项（每项在全新的子进程中运行，峰值内存和线程数互不影响）：
+- discovery：scan_subnet（TCP Ping）
+- port_scan：scan_port（connect 引擎）
+- service：identify_services，对模拟网络中的全部开放端口
+- os_fingerprint：probe_os（需要原始套接字权限，没有权限时跳过）
+结果中速度类指标下降、准确率下降或峰值内存增长超过容差即视为回归，返回非零退出码。
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "last_run.json")
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+BASE_ADDRESS = "127.77.0.1"
+# 模拟服务：端口 -> 期望识别出的服务名（None 表示不发送数据）
+SIM_SERVICES = {2222: "SSH", 8080: "HTTP", 9000: None}
+CLOSED_PORT = 9999
+SSH_BANNER = b"SSH-2.0-OpenSSH_8.9p1 Ubuntu-3ubuntu0.6\r\n"
+HTTP_RESPONSE = b"HTTP/1.1 200 OK\r\nServer: nginx/1.18.0\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+OS_SAMPLE = 16             # os_fingerprint 测量的主机数
+
+CASES = ["discovery", "port_scan", "service", "os_fingerprint"]
+
+# 回归判定：(指标, 方向, 容差)。方向 1 表示越大越好
+REGRESSION_RULES = [
+    ("hosts_per_s", 1, 0.20),
+    ("probes_per_s", 1, 0.20),
+    ("accuracy", 1, 0.01),
+    ("peak_rss_mb", -1, 0.25),
+]
+
+DEFAULT_CONFIG = {
+    "hosts": 1024,
+    "open_ratio": 0.10,
+    "filtered_ratio": 0.02,
+    "latency_ms": 0.0,
+    "loss": 0.0,
+    "seed": 1,
+}
+
+
+def _ip(index: int) -> str:
+    base = int.from_bytes(socket.inet_aton(BASE_ADDRESS), "big")
+    return socket.inet_ntoa((base + index).to_bytes(4, "big"))
+
+
+def build_layout(config: dict) -> dict:
+    """按配置和随机种子生成每台主机各端口的状态：{"ip:port": "open" / "filtered"}，其余为关闭"""
+    rng = random.Random(config["seed"])
+    states = {}
+    for index in range(config["hosts"]):
+        for port in SIM_SERVICES:
+            roll = rng.random()
+            if roll < config["open_ratio"]:
+                states[f"{_ip(index)}:{port}"] = "open"
+            elif roll < config["open_ratio"] + config["filtered_ratio"]:
+                states[f"{_ip(index)}:{port}"] = "filtered"
+    return states
+
+
+def target_of(config: dict) -> str:
+    return f"{_ip(0)}-{_ip(config['hosts'] - 1)}"
+
+
+class SimulatedNetwork:
+    """在回环地址上按布局创建监听套接字，模拟服务在后台事件循环中应答"""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.layout = build_layout(config)
+        self.netem = False
+        self._sockets = []
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        _raise_fd_limit(len(self.layout) * 2 + 1024)
+        servers = []
+        for address, state in self.layout.items():
+            ip, port = address.rsplit(":", 1)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((ip, int(port)))
+            if state == "filtered":
+                # backlog 为 0 时内核只接受一个未 accept 的连接，占满后新的 SYN 被丢弃
+                sock.listen(0)
+                filler = socket.create_connection((ip, int(port)))
+                self._sockets.append(filler)
+            else:
+                sock.listen(128)
+                servers.append((sock, SIM_SERVICES[int(port)]))
+            self._sockets.append(sock)
+        self._thread.start()
+        for sock, service in servers:
+            asyncio.run_coroutine_threadsafe(self._serve(sock, service), self._loop).result()
+        self.netem = _apply_netem(self.config["latency_ms"], self.config["loss"])
+        return self
+
+    def __exit__(self, *exc):
+        if self.netem:
+            _clear_netem()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=2.0)
+        for sock in self._sockets:
+            sock.close()
+
+    async def _serve(self, sock, service):
+        delay = self.config["latency_ms"] / 1000 if not self.netem else 0.0
+
+        async def handle(reader, writer):
+            try:
+                if service == "SSH":
+                    await asyncio.sleep(delay)
+                    writer.write(SSH_BANNER)
+                elif service == "HTTP":
+                    if await reader.read(4096):
+                        await asyncio.sleep(delay)
+                        writer.write(HTTP_RESPONSE)
+                else:
+                    await reader.read(4096)
+                await writer.drain()
+            except OSError:
+                pass
+            finally:
+                writer.close()
+
+        await asyncio.start_server(handle, sock=sock)
+
+
+def _raise_fd_limit(needed: int):
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(needed, soft)), hard))
+
+
+def _apply_netem(latency_ms: float, loss: float) -> bool:
+    if not latency_ms and not loss:
+        return False
+    if sys.platform != "linux" or not shutil.which("tc") or os.geteuid() != 0:
+        print("⚠️ netem 不可用（需要 Linux、tc 和 root 权限），延迟只作用于服务回应，丢包不生效", file=sys.stderr)
+        return False
+    command = ["tc", "qdisc", "add", "dev", "lo", "root", "netem"]
+    if latency_ms:
+        command += ["delay", f"{latency_ms}ms"]
+    if loss:
+        command += ["loss", f"{loss * 100}%"]
+    proc = subprocess.run(command, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(f"⚠️ netem 设置失败：{proc.stderr.strip()}，延迟只作用于服务回应，丢包不生效", file=sys.stderr)
+        return False
+    return True
+
+
+def _clear_netem():
+    subprocess.run(["tc", "qdisc", "del", "dev", "lo", "root"], capture_output=True)
+
+
+# ---- 子进程中运行的测量 ----
+
+class _ResourceSampler:
+    """后台采样线程数峰值；峰值内存取自 getrusage"""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_threads = max(self.peak_threads, _thread_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _thread_count() -> int:
+    # Linux 上统计包括事件循环执行器等在内的全部系统线程，其他平台只能统计 Python 线程
+    try:
+        return len(os.listdir("/proc/self/task"))
+    except OSError:
+        return threading.active_count()
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _score(found: set, truth: set) -> dict:
+    hits = len(found & truth)
+    precision = hits / len(found) if found else 1.0
+    recall = hits / len(truth) if truth else 1.0
+    return {"precision": round(precision, 4), "recall": round(recall, 4),
+            "accuracy": round(min(precision, recall), 4)}
+
+
+def run_case(case: str, config: dict) -> dict:
+    """在子进程中运行一项测量，返回指标"""
+    layout = build_layout(config)
+    open_ports = {address for address, state in layout.items() if state == "open"}
+    ports = list(SIM_SERVICES) + [CLOSED_PORT]
+    target = target_of(config)
+    hosts = config["hosts"]
+
+    with _ResourceSampler() as sampler:
+        started = time.perf_counter()
+        if case == "discovery":
+            from core.discovery import scan_subnet
+            results = scan_subnet(target, method="tcp", ports=ports)
+            elapsed = time.perf_counter() - started
+            # 回环地址上每台主机都在线（关闭端口回 RST）
+            metrics = _score({r["ip"] for r in results if r["status"] == "UP"}, {_ip(i) for i in range(hosts)})
+            metrics.update(hosts_per_s=hosts / elapsed, probes_per_s=hosts / elapsed)
+        elif case == "port_scan":
+            from core.port_scanner import scan_port
+            results = scan_port(target, ports=ports)
+            elapsed = time.perf_counter() - started
+            metrics = _score({f"{r['ip']}:{port}" for r in results for port in r["open_ports"]}, open_ports)
+            metrics.update(hosts_per_s=hosts / elapsed, probes_per_s=hosts * len(ports) / elapsed)
+        elif case == "service":
+            from core.service_probe import identify_services
+            targets = sorted((address.rsplit(":", 1)[0], int(address.rsplit(":", 1)[1])) for address in open_ports)
+            matches = identify_services(targets, use_cache=False)
+            elapsed = time.perf_counter() - started
+            expected = [(key, SIM_SERVICES[key[1]]) for key in targets if SIM_SERVICES[key[1]]]
+            correct = sum(1 for key, name in expected if matches.get(key) and matches[key].name == name)
+            metrics = {"accuracy": round(correct / len(expected), 4) if expected else 1.0,
+                       "hosts_per_s": len({ip for ip, _ in targets}) / elapsed,
+                       "probes_per_s": len(targets) / elapsed}
+        elif case == "os_fingerprint":
+            from core.os_fingerprint import UNKNOWN_OS, probe_os
+            sample = sorted({address.rsplit(":", 1)[0] for address in open_ports})[:OS_SAMPLE] or [_ip(0)]
+            try:
+                names = [probe_os(ip, ports=ports) for ip in sample]
+            except PermissionError:
+                return {"skipped": "需要原始套接字权限"}
+            elapsed = time.perf_counter() - started
+            identified = sum(1 for name in names if name != UNKNOWN_OS)
+            metrics = {"identified": round(identified / len(names), 4), "results": sorted(set(names)),
+                       "hosts_per_s": len(names) / elapsed, "probes_per_s": len(names) * len(ports) / elapsed}
+        else:
+            raise ValueError(case)
+    metrics.update(elapsed=elapsed, peak_rss_mb=_peak_rss_mb(), peak_threads=sampler.peak_threads)
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in metrics.items()}
+
+
+def measure(case: str, config: dict) -> dict:
+    """在临时工作目录中用子进程运行一项测量，避免写入仓库的 data/ 目录"""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    with tempfile.TemporaryDirectory() as cwd:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", case, json.dumps(config)],
+                              cwd=cwd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": (proc.stderr.strip().splitlines() or ["?"])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _median_run(runs: list) -> dict:
+    """多次运行取各数值指标的中位数"""
+    ok = [run for run in runs if "error" not in run and "skipped" not in run]
+    if not ok:
+        return runs[0]
+    merged = dict(ok[0])
+    for key, value in ok[0].items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            values = [run[key] for run in ok if run.get(key) is not None]
+            merged[key] = round(statistics.median(values), 3) if values else None
+    return merged
+
+
+def compare(current: dict, baseline: dict) -> list:
+    """返回回归列表 [(测量项, 指标, 基线值, 当前值)]"""
+    if baseline.get("config") != current["config"]:
+        print("⚠️ 基线的模拟网络配置与本次不同，跳过比较")
+        return []
+    regressions = []
+    for case, metrics in current["cases"].items():
+        base = baseline.get("cases", {}).get(case)
+        if not base or "error" in base or "skipped" in base or "error" in metrics or "skipped" in metrics:
+            continue
+        for key, direction, tolerance in REGRESSION_RULES:
+            old, new = base.get(key), metrics.get(key)
+            if old is None or new is None:
+                continue
+            if key == "accuracy":
+                worse = old - new > tolerance
+            else:
+                worse = (new < old * (1 - tolerance)) if direction > 0 else (new > old * (1 + tolerance))
+            if worse:
+                regressions.append((case, key, old, new))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=DEFAULT_CONFIG["hosts"])
+    parser.add_argument("--open-ratio", type=float, default=DEFAULT_CONFIG["open_ratio"])
+    parser.add_argument("--filtered-ratio", type=float, default=DEFAULT_CONFIG["filtered_ratio"])
+    parser.add_argument("--latency", type=float, default=DEFAULT_CONFIG["latency_ms"], help="单向延迟（毫秒）")
+    parser.add_argument("--loss", type=float, default=DEFAULT_CONFIG["loss"], help="丢包率，如 0.01")
+    parser.add_argument("--seed", type=int, default=DEFAULT_CONFIG["seed"])
+    parser.add_argument("--runs", type=int, default=3, help="每项运行次数，取中位数")
+    parser.add_argument("--only", choices=CASES, action="append", help="只测量指定项")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="结果文件（JSON）")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="用于比较的基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--child", nargs=2, metavar=("CASE", "CONFIG"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_case(args.child[0], json.loads(args.child[1])), ensure_ascii=False))
+        return 0
+
+    config = {"hosts": args.hosts, "open_ratio": args.open_ratio, "filtered_ratio": args.filtered_ratio,
+              "latency_ms": args.latency, "loss": args.loss, "seed": args.seed}
+    report = {"config": config, "created": time.time(),
+              "environment": {"platform": platform.platform(), "python": platform.python_version(),
+                              "cpus": os.cpu_count()},
+              "cases": {}}
+    with SimulatedNetwork(config) as network:
+        report["environment"]["netem"] = network.netem
+        states = list(network.layout.values())
+        print(f"模拟网络：{config['hosts']} 台主机，{states.count('open')} 个开放端口，"
+              f"{states.count('filtered')} 个过滤端口")
+        for case in args.only or CASES:
+            result = _median_run([measure(case, config) for _ in range(args.runs)])
+            report["cases"][case] = result
+            if "error" in result or "skipped" in result:
+                print(f"{case:15s} 跳过：{result.get('error') or result.get('skipped')}")
+                continue
+            quality = result.get("accuracy", result.get("identified"))
+            print(f"{case:15s} {result['elapsed']:7.2f} s  {result['hosts_per_s']:9.1f} 主机/s  "
+                  f"{result['probes_per_s']:9.1f} 探测/s  准确率 {quality:.3f}  "
+                  f"内存 {result['peak_rss_mb']} MB  线程 {result['peak_threads']}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"已保存基线 {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("没有基线，跳过比较（使用 --save-baseline 保存）")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        regressions = compare(report, json.load(f))
+    for case, key, old, new in regressions:
+        print(f"❗ 回归：{case} {key} {old} -> {new}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+启动时间基准：在全新的子进程中测量各入口的启动耗时，超过预算或提前加载了重量级依赖时返回非零退出码。
+
+    python benchmarks/startup.py            # 每项运行 5 次取中位数
+    python benchmarks/startup.py --runs 10
+
+测量项：
+- cli_import：导入命令行入口 core.cli
+- gui_import：导入 ui.main_window
+- window_shown：创建 QApplication 和主窗口并显示（使用 offscreen 平台，无需显示器）
+scapy、networkx、matplotlib 只应在用到对应功能时加载，启动阶段出现在 sys.modules 中即视为回归。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 各测量项的时间预算（秒，含解释器启动）
+BUDGETS = {
+    "cli_import": 0.5,
+    "gui_import": 0.8,
+    "window_shown": 0.9,
+}
+
+HEAVY_MODULES = ["scapy", "networkx", "matplotlib"]
+
+_REPORT = (
+    "import json, sys\n"
+    f"print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))\n"
+)
+
+SNIPPETS = {
+    "cli_import": "import core.cli\n",
+    "gui_import": "import ui.main_window\n",
+    "window_shown": (
+        "from PyQt5.QtWidgets import QApplication\n"
+        "from ui.main_window import MainWindow\n"
+        "app = QApplication(sys.argv)\n"
+        "window = MainWindow()\n"
+        "window.show()\n"
+        "app.processEvents()\n"
+    ),
+}
+
+
+def measure(name: str) -> dict:
+    """在临时工作目录中运行一次测量，避免写入仓库的 data/ 目录"""
+    env = dict(os.environ, PYTHONPATH=ROOT, QT_QPA_PLATFORM="offscreen")
+    code = "import sys\n" + SNIPPETS[name] + _REPORT
+    with tempfile.TemporaryDirectory() as cwd:
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        return {"elapsed": elapsed, "heavy": [], "error": proc.stderr.strip().splitlines()[-1:]}
+    return {"elapsed": elapsed, "heavy": json.loads(proc.stdout.strip().splitlines()[-1])}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--only", choices=list(SNIPPETS), action="append", help="只测量指定项")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name in args.only or SNIPPETS:
+        runs = [measure(name) for _ in range(args.runs)]
+        errors = [run["error"] for run in runs if "error" in run]
+        if errors:
+            print(f"{name:14s} 跳过：{errors[0]}")
+            continue
+        median = statistics.median(run["elapsed"] for run in runs)
+        heavy = sorted(set(module for run in runs for module in run["heavy"]))
+        over = median > BUDGETS[name]
+        status = "超出预算" if over else "通过"
+        if heavy:
+            status += f"，启动时加载了 {', '.join(heavy)}"
+        print(f"{name:14s} {median * 1000:7.1f} ms / 预算 {BUDGETS[name] * 1000:.0f} ms  {status}")
+        failed |= over or bool(heavy)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+"""
+基于 asyncio 的 TCP connect 扫描引擎。
+
+单个事件循环 + 非阻塞 socket，所有 (ip, port) 探测共享一个全局并发上限，
+取代 "线程池套线程池" 的旧实现，避免大网段扫描时创建上万个系统线程。
+"""
+import asyncio
+import errno
+import socket
+import struct
+import sys
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from core import metrics
+from core.ratelimit import DROP, NEUTRAL, REPLY, get_rate_limiter
+from core.timing import TimingEngine, get_timing
+
+OPEN = "open"
+CLOSED = "closed"
+FILTERED = "filtered"
+
+DEFAULT_CONCURRENCY = 1000
+DEFAULT_HOSTGROUP = 64
+
+# 关闭已建立的连接时直接发送 RST，避免本地堆积 TIME_WAIT 占满临时端口
+_LINGER_RST = struct.pack("ii", 1, 0)
+
+# 热路径上直接使用的指标取值对象
+_SENT = metrics.PROBES_SENT.labels("connect")
+_REPLIES = metrics.REPLIES.labels("connect")
+_RETRIES = metrics.RETRIES.labels("connect")
+_TIMEOUTS = metrics.TIMEOUTS.labels("connect")
+_RTT = metrics.STAGE_SECONDS.labels("connect")
+_PING_SENT = metrics.PROBES_SENT.labels("tcp_ping")
+_PING_REPLIES = metrics.REPLIES.labels("tcp_ping")
+_PING_RTT = metrics.STAGE_SECONDS.labels("tcp_ping")
+_SOCKETS = metrics.OPEN_SOCKETS.labels()
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+
+def raise_nofile_limit(wanted: int) -> int:
+    """尽量把进程可打开的文件描述符上限提高到 wanted，返回实际可用的上限"""
+    if resource is None:
+        return wanted
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY:
+        wanted = min(wanted, hard)
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+            soft = wanted
+        except (ValueError, OSError):
+            pass
+    return soft if soft != resource.RLIM_INFINITY else wanted
+
+
+def _errno_to_state(err: int) -> str:
+    if err == 0:
+        return OPEN
+    if err == errno.ECONNREFUSED:
+        # 对端回复 RST：主机在线但端口关闭
+        return CLOSED
+    # 主机/网络不可达等其余错误统一视为过滤
+    metrics.record_error("connect", err)
+    return FILTERED
+
+
+def _close(sock: socket.socket, state: str):
+    if state == OPEN:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RST)
+        except OSError:
+            pass
+    sock.close()
+    _SOCKETS.dec()
+
+
+def _open_socket() -> Optional[socket.socket]:
+    """创建非阻塞套接字；文件描述符耗尽（EMFILE）等错误时返回 None，探测按过滤处理"""
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    except OSError as e:
+        metrics.record_error("connect", e.errno or 0)
+        return None
+    _SOCKETS.inc()
+    sock.setblocking(False)
+    return sock
+
+
+async def _probe_selector(loop, ip: str, port: int, timeout: float) -> str:
+    """Selector 事件循环下的探测：connect_ex + add_writer，无需为每个探测创建 Task"""
+    sock = _open_socket()
+    if sock is None:
+        return FILTERED
+    fd = sock.fileno()
+    state = FILTERED
+    try:
+        try:
+            err = sock.connect_ex((ip, port))
+        except OSError as e:
+            # 主机名无法解析（socket.gaierror）等：与不可达一样视为过滤
+            metrics.record_error("connect", e.errno or 0)
+            return state
+        if err not in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN, 0):
+            state = _errno_to_state(err)
+            return state
+        if err == 0:
+            state = OPEN
+            return state
+
+        waiter = loop.create_future()
+
+        def on_writable():
+            if not waiter.done():
+                waiter.set_result(sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR))
+
+        def on_timeout():
+            if not waiter.done():
+                waiter.set_result(None)
+
+        loop.add_writer(fd, on_writable)
+        timer = loop.call_later(timeout, on_timeout)
+        try:
+            result = await waiter
+        finally:
+            timer.cancel()
+            loop.remove_writer(fd)
+        if result is None:
+            _TIMEOUTS.inc()
+            state = FILTERED
+        else:
+            state = _errno_to_state(result)
+        return state
+    finally:
+        _close(sock, state)
+
+
+async def _probe_proactor(loop, ip: str, port: int, timeout: float) -> str:
+    """Proactor 事件循环（Windows）不支持 add_writer，退回 sock_connect"""
+    sock = _open_socket()
+    if sock is None:
+        return FILTERED
+    state = FILTERED
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout)
+        state = OPEN
+    except asyncio.TimeoutError:
+        _TIMEOUTS.inc()
+        state = FILTERED
+    except ConnectionRefusedError:
+        state = CLOSED
+    except OSError as e:
+        metrics.record_error("connect", e.errno or 0)
+        state = FILTERED
+    finally:
+        _close(sock, state)
+    return state
+
+
+def _select_probe(loop):
+    if hasattr(loop, "add_writer") and not sys.platform.startswith("win"):
+        return _probe_selector
+    return _probe_proactor
+
+
+async def probe_port(ip: str, port: int, timeout: float = 1.0) -> str:
+    """异步探测单个端口，返回 open / closed / filtered"""
+    loop = asyncio.get_running_loop()
+    return await _select_probe(loop)(loop, ip, port, timeout)
+
+
+def resolve_timing(timing=None, timeout: Optional[float] = None) -> TimingEngine:
+    """timing 可为 TimingEngine、模板名（T0 ~ T5）或 None；给出 timeout 时使用固定超时"""
+    if isinstance(timing, TimingEngine):
+        return timing
+    return get_timing(timing, timeout)
+
+
+async def run_probes(
+    pairs: Iterator[Tuple[str, int]],
+    timing: TimingEngine,
+    concurrency: int,
+    on_probe: Callable[[str, int, str], None],
+    max_retries: Optional[int] = None,
+):
+    """
+    以固定数量的 worker 协程消费 (ip, port) 迭代器。
+    worker 数即全局并发上限，探测任务按需从迭代器中拉取，不会一次性创建。
+    每个探测的超时由 timing 按主机 RTT 估计给出，超时的探测按模板上限（或 max_retries）重传。
+    发送前向全局限速器申请令牌，结束后按是否回应反馈给拥塞控制。
+    """
+    loop = asyncio.get_running_loop()
+    probe = _select_probe(loop)
+    limiter = get_rate_limiter()
+    scan_delay = timing.template.scan_delay
+    if scan_delay:
+        concurrency = 1  # 模板要求探测间隔时串行发送
+
+    async def worker():
+        for ip, port in pairs:
+            retries = 0
+            while True:
+                await limiter.acquire_async()
+                started = loop.time()
+                _SENT.inc()
+                state = await probe(loop, ip, port, timing.timeout(ip))
+                if state != FILTERED:
+                    limiter.release(REPLY)
+                    rtt = loop.time() - started
+                    timing.record_rtt(ip, rtt, retries)
+                    _REPLIES.inc()
+                    _RTT.observe(rtt)
+                    break
+                limiter.release(DROP if timing.is_responsive(ip) else NEUTRAL)
+                if not timing.should_retry(ip, retries, max_retries):
+                    break
+                retries += 1
+                _RETRIES.inc()
+            on_probe(ip, port, state)
+            if scan_delay:
+                await asyncio.sleep(scan_delay)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def tcp_ping_host(ip: str, ports: List[int], timeout: float = 1.0) -> bool:
+    """
+    同时向 ports 中的所有端口发起连接，收到第一个 SYN-ACK 或 RST 即判定主机在线，
+    并取消其余仍在等待的探测。
+    """
+    loop = asyncio.get_running_loop()
+    probe = _select_probe(loop)
+    tasks = {asyncio.ensure_future(probe(loop, ip, port, timeout)) for port in ports}
+    try:
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            if any(task.result() in (OPEN, CLOSED) for task in done):
+                return True
+        return False
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+
+
+def tcp_ping_sweep(
+    ip_list: Iterable[str],
+    ports: List[int],
+    timeout: Optional[float] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    on_result: Optional[Callable[[Dict[str, str]], None]] = None,
+    progress=None,
+    timing=None,
+) -> List[Dict[str, str]]:
+    """
+    在单个事件循环中对多台主机做 TCP Ping。
+    每台主机占用 len(ports) 个并发探测，总并发不超过 concurrency。
+    超时按同子网已在线主机的 RTT 自适应（timeout 给定时固定）。
+    :return: [{"ip": "192.168.1.1", "status": "UP"}, ...]
+    """
+    timing = resolve_timing(timing, timeout)
+    ports = list(ports)
+    if not ports:
+        raise ValueError("TCP Ping 至少需要一个端口")
+    concurrency = max(1, min(concurrency, raise_nofile_limit(concurrency + 256) - 256))
+    results = []
+    targets = iter(ip_list)
+    limiter = get_rate_limiter()
+
+    async def worker():
+        loop = asyncio.get_running_loop()
+        for ip in targets:
+            await limiter.acquire_async(len(ports))
+            started = loop.time()
+            _PING_SENT.inc(len(ports))
+            alive = await tcp_ping_host(ip, ports, timing.timeout(ip))
+            limiter.release(REPLY if alive else NEUTRAL, len(ports))
+            if alive:
+                rtt = loop.time() - started
+                timing.record_rtt(ip, rtt)
+                _PING_REPLIES.inc()
+                _PING_RTT.observe(rtt)
+            result = {"ip": ip, "status": "UP" if alive else "DOWN"}
+            results.append(result)
+            if progress:
+                progress.advance()
+            if on_result:
+                on_result(result)
+
+    async def main():
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency // len(ports)))))
+
+    asyncio.run(main())
+    return results
+
+
+class HostAggregator:
+    """
+    把逐个 (ip, port) 的探测结果汇总成每台主机一条结果。
+    目标按 hostgroup 分组、组内按端口交错生成，只有组内主机的状态驻留内存。
+    """
+
+    def __init__(self, ports: Iterable[int], hostgroup: int = DEFAULT_HOSTGROUP,
+                 on_result: Optional[Callable[[Dict[str, object]], None]] = None, progress=None):
+        self.ports = list(ports)
+        self.hostgroup = hostgroup
+        self.on_result = on_result
+        self.progress = progress
+        self.results: List[Dict[str, object]] = []
+        self._pending: Dict[str, int] = {}
+        self._open: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def pairs(self, ip_list: Iterable[str]) -> Iterator[Tuple[str, int]]:
+        group = []
+        for ip in ip_list:
+            group.append(ip)
+            if len(group) >= self.hostgroup:
+                yield from self._interleave(group)
+                group = []
+        if group:
+            yield from self._interleave(group)
+
+    def _interleave(self, group):
+        for ip in group:
+            with self._lock:
+                self._pending[ip] = len(self.ports)
+                self._open[ip] = []
+            if not self.ports:
+                self._finish(ip)
+        for port in self.ports:
+            for ip in group:
+                yield ip, port
+
+    def record(self, ip: str, port: int, state: str):
+        with self._lock:
+            if ip not in self._pending:
+                return
+            if state == OPEN:
+                self._open[ip].append(port)
+            self._pending[ip] -= 1
+            done = self._pending[ip] == 0
+        if self.progress:
+            self.progress.advance()
+        if done:
+            self._finish(ip)
+
+    def _finish(self, ip):
+        with self._lock:
+            del self._pending[ip]
+            result = {"ip": ip, "open_ports": sorted(self._open.pop(ip))}
+            self.results.append(result)
+        if self.on_result:
+            self.on_result(result)
+
+
+def connect_scan(
+    ip_list: Iterable[str],
+    ports: Iterable[int] = range(1, 1025),
+    timeout: Optional[float] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    hostgroup: int = DEFAULT_HOSTGROUP,
+    on_result: Optional[Callable[[Dict[str, object]], None]] = None,
+    progress=None,
+    timing=None,
+    retries: Optional[int] = None,
+) -> List[Dict[str, object]]:
+    """
+    在单个事件循环中对多台主机做 TCP connect 扫描。
+
+    :param ip_list: 目标 IP（可为任意可迭代对象，按需读取）
+    :param ports: 要扫描的端口
+    :param timeout: 固定的探测超时（秒）；为 None 时按 RTT 自适应
+    :param concurrency: 全局并发探测数上限
+    :param hostgroup: 同时交错扫描的主机数，避免并发探测集中在同一台主机上
+    :param on_result: 每台主机扫描完成时回调，参数与返回列表中的元素相同
+    :param progress: core.utils.ScanProgress，每个探测完成时推进
+    :param timing: 时序模板名（T0 ~ T5）或 TimingEngine
+    :param retries: 超时探测的最大重传次数，为 None 时使用模板的上限
+    :return: [{"ip": "192.168.1.1", "open_ports": [22, 80]}, ...]
+    """
+    concurrency = max(1, min(concurrency, raise_nofile_limit(concurrency + 256) - 256))
+    hosts = HostAggregator(ports, hostgroup, on_result, progress)
+    timing = resolve_timing(timing, timeout)
+    asyncio.run(run_probes(hosts.pairs(ip_list), timing, concurrency, hosts.record, retries))
+    return hosts.results
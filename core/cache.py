@@ -0,0 +1,85 @@
+"""
+带过期时间、容量上限的持久化缓存，用于操作系统识别、服务识别等结果在多次扫描之间复用。
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+DEFAULT_CACHE_TTL = 24 * 3600
+DEFAULT_CACHE_SIZE = 4096
+
+
+class PersistentCache:
+    """
+    带过期时间的 LRU 缓存：键 -> (值, 写入时间)，可持久化到 JSON 文件，跨会话复用。
+    键为字符串，值须能被 JSON 序列化。
+    :param path: 持久化文件路径，为 None 时只保存在内存中
+    :param ttl: 结果有效期（秒）
+    :param max_size: 最多缓存的条目数
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = DEFAULT_CACHE_TTL, max_size: int = DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        if path:
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[1] > self.ttl:
+                del self._entries[key]
+                self._dirty = True
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, value, stamp: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (value, time.time() if stamp is None else stamp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 加载缓存 {self.path} 时发生错误: {e}")
+            return
+        now = time.time()
+        # 文件中按最近使用顺序保存，过期条目直接丢弃
+        for key, (value, stamp) in data.items():
+            if now - stamp <= self.ttl:
+                self.put(key, value, stamp)
+        self._dirty = False
+
+    def save(self):
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            data = {key: list(entry) for key, entry in self._entries.items()}
+            self._dirty = False
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ 保存缓存 {self.path} 时发生错误: {e}")
@@ -0,0 +1,200 @@
+"""
+扫描断点：长时间的端口扫描定期把进度写到 data/ 下，程序崩溃或中断后可以从断点继续。
+
+断点文件只记录：
+- 目标描述、端口、扫描参数和随机顺序的种子（用于重建同样的扫描顺序）；
+- 已完成的扫描顺序下标区间（通常只有开头的一段和少数几个零散区间）；
+- 有开放端口的主机结果（无开放端口的主机只计数）。
+恢复时直接从第一段连续完成区间的末尾开始迭代目标，跳过区间内已完成的下标，不从头枚举目标空间。
+以主机为单位记录完成情况，中断时扫描到一半的主机恢复后会重新扫描全部端口。
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from core.packet import int_to_ip
+from core.utils import get_runtime_data_path, iter_targets
+
+CHECKPOINT_FILE = "data/scan_checkpoint.json"
+CHECKPOINT_INTERVAL = 5.0   # 两次写盘之间的最短间隔（秒）
+CHECKPOINT_VERSION = 1
+
+
+def default_checkpoint_path() -> str:
+    return get_runtime_data_path(CHECKPOINT_FILE)
+
+
+def _port_runs(ports: List[int]) -> List[List[int]]:
+    """端口列表压缩为 [[起, 止], ...]"""
+    runs = []
+    for port in sorted(set(ports)):
+        if runs and runs[-1][1] == port - 1:
+            runs[-1][1] = port
+        else:
+            runs.append([port, port])
+    return runs
+
+
+def _expand_runs(runs) -> List[int]:
+    return [port for lo, hi in runs for port in range(lo, hi + 1)]
+
+
+class ScanCheckpoint:
+    """
+    一次端口扫描的断点。
+    :param path: 断点文件路径
+    :param target: 目标描述（同 scan_port 的 subnet_prefix）
+    :param ports: 要扫描的端口
+    :param options: 扫描参数（engine、concurrency 等），恢复时原样传回 scan_port
+    :param randomize: 是否以随机顺序扫描目标
+    :param seed: 随机顺序的种子，为 None 时随机生成并记录
+    :param interval: 定期写盘的最短间隔（秒）
+    """
+
+    def __init__(self, path: str, target: str, ports, options: Optional[Dict] = None,
+                 randomize: bool = False, seed: Optional[int] = None, interval: float = CHECKPOINT_INTERVAL):
+        self.path = path
+        self.target = target
+        self.ports = sorted(set(ports))
+        self.options = dict(options or {})
+        self.interval = interval
+        self.targets = iter_targets(target, randomize=randomize, seed=seed)
+        self.started = time.time()
+        self.scanned = 0                      # 已完成的主机数
+        self.results: List[Dict] = []         # 有开放端口的主机
+        # 已完成的扫描顺序下标，按 [起, 止) 排列的互不相交区间
+        self._done: List[List[int]] = []
+        # 正在扫描的主机 ip -> 下标列表（同一地址可能在目标中出现多次）
+        self._in_flight: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self._last_save = time.monotonic()
+
+    @property
+    def resume_position(self) -> int:
+        """第一段连续完成区间的末尾，恢复时从这里开始迭代"""
+        return self._done[0][1] if self._done and self._done[0][0] == 0 else 0
+
+    @property
+    def finished(self) -> bool:
+        return self.resume_position >= self.targets.size
+
+    def is_done(self, position: int) -> bool:
+        i = bisect.bisect_right(self._done, [position, float("inf")]) - 1
+        return i >= 0 and position < self._done[i][1]
+
+    def _mark_done(self, lo: int, hi: int):
+        """把下标区间 [lo, hi) 标记为已完成，并与相邻区间合并（调用方持有锁）"""
+        if lo >= hi:
+            return
+        i = bisect.bisect_left(self._done, [lo, lo])
+        if i > 0 and self._done[i - 1][1] >= lo:
+            i -= 1
+            lo = self._done[i][0]
+        j = i
+        while j < len(self._done) and self._done[j][0] <= hi:
+            hi = max(hi, self._done[j][1])
+            j += 1
+        self._done[i:j] = [[lo, hi]]
+
+    def hosts(self) -> Iterator[str]:
+        """
+        从断点开始产出尚未完成的目标 IP，供扫描引擎按需读取。
+        被排除或已完成的下标在经过时直接计为完成。
+        """
+        previous = self.resume_position
+        for position, value in self.targets.iter_positions(previous):
+            with self._lock:
+                self._mark_done(previous, position)
+                previous = position + 1
+                if self.is_done(position):
+                    continue
+                ip = int_to_ip(value)
+                self._in_flight.setdefault(ip, []).append(position)
+            yield ip
+        with self._lock:
+            self._mark_done(previous, self.targets.size)
+
+    def complete(self, result: Dict):
+        """扫描引擎的 on_result：记录一台主机的结果，距上次写盘超过 interval 时写盘"""
+        with self._lock:
+            positions = self._in_flight.get(result["ip"])
+            if positions:
+                self._mark_done(positions[0], positions[0] + 1)
+                positions.pop(0)
+                if not positions:
+                    del self._in_flight[result["ip"]]
+            self.scanned += 1
+            if result.get("open_ports"):
+                self.results.append(result)
+            due = time.monotonic() - self._last_save >= self.interval
+        if due:
+            self.save()
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "version": CHECKPOINT_VERSION,
+                "target": self.target,
+                "ports": _port_runs(self.ports),
+                "options": self.options,
+                "randomize": self.targets.randomize,
+                "seed": self.targets.seed,
+                "started": self.started,
+                "updated": time.time(),
+                "scanned": self.scanned,
+                "done": [list(interval) for interval in self._done],
+                "results": list(self.results),
+            }
+
+    def save(self):
+        data = self.to_dict()
+        self._last_save = time.monotonic()
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ 保存扫描断点 {self.path} 时发生错误: {e}")
+
+    def remove(self):
+        """扫描正常结束后删除断点文件"""
+        for path in (self.path, self.path + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "ScanCheckpoint":
+        """读取断点文件；文件不存在或格式不对时抛出 ValueError"""
+        path = path or default_checkpoint_path()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"无法读取扫描断点 {path}: {e}")
+        if data.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"不支持的扫描断点版本: {data.get('version')}")
+        checkpoint = cls(path, data["target"], _expand_runs(data["ports"]), data.get("options"),
+                         randomize=data.get("randomize", False), seed=data.get("seed"))
+        checkpoint.started = data.get("started", checkpoint.started)
+        checkpoint.scanned = data.get("scanned", 0)
+        checkpoint.results = data.get("results", [])
+        checkpoint._done = [list(interval) for interval in data.get("done", [])]
+        return checkpoint
+
+
+def read_checkpoint_info(path: Optional[str] = None) -> Optional[Dict]:
+    """断点摘要（目标、已完成主机数、更新时间），没有可恢复的断点时返回 None"""
+    path = path or default_checkpoint_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        checkpoint = ScanCheckpoint.load(path)
+    except ValueError as e:
+        print(f"⚠️ {e}")
+        return None
+    return {"target": checkpoint.target, "scanned": checkpoint.scanned, "total": len(checkpoint.targets),
+            "open_hosts": len(checkpoint.results), "updated": os.path.getmtime(path)}
@@ -0,0 +1,240 @@
+"""
+无界面的命令行入口（python -m core），用于定时任务或没有显示器的服务器。
+
+    python -m core 192.168.1.0/24 -p 1-1024 -sV -O -T4 -oX scan.xml
+    python -m core 10.0.0.0/16 -sn -oJ - | your-ingest-tool
+    python -m core 10.0.0.0/16 -p 80,443 --checkpoint data/job.json -oG scan.gnmap
+    python -m core --resume data/job.json -oJ -
+    python -m core 10.0.0.0/16 -p 1-1024 --processes 8 -oJ scan.jsonl
+    python -m core 10.0.0.0/8 -p 22,80,443 --coordinator 0.0.0.0:7070 -oJ scan.jsonl   # 分布式扫描协调端
+    python -m core --worker 10.1.2.3:7070                                              # 工作端
+    python -m core 10.0.0.0/16 -p 1-1024 --metrics scan.prom --profile sample        # 性能诊断
+
+结果按主机流式写出（-oJ JSONL、-oG greppable、-oX nmap XML，文件名为 - 表示标准输出），
+都未指定时向标准输出写 JSONL。扫描过程中的提示信息写到标准错误，不会混入结果。
+"""
+import argparse
+import contextlib
+import shlex
+import sys
+from typing import List, Optional
+
+from core.async_scanner import DEFAULT_CONCURRENCY
+from core.checkpoint import ScanCheckpoint
+from core.discovery import scan_subnet
+from core.distributed import Coordinator, parse_address, run_worker
+from core.metrics import MetricsExporter, ScanProfiler, get_registry
+from core.output import WRITERS
+from core.pipeline import ScanPipeline
+from core.port_scanner import resume_scan, scan_port
+from core.ratelimit import configure_rate_limit
+from core.service_probe import top_ports
+from core.sharding import sharded_scan_port, sharded_scan_subnet
+from core.timing import TIMING_TEMPLATES
+from core.utils import iter_targets
+
+
+def parse_ports(text: str) -> List[int]:
+    """"22,80,8000-8100" -> 端口列表；"-" 表示全部 65535 个端口"""
+    if text == "-":
+        return list(range(1, 65536))
+    ports = set()
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        lo, sep, hi = item.partition("-")
+        try:
+            first, last = int(lo or 1), int(hi or 65535) if sep else int(lo)
+        except ValueError:
+            raise ValueError(f"无效的端口: {item}")
+        if not 1 <= first <= last <= 65535:
+            raise ValueError(f"无效的端口范围: {item}")
+        ports.update(range(first, last + 1))
+    return sorted(ports)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m core", description="Python 实现的 Nmap 风格网络扫描器（命令行版）")
+    parser.add_argument("targets", nargs="*", help="扫描目标：CIDR、地址范围、10.0-3.*.1 形式或主机名")
+    parser.add_argument("--exclude", help="需要排除的目标，语法同扫描目标")
+    parser.add_argument("-iL", dest="input_file", help="从文件读取扫描目标")
+
+    scan = parser.add_argument_group("扫描方式")
+    scan.add_argument("-sn", dest="ping_only", action="store_true", help="只做主机发现，不扫描端口")
+    scan.add_argument("-sS", dest="engine", action="store_const", const="syn",
+                      help="SYN 半开扫描（需要管理员权限）")
+    scan.add_argument("-sT", dest="engine", action="store_const", const="async", help="TCP connect 扫描（默认）")
+    scan.add_argument("-sV", dest="service", action="store_true", help="识别开放端口上的服务和版本")
+    scan.add_argument("-O", dest="os", action="store_true", help="识别操作系统")
+    scan.add_argument("--ping-method", choices=["icmp", "tcp", "ping"], default="tcp",
+                      help="主机发现方式（-sn、-sV、-O 时使用），默认 tcp")
+    scan.add_argument("-p", dest="ports", help="端口，如 22,80,8000-8100，- 表示全部端口（默认 1-1024）")
+    scan.add_argument("--top-ports", type=int, help="扫描最常见的前 N 个端口")
+
+    timing = parser.add_argument_group("时序与性能")
+    timing.add_argument("-T", dest="timing", choices=[name[1:] for name in TIMING_TEMPLATES],
+                        help="时序模板 0 ~ 5，同 nmap -T")
+    timing.add_argument("--timeout", type=float, help="固定的探测超时（秒），默认按 RTT 自适应")
+    timing.add_argument("--max-retries", dest="retries", type=int, help="超时探测的最大重传次数（connect 和 SYN 扫描），默认由时序模板决定")
+    timing.add_argument("--concurrency", type=int, help="同时进行的 connect 探测数上限")
+    timing.add_argument("--max-rate", type=float, help="全局每秒发包数上限")
+    timing.add_argument("--processes", type=int, default=1,
+                        help="把目标分给 N 个进程并行扫描（-sn 和端口扫描），0 表示 CPU 核数")
+
+    state = parser.add_argument_group("断点")
+    state.add_argument("--checkpoint", help="端口扫描时定期把进度保存到该文件，中断后可用 --resume 继续")
+    state.add_argument("--resume", metavar="CHECKPOINT", help="从断点文件继续中断的端口扫描")
+
+    cluster = parser.add_argument_group("分布式扫描")
+    cluster.add_argument("--coordinator", metavar="[HOST:]PORT",
+                         help="作为协调端监听该地址，把目标分成工作单元交给工作端扫描，结果写入扫描历史")
+    cluster.add_argument("--worker", metavar="HOST:PORT", help="作为工作端连接协调端，领取并扫描工作单元")
+    cluster.add_argument("--local-workers", type=int, default=0, help="协调端同时在本机启动 N 个工作端")
+    cluster.add_argument("--token", help="协调端与工作端之间的口令")
+
+    diagnostics = parser.add_argument_group("性能诊断")
+    diagnostics.add_argument("--metrics", metavar="FILE",
+                             help="扫描结束时把指标写到文件（.json 为 JSON，其余为 Prometheus 文本格式）")
+    diagnostics.add_argument("--metrics-interval", type=float, default=0, metavar="SECONDS",
+                             help="扫描期间每隔若干秒更新一次 --metrics 文件")
+    diagnostics.add_argument("--profile", choices=ScanProfiler.MODES,
+                             help="剖析本次扫描：cprofile 输出 .prof 和摘要，sample 输出可生成火焰图的调用栈采样")
+    diagnostics.add_argument("--profile-output", metavar="PREFIX", help="剖析结果的文件名前缀（默认 data/profiles/）")
+
+    output = parser.add_argument_group("输出（文件名为 - 表示标准输出，可同时指定多个）")
+    output.add_argument("-oJ", dest="json", metavar="FILE", help="JSONL，每行一台主机")
+    output.add_argument("-oG", dest="grepable", metavar="FILE", help="greppable 格式，同 nmap -oG")
+    output.add_argument("-oX", dest="xml", metavar="FILE", help="nmap 兼容的 XML，同 nmap -oX")
+    return parser
+
+
+def _open_writers(args, stdout):
+    writers, files = [], []
+    for fmt, writer_class in WRITERS.items():
+        path = getattr(args, fmt)
+        if path is None:
+            continue
+        if path == "-":
+            stream = stdout
+        else:
+            stream = open(path, "w", encoding="utf-8")
+            files.append(stream)
+        writers.append(writer_class(stream))
+    if not writers:
+        writers.append(WRITERS["json"](stdout))
+    return writers, files
+
+
+def run(args, stdout) -> int:
+    if args.worker:
+        units = run_worker(parse_address(args.worker), token=args.token)
+        print(f"✅ 工作端已完成 {units} 个工作单元")
+        return 0
+    if args.local_workers and not args.coordinator:
+        raise ValueError("--local-workers 需要与 --coordinator 一起使用")
+    if args.coordinator and (args.checkpoint or args.resume or args.service or args.os or args.processes != 1):
+        raise ValueError("--coordinator 不能与 --checkpoint、--resume、-sV、-O、--processes 同时使用")
+    if not args.targets and not args.resume:
+        raise ValueError("请指定扫描目标，或用 --resume 继续之前的扫描")
+    if args.resume and (args.ping_only or args.service or args.os):
+        raise ValueError("--resume 只能继续端口扫描")
+    if args.checkpoint and (args.ping_only or args.service or args.os):
+        raise ValueError("--checkpoint 只支持端口扫描（不能与 -sn、-sV、-O 同时使用）")
+    if args.checkpoint and (args.exclude or args.input_file):
+        raise ValueError("--checkpoint 不支持 --exclude 和 -iL，请直接在目标中写出要扫描的范围")
+    if args.processes != 1 and (args.checkpoint or args.resume or args.service or args.os):
+        raise ValueError("--processes 不能与 --checkpoint、--resume、-sV、-O 同时使用")
+    if args.processes < 0:
+        raise ValueError("--processes 不能为负数")
+    if args.max_rate:
+        configure_rate_limit(max_pps=args.max_rate)
+    if args.metrics_interval and not args.metrics:
+        raise ValueError("--metrics-interval 需要与 --metrics 一起使用")
+
+    target = " ".join(args.targets)
+    ports = top_ports(args.top_ports) if args.top_ports else parse_ports(args.ports or "1-1024")
+    timing = f"T{args.timing}" if args.timing else None
+    scan_type = "ping" if args.ping_only else ("syn" if args.engine == "syn" else "connect")
+
+    writers, files = _open_writers(args, stdout)
+    command = "python -m core " + " ".join(shlex.quote(arg) for arg in sys.argv[1:])
+
+    def on_result(result):
+        if args.ping_only and result.get("status") != "UP":
+            return
+        if "open_ports" in result and not result["open_ports"] and not (args.service or args.os):
+            return
+        for writer in writers:
+            writer.write(result)
+
+    options = {"on_result": on_result, "timing": timing}
+    if args.concurrency:
+        options["concurrency"] = args.concurrency
+    get_registry().reset()
+    diagnostics = contextlib.ExitStack()
+    if args.metrics:
+        diagnostics.enter_context(MetricsExporter(args.metrics, args.metrics_interval))
+    if args.profile:
+        diagnostics.enter_context(ScanProfiler(args.profile, args.profile_output))
+    try:
+        for writer in writers:
+            writer.start(command, scan_type)
+        if args.resume:
+            total = len(ScanCheckpoint.load(args.resume).targets)
+            resume_scan(args.resume, on_result=on_result, timing=timing)
+        else:
+            targets = iter_targets(target, exclude=args.exclude, input_file=args.input_file)
+            total = len(targets)
+            if args.coordinator:
+                if args.ping_only:
+                    kind, scan_options = "host", {"method": args.ping_method}
+                else:
+                    kind, scan_options = "port", {"engine": args.engine or "async", "retries": args.retries}
+                    if args.concurrency:
+                        scan_options["concurrency"] = args.concurrency
+                scan_options.update(timeout=args.timeout, timing=timing)
+                Coordinator(targets, ports=ports, kind=kind, options=scan_options,
+                            address=parse_address(args.coordinator, default_host="0.0.0.0"), token=args.token,
+                            on_result=on_result).run(local_workers=args.local_workers)
+            elif args.ping_only and args.processes != 1:
+                sharded_scan_subnet(targets, method=args.ping_method, processes=args.processes or None,
+                                    timeout=args.timeout, on_result=on_result, timing=timing)
+            elif args.ping_only:
+                scan_subnet(targets, method=args.ping_method, timeout=args.timeout, on_result=on_result,
+                            timing=timing)
+            elif args.service or args.os:
+                ScanPipeline(ports=ports, discovery_method=args.ping_method, timeout=args.timeout,
+                             service_workers=4 if args.service else 0, os_workers=4 if args.os else 0,
+                             engine=args.engine or "async", retries=args.retries,
+                             concurrency=args.concurrency or DEFAULT_CONCURRENCY,
+                             on_result=on_result, timing=timing).run(targets)
+            elif args.processes != 1:
+                sharded_scan_port(targets, ports=ports, processes=args.processes or None, timeout=args.timeout,
+                                  engine=args.engine or "async", retries=args.retries, **options)
+            else:
+                scan_port(targets if not args.checkpoint else target, ports=ports, timeout=args.timeout,
+                          engine=args.engine or "async", retries=args.retries, checkpoint=args.checkpoint,
+                          **options)
+        for writer in writers:
+            writer.finish(total)
+    finally:
+        diagnostics.close()
+        for f in files:
+            f.close()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    stdout = sys.stdout
+    # 扫描模块用 print 输出提示信息，转到标准错误，标准输出只留给结果
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            return run(args, stdout)
+        except (ValueError, OSError) as e:
+            print(f"❗ {e}", file=sys.stderr)
+            return 1
+        except KeyboardInterrupt:
+            print("❗ 扫描已中断", file=sys.stderr)
+            return 130
@@ -1,38 +1,235 @@
-import socket
 import platform
 import subprocess
-from scapy.all import IP, ICMP, sr1, TCP
-from typing import List
-from core.utils import concurrent_scan,normalize_subnet
+import asyncio
+import heapq
+import itertools
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+from core import metrics
+from core.utils import concurrent_scan,iter_targets
+from core.fingerprints import record_icmp_reply
+from core.packet import IP_PROTO_ICMP, checksum, open_raw_receiver, parse_ipv4
+from core.async_scanner import DEFAULT_CONCURRENCY, resolve_timing, tcp_ping_host, tcp_ping_sweep
+from core.ratelimit import DROP, NEUTRAL, REPLY, get_rate_limiter
+from core.service_probe import top_ports
 
-def is_alive_icmp(ip: str, timeout: float = 1.0) -> bool:
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+DEFAULT_ICMP_RATE = 2000  # 每秒发送的 echo 请求数
+DEFAULT_TCP_PING_PORTS = [80, 443, 22, 3389]
+# 主机发现阶段对每个目标的最大重传次数（模板上限更低时取模板值）
+DISCOVERY_MAX_RETRIES = 1
+
+_SENT = metrics.PROBES_SENT.labels("icmp")
+_REPLIES = metrics.REPLIES.labels("icmp")
+_RETRIES = metrics.RETRIES.labels("icmp")
+_TIMEOUTS = metrics.TIMEOUTS.labels("icmp")
+_RTT = metrics.STAGE_SECONDS.labels("icmp")
+
+def is_alive_icmp(ip: str, timeout: Optional[float] = None) -> bool:
     """使用 ICMP 判断主机是否存活（需要管理员权限）"""
+    # 只导入用到的 scapy 层；scapy.all 会加载全部协议层并探测网卡，耗时数秒
+    from scapy.layers.inet import ICMP, IP
+    from scapy.sendrecv import sr1
+
+    limiter = get_rate_limiter()
+    limiter.acquire()
+    resp = None
     try:
         pkt = IP(dst=ip)/ICMP()
-        resp = sr1(pkt, timeout=timeout, verbose=0)
+        resp = sr1(pkt, timeout=resolve_timing(None, timeout).timeout(ip), verbose=0)
         return resp is not None
     except PermissionError:
         print("⚠️ ICMP 扫描需要管理员权限！")
         return False
+    finally:
+        limiter.release(REPLY if resp is not None else NEUTRAL)
+
+
+def resolve_ping_ports(ports=None) -> List[int]:
+    """TCP Ping 端口：None 为默认端口，整数 N 表示最常见的前 N 个端口，否则为端口列表"""
+    if ports is None:
+        return list(DEFAULT_TCP_PING_PORTS)
+    if isinstance(ports, int):
+        return top_ports(ports)
+    return list(ports)
+
+
+def is_alive_tcp(ip: str, ports=None, timeout: Optional[float] = None) -> bool:
+    """
+    使用 TCP Ping 判断主机是否存活。
+    所有端口同时探测，任一端口回复 SYN-ACK（连接成功）或 RST（连接被拒绝）即视为在线。
+    """
+    return asyncio.run(tcp_ping_host(ip, resolve_ping_ports(ports), resolve_timing(None, timeout).timeout(ip)))
+
+
+class IcmpSweeper:
+    """
+    批量 ICMP 扫描：一个原始套接字按固定速率向全部目标发送 echo 请求，
+    接收线程按 ICMP id / 序列号把回包匹配到目标，
+    总耗时约为 发送时间 + 一个超时，而不是 主机数 × 超时 / 线程数。
+    """
+
+    def __init__(self, timeout: Optional[float] = None, rate: int = DEFAULT_ICMP_RATE,
+                 retries: Optional[int] = None, timing=None):
+        self.timing = resolve_timing(timing, timeout)
+        if self.timing.template.scan_delay:
+            rate = min(rate, 1.0 / self.timing.template.scan_delay)
+        self.rate = max(1e-3, rate)
+        self.retries = min(self.timing.max_retries, DISCOVERY_MAX_RETRIES) if retries is None else retries
+        self.ident = (os.getpid() ^ int.from_bytes(os.urandom(2), "big")) & 0xFFFF
+        self.limiter = get_rate_limiter()
+        # ip -> [序列号, 已发送次数, 最近一次发送时间]，只保存未决目标
+        self._table: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _echo_request(self, seq: int) -> bytes:
+        payload = struct.pack("!d", time.time())
+        header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, self.ident, seq)
+        csum = checksum(header + payload)
+        return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, csum, self.ident, seq) + payload
 
+    def sweep(self, ip_list: Iterable[str],
+              on_result: Optional[Callable[[Dict[str, str]], None]] = None,
+              progress=None) -> List[Dict[str, str]]:
+        """返回与 concurrent_scan 相同结构的结果：[{"ip": ..., "status": "UP" / "DOWN"}, ...]"""
+        results = []
 
-def is_alive_tcp(ip: str, ports: List[int] = [80, 443, 22, 3389], timeout: float = 1.0) -> bool:
-    """使用 TCP Ping 判断主机是否存活"""
-    for port in ports:
+        def resolve(ip, status, outcome):
+            with self._lock:
+                if self._table.pop(ip, None) is None:
+                    return
+                result = {"ip": ip, "status": status}
+                results.append(result)
+            self.limiter.release(outcome)
+            if progress:
+                progress.advance()
+            if on_result:
+                on_result(result)
+
+        sock = open_raw_receiver(IP_PROTO_ICMP)
+        self._stop.clear()
+        recv_thread = threading.Thread(target=self._recv_loop, args=(sock, resolve), daemon=True)
+        recv_thread.start()
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(timeout)
-            result = sock.connect_ex((ip, port))
+            self._send_loop(sock, iter(ip_list), resolve)
+        finally:
+            self._stop.set()
+            recv_thread.join()
             sock.close()
-            if result == 0:  # 连接成功
-                return True
-        except socket.error:
-            continue
-    return False
+        return results
+
+    def _send_loop(self, sock, targets, resolve):
+        interval = 1.0 / self.rate
+        next_send = time.monotonic()
+        # 小顶堆 (截止时间, 序号, ip, 发送序号)：超时按子网 RTT 自适应，堆顶即最早到期的目标
+        outstanding = []
+        counter = itertools.count()
+        seq = 0
+        exhausted = False
+
+        def transmit(ip, entry):
+            nonlocal next_send
+            now = time.monotonic()
+            if next_send > now:
+                time.sleep(next_send - now)
+            elif next_send < now - 0.05:
+                next_send = now
+            next_send += interval
+            entry[2] = time.monotonic()
+            _SENT.inc()
+            try:
+                sock.sendto(self._echo_request(entry[0]), (ip, 0))
+            except OSError as e:
+                metrics.record_error("icmp", e.errno or 0)
+            heapq.heappush(outstanding, (entry[2] + self.timing.timeout(ip), next(counter), ip, entry[1]))
+
+        while not exhausted or outstanding:
+            now = time.monotonic()
+            while outstanding and (outstanding[0][0] <= now or (exhausted and outstanding[0][2] not in self._table)):
+                _, _, ip, attempt = heapq.heappop(outstanding)
+                entry = self._table.get(ip)
+                if entry is None or entry[1] != attempt:
+                    continue
+                outcome = DROP if self.timing.is_responsive(ip) else NEUTRAL
+                _TIMEOUTS.inc()
+                if entry[1] > self.retries:
+                    resolve(ip, "DOWN", outcome)
+                    continue
+                self.limiter.record(outcome)
+                entry[1] += 1
+                _RETRIES.inc()
+                transmit(ip, entry)
+
+            if not exhausted:
+                # 新目标先向全局限速器申请窗口位置，重传沿用原来的位置
+                wait = self.limiter.try_acquire()
+                if wait:
+                    time.sleep(min(wait, 0.01))
+                    continue
+                ip = next(targets, None)
+                if ip is None:
+                    self.limiter.release()
+                    exhausted = True
+                    continue
+                entry = [seq, 1, 0.0]
+                seq = (seq + 1) & 0xFFFF
+                with self._lock:
+                    self._table[ip] = entry
+                transmit(ip, entry)
+            elif outstanding:
+                time.sleep(min(0.01, max(0.0, outstanding[0][0] - time.monotonic())))
+
+    def _recv_loop(self, sock, resolve):
+        while not self._stop.is_set():
+            try:
+                buf, _ = sock.recvfrom(65535)
+            except OSError:
+                continue
+            if len(buf) < 28:
+                continue
+            hdr = parse_ipv4(buf)
+            icmp_type, _, _, ident, seq = struct.unpack("!BBHHH", buf[hdr.ihl:hdr.ihl + 8])
+            if icmp_type != ICMP_ECHO_REPLY or ident != self.ident:
+                continue
+            entry = self._table.get(hdr.src)
+            if entry is not None and entry[0] == seq:
+                rtt = time.monotonic() - entry[2]
+                self.timing.record_rtt(hdr.src, rtt, entry[1] - 1)
+                _REPLIES.inc()
+                _RTT.observe(rtt)
+                record_icmp_reply(hdr)
+                resolve(hdr.src, "UP", REPLY)
+
+
+def icmp_sweep(ip_list: Iterable[str], timeout: Optional[float] = None, rate: int = DEFAULT_ICMP_RATE,
+               retries: Optional[int] = None, on_result=None, progress=None, timing=None) -> List[Dict[str, str]]:
+    """对一组主机做批量 ICMP 存活探测，缺少权限时打印提示并把全部主机记为 DOWN（与逐台探测时相同）"""
+    try:
+        sweeper = IcmpSweeper(timeout=timeout, rate=rate, retries=retries, timing=timing)
+        return sweeper.sweep(ip_list, on_result, progress)
+    except PermissionError:
+        print("⚠️ ICMP 扫描需要管理员权限！")
+    results = []
+    for ip in ip_list:
+        result = {"ip": ip, "status": "DOWN"}
+        results.append(result)
+        if progress:
+            progress.advance()
+        if on_result:
+            on_result(result)
+    return results
 
 
 def ping_cross_platform(ip: str) -> bool:
     """使用系统 ping 命令（跨平台，备用方案）"""
+    limiter = get_rate_limiter()
+    limiter.acquire()
+    alive = False
     try:
         count_flag = "-n" if platform.system().lower() == "windows" else "-c"
         output = subprocess.run(
@@ -40,31 +237,52 @@ def ping_cross_platform(ip: str) -> bool:
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL
         )
-        return output.returncode == 0
+        alive = output.returncode == 0
+        return alive
     except Exception:
         return False
+    finally:
+        limiter.release(REPLY if alive else NEUTRAL)
 
 
 
 
-def scan_subnet(subnet_prefix: str, method: str = "icmp", timeout: float = 1.0, max_workers: int = 100) -> List[str]:
+def scan_subnet(subnet_prefix: str, method: str = "icmp", timeout: Optional[float] = None, max_workers: int = 100,
+                ports=None, on_result=None, progress=None, timing=None) -> List[str]:
     """
     并发扫描子网内的活动主机。
     subnet_prefix: 例如 "192.168.1"
     method: icmp / tcp / ping
+    ports: TCP Ping 使用的端口列表，或整数 N 表示最常见的前 N 个端口
+    on_result: 每台主机得出结果时回调 {"ip": ..., "status": ...}
+    progress: core.utils.ScanProgress，total 会被设置为目标主机数
+    timeout: 固定超时（秒），为 None 时按 RTT 自适应；timing: 时序模板 T0 ~ T5
     """
     # ip_list = [f"{subnet_prefix}.{i}" for i in range(1, 255)]
-    ip_list = normalize_subnet(subnet_prefix)
-    if not ip_list:
+    targets = iter_targets(subnet_prefix)
+    if not len(targets):
         raise ValueError(f"无效的子网前缀：{subnet_prefix}")
+    if progress:
+        progress.total = len(targets)
     if method == "icmp":
-        check_func = lambda ip: is_alive_icmp(ip, timeout)
+        print(f"开始使用 ICMP 批量扫描 {subnet_prefix}")
     elif method == "tcp":
-        check_func = lambda ip: is_alive_tcp(ip, timeout=timeout)
+        print(f"开始使用 TCP Ping 并发扫描 {subnet_prefix}")
     elif method == "ping":
-        check_func = ping_cross_platform
-    else:
-        raise ValueError(f"未知扫描方法：{method}")
+        print(f"开始使用 {method.upper()} 并发扫描 {subnet_prefix}")
+    return sweep_hosts(targets.hosts(), method=method, timeout=timeout, max_workers=max_workers, ports=ports,
+                       on_result=on_result, progress=progress, timing=timing)
+
 
-    print(f"开始使用 {method.upper()} 并发扫描 {subnet_prefix}.1 - {subnet_prefix}.254")
-    return concurrent_scan(ip_list, check_func, max_workers=max_workers)
\ No newline at end of file
+def sweep_hosts(ip_list: Iterable[str], method: str = "icmp", timeout: Optional[float] = None, max_workers: int = 100,
+                ports=None, on_result=None, progress=None, timing=None) -> List[Dict[str, str]]:
+    """对任意一组主机（可迭代对象）做存活探测，参数同 scan_subnet；progress.total 由调用方设置"""
+    if method == "icmp":
+        return icmp_sweep(ip_list, timeout=timeout, on_result=on_result, progress=progress, timing=timing)
+    elif method == "tcp":
+        return tcp_ping_sweep(ip_list, resolve_ping_ports(ports), timeout=timeout, concurrency=DEFAULT_CONCURRENCY,
+                              on_result=on_result, progress=progress, timing=timing)
+    elif method == "ping":
+        return concurrent_scan(ip_list, ping_cross_platform, max_workers=max_workers, on_result=on_result,
+                               progress=progress)
+    raise ValueError(f"未知扫描方法：{method}")
@@ -0,0 +1,417 @@
+"""
+分布式扫描：一个协调端把目标切成工作单元，通过 TCP 上逐行的 JSON 消息租给多台机器上的工作端。
+
+    协调端：python -m core 10.0.0.0/8 -p 22,80,443 --coordinator 0.0.0.0:7070 -oJ scan.jsonl
+    工作端：python -m core --worker 10.1.2.3:7070
+    本机测试：python -m core 127.0.0.0/20 -p 80 --coordinator 127.0.0.1:0 --local-workers 4
+
+协议（每条消息一行 JSON，工作端发起）：
+    {"type": "hello", "worker": 名称, "token": 口令}   -> {"type": "config", "kind", "ports", "options"}
+    {"type": "lease"}                                  -> {"type": "unit", "unit": 编号, "hosts": [...]}
+                                                          / {"type": "wait", "delay": 秒} / {"type": "done"}
+    {"type": "results", "unit": 编号, "results": [...]}   扫描过程中分批上报，无应答
+    {"type": "complete", "unit": 编号}                   单元扫描完成，无应答
+    {"type": "heartbeat", "units": [编号, ...]}           续租工作端正在扫描的单元，无应答
+
+工作单元在租期内没有上报结果或心跳、或者连接断开时收回，重新分配给其他工作端。
+心跳只能把租期续到单元租出后 max_lease_age 秒为止，卡住但仍在发心跳的工作端不会一直占着单元；
+上报结果说明扫描仍在推进，不受这个上限限制。
+单元的结果先缓存在协调端，单元完成时才一次性交给 on_result 并写入扫描历史，
+因此被重新分配的单元不会产生重复结果。工作端内部直接调用 scan_hosts / sweep_hosts。
+"""
+import hmac
+import json
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from itertools import count as counter, islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.utils import ScanProgress, iter_targets
+
+DEFAULT_PORT = 7070
+UNIT_SIZE = 256            # 每个工作单元的主机数
+LEASE_TIMEOUT = 30.0       # 租期（秒），期间没有任何消息则收回单元
+MAX_LEASE_AGE = 600.0      # 只靠心跳续租时，单元自租出起最多保留的秒数
+MAX_ATTEMPTS = 3           # 单元最多分配的次数，超过后放弃并记为失败
+WAIT_DELAY = 1.0           # 暂时没有可分配单元时，工作端等待后再请求
+RESULT_BATCH = 64
+
+
+def parse_address(text: str, default_host: str = "127.0.0.1") -> Tuple[str, int]:
+    """"10.1.2.3:7070" / ":7070" / "7070" -> (主机, 端口)"""
+    host, sep, port = text.rpartition(":")
+    try:
+        return (host or default_host) if sep else default_host, int(port)
+    except ValueError:
+        raise ValueError(f"无效的地址：{text}")
+
+
+def _send(wfile, message: Dict):
+    wfile.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+    wfile.flush()
+
+
+class WorkUnit:
+    def __init__(self, unit_id: int, hosts: List[str]):
+        self.id = unit_id
+        self.hosts = hosts
+        self.holder: Optional[str] = None
+        self.deadline = 0.0
+        self.leased_at = 0.0
+        self.attempts = 0
+        self.results: List[Dict] = []
+
+
+class Coordinator:
+    """
+    :param target: 目标描述或 TargetSpec
+    :param ports: 端口扫描的端口列表（kind="host" 时不使用）
+    :param kind: "port" 端口扫描 / "host" 主机发现
+    :param options: 传给工作端 scan_hosts / sweep_hosts 的参数（需可 JSON 序列化，如 timeout、timing、method）
+    :param address: 监听地址，端口为 0 时由系统分配（实际端口见 address 属性）
+    :param token: 工作端需要提供的口令，为 None 时不校验
+    :param lease_timeout: 租期（秒），期间没有上报结果或心跳则收回单元
+    :param max_lease_age: 只有心跳、没有上报结果时，单元自租出起最多保留的秒数
+    :param history: 是否把结果写入扫描历史（data/scan_history.db）
+    :param on_result: 每台主机的结果在所属单元完成时回调
+    :param progress: 按完成的单元推进
+    """
+
+    def __init__(self, target, ports: Iterable[int] = range(1, 1025), kind: str = "port",
+                 options: Optional[Dict] = None, address: Tuple[str, int] = ("0.0.0.0", DEFAULT_PORT),
+                 token: Optional[str] = None, unit_size: int = UNIT_SIZE, lease_timeout: float = LEASE_TIMEOUT,
+                 max_lease_age: float = MAX_LEASE_AGE, history: bool = True, on_result: Optional[Callable[[Dict], None]] = None,
+                 progress: Optional[ScanProgress] = None):
+        if kind not in ("port", "host"):
+            raise ValueError(f"未知扫描类型：{kind}")
+        self.targets = iter_targets(target)
+        if not len(self.targets):
+            raise ValueError(f"无效的子网前缀：{target}")
+        self.target = str(self.targets)
+        self.kind = kind
+        self.ports = list(ports) if kind == "port" else []
+        self.options = dict(options or {})
+        self.token = token
+        self.unit_size = unit_size
+        self.lease_timeout = lease_timeout
+        self.max_lease_age = max_lease_age
+        self.on_result = on_result
+        self.progress = progress
+        self.failed_hosts: List[str] = []
+        self.results: List[Dict] = []
+
+        # 单元按需从目标中切出，不一次生成全部单元
+        self._hosts = self.targets.hosts()
+        self._ids = counter()
+        self._retry: deque = deque()
+        self._leased: Dict[int, WorkUnit] = {}
+        self._exhausted = False
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._connections = 0
+
+        self._history = None
+        self._scan_id = None
+        if history:
+            from core.history import get_history_store
+            self._history = get_history_store()
+
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                coordinator._serve(self)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer(address, Handler)
+        self._server.daemon_threads = True
+        self.address = self._server.server_address[:2]
+
+    # ---- 运行 ----
+
+    def run(self, local_workers: int = 0, poll_interval: float = 0.5) -> List[Dict]:
+        """开始分配单元，直到全部完成后返回结果；local_workers 为在本机启动的工作端进程数"""
+        if self._history is not None:
+            self._scan_id = self._history.begin_scan(target=self.target, scan_type=self.kind)
+        if self.progress:
+            self.progress.total = len(self.targets) * max(1, len(self.ports))
+        server_thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        server_thread.start()
+        print(f"分布式扫描协调端已启动：{self.address[0]}:{self.address[1]}，目标 {self.target}")
+        processes = spawn_local_workers(self.address, local_workers, self.token) if local_workers else []
+        try:
+            while not self._finished.wait(poll_interval):
+                self._reclaim_expired()
+                if processes and not any(process.is_alive() for process in processes) and not self._connections:
+                    print("❗ 本机工作端已全部退出，扫描未完成")
+                    break
+            # 给仍在连接的工作端一点时间收到 done 消息后自行退出
+            deadline = time.monotonic() + 2.0
+            while self._connections and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            self._server.shutdown()
+            self._server.server_close()
+            for process in processes:
+                process.join(timeout=2.0)
+                if process.is_alive():
+                    process.terminate()
+            if self._history is not None:
+                self._history.finish_scan(self._scan_id)
+        if self.failed_hosts:
+            print(f"⚠️ {len(self.failed_hosts)} 台主机多次分配后仍未完成扫描，已跳过")
+        return self.results
+
+    # ---- 单元分配 ----
+
+    def _next_unit(self, worker: str) -> Optional[WorkUnit]:
+        with self._lock:
+            if self._retry:
+                unit = self._retry.popleft()
+            elif not self._exhausted:
+                hosts = list(islice(self._hosts, self.unit_size))
+                if not hosts:
+                    self._exhausted = True
+                    self._check_finished()
+                    return None
+                unit = WorkUnit(next(self._ids), hosts)
+            else:
+                return None
+            unit.holder = worker
+            unit.attempts += 1
+            unit.leased_at = time.monotonic()
+            unit.deadline = unit.leased_at + self.lease_timeout
+            unit.results = []
+            self._leased[unit.id] = unit
+            return unit
+
+    def _renew(self, worker: str, unit_ids: Optional[Iterable[int]] = None):
+        """心跳续租：只续工作端报告正在扫描的单元（未报告时为其持有的全部单元），且不超过 max_lease_age"""
+        now = time.monotonic()
+        ids = None if unit_ids is None else set(unit_ids)
+        with self._lock:
+            for unit in self._leased.values():
+                if unit.holder == worker and (ids is None or unit.id in ids):
+                    unit.deadline = max(unit.deadline, min(now + self.lease_timeout,
+                                                           unit.leased_at + self.max_lease_age))
+
+    def _release(self, unit: WorkUnit, reason: str):
+        """收回单元（调用方持有锁）：未超过分配次数时重新排队，否则记为失败"""
+        self._leased.pop(unit.id, None)
+        unit.holder = None
+        unit.results = []
+        if unit.attempts < MAX_ATTEMPTS:
+            print(f"⚠️ 工作单元 {unit.id} 已收回（{reason}），重新分配")
+            self._retry.append(unit)
+        else:
+            self.failed_hosts.extend(unit.hosts)
+            self._advance(unit)
+            self._check_finished()
+
+    def _reclaim_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            for unit in [unit for unit in self._leased.values() if unit.deadline < now]:
+                self._release(unit, f"{unit.holder} 租期已过")
+
+    def _reclaim_worker(self, worker: str):
+        with self._lock:
+            for unit in [unit for unit in self._leased.values() if unit.holder == worker]:
+                self._release(unit, f"{worker} 连接断开")
+
+    def _add_results(self, worker: str, unit_id: int, results: List[Dict]):
+        with self._lock:
+            unit = self._leased.get(unit_id)
+            # 已被收回的单元上报的结果直接丢弃
+            if unit is not None and unit.holder == worker:
+                unit.results.extend(results)
+                unit.deadline = time.monotonic() + self.lease_timeout
+
+    def _complete(self, worker: str, unit_id: int):
+        with self._lock:
+            unit = self._leased.get(unit_id)
+            if unit is None or unit.holder != worker:
+                return
+            del self._leased[unit_id]
+            results = unit.results
+            self.results.extend(results)
+            if self._history is not None and results:
+                self._history.append_results(self._scan_id, results, self.ports)
+            self._advance(unit)
+            self._check_finished()
+        if self.on_result:
+            for result in results:
+                self.on_result(result)
+
+    def _advance(self, unit: WorkUnit):
+        if self.progress:
+            self.progress.advance(len(unit.hosts) * max(1, len(self.ports)))
+
+    def _check_finished(self):
+        if self._exhausted and not self._retry and not self._leased:
+            self._finished.set()
+
+    # ---- 连接处理 ----
+
+    def _serve(self, handler: socketserver.StreamRequestHandler):
+        worker = None
+        with self._lock:
+            self._connections += 1
+        try:
+            for line in handler.rfile:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    break
+                kind = message.get("type")
+                if worker is None:
+                    if kind != "hello" or (self.token is not None
+                                           and not hmac.compare_digest(str(message.get("token")).encode("utf-8"),
+                                                                       self.token.encode("utf-8"))):
+                        _send(handler.wfile, {"type": "error", "message": "口令错误或未发送 hello"})
+                        break
+                    worker = f"{message.get('worker') or 'worker'}@{handler.client_address[0]}:" \
+                             f"{handler.client_address[1]}"
+                    print(f"工作端已连接：{worker}")
+                    _send(handler.wfile, {"type": "config", "kind": self.kind, "ports": self.ports,
+                                          "options": self.options})
+                elif kind == "lease":
+                    if self._finished.is_set():
+                        _send(handler.wfile, {"type": "done"})
+                        continue
+                    unit = self._next_unit(worker)
+                    if unit is not None:
+                        _send(handler.wfile, {"type": "unit", "unit": unit.id, "hosts": unit.hosts})
+                    elif self._finished.is_set():
+                        _send(handler.wfile, {"type": "done"})
+                    else:
+                        # 剩余单元都已租出，等待完成或被收回
+                        _send(handler.wfile, {"type": "wait", "delay": WAIT_DELAY})
+                elif kind == "results":
+                    self._add_results(worker, message["unit"], message.get("results", []))
+                elif kind == "complete":
+                    self._complete(worker, message["unit"])
+                elif kind == "heartbeat":
+                    self._renew(worker, message.get("units"))
+        except (OSError, KeyError, TypeError, AttributeError):
+            pass
+        finally:
+            if worker is not None:
+                self._reclaim_worker(worker)
+            with self._lock:
+                self._connections -= 1
+
+
+class _UnitReporter:
+    """工作端分批上报一个单元的结果"""
+
+    def __init__(self, send, unit_id: int):
+        self.send = send
+        self.unit_id = unit_id
+        self._batch: List[Dict] = []
+
+    def on_result(self, result: Dict):
+        self._batch.append(result)
+        if len(self._batch) >= RESULT_BATCH:
+            self.flush()
+
+    def flush(self):
+        if self._batch:
+            batch, self._batch = self._batch, []
+            self.send({"type": "results", "unit": self.unit_id, "results": batch})
+
+
+def run_worker(address: Tuple[str, int], name: Optional[str] = None, token: Optional[str] = None,
+               connect_retries: int = 10) -> int:
+    """连接协调端并循环领取、扫描工作单元，直到协调端通知全部完成；返回扫描的单元数"""
+    for attempt in range(connect_retries):
+        try:
+            sock = socket.create_connection(address, timeout=10)
+            break
+        except OSError:
+            if attempt == connect_retries - 1:
+                raise
+            time.sleep(1.0)
+    sock.settimeout(None)
+    rfile, wfile = sock.makefile("rb"), sock.makefile("wb")
+    send_lock = threading.Lock()
+    stop = threading.Event()
+    scanning: List[int] = []  # 正在扫描的单元，心跳只为它续租
+
+    def send(message):
+        with send_lock:
+            _send(wfile, message)
+
+    def receive() -> Dict:
+        line = rfile.readline()
+        if not line:
+            raise ConnectionError("协调端已断开连接")
+        return json.loads(line)
+
+    def heartbeat():
+        while not stop.wait(LEASE_TIMEOUT / 3):
+            try:
+                send({"type": "heartbeat", "units": list(scanning)})
+            except OSError:
+                return
+
+    units = 0
+    try:
+        send({"type": "hello", "worker": name or socket.gethostname(), "token": token})
+        config = receive()
+        if config.get("type") != "config":
+            raise ConnectionError(config.get("message", "协调端拒绝连接"))
+        threading.Thread(target=heartbeat, daemon=True).start()
+        while True:
+            send({"type": "lease"})
+            reply = receive()
+            if reply["type"] == "done":
+                break
+            if reply["type"] == "wait":
+                time.sleep(reply.get("delay", WAIT_DELAY))
+                continue
+            reporter = _UnitReporter(send, reply["unit"])
+            scanning.append(reply["unit"])
+            try:
+                _scan_unit(config, reply["hosts"], reporter.on_result)
+                reporter.flush()
+            finally:
+                scanning.remove(reply["unit"])
+            send({"type": "complete", "unit": reply["unit"]})
+            units += 1
+    finally:
+        stop.set()
+        sock.close()
+    return units
+
+
+def _scan_unit(config: Dict, hosts: List[str], on_result: Callable[[Dict], None]):
+    if config["kind"] == "host":
+        from core.discovery import sweep_hosts
+        sweep_hosts(hosts, on_result=on_result, **config["options"])
+    else:
+        from core.port_scanner import scan_hosts
+        scan_hosts(hosts, ports=config["ports"], on_result=on_result, **config["options"])
+
+
+def _local_worker(address, index, token):
+    try:
+        run_worker(address, name=f"local-{index}", token=token)
+    except (OSError, ValueError) as e:
+        print(f"❗ 本机工作端 {index} 退出：{e}")
+
+
+def spawn_local_workers(address: Tuple[str, int], count: int, token: Optional[str] = None) -> list:
+    """在本机启动 count 个工作端进程，连接到协调端（用于测试或单机多核扫描）"""
+    from multiprocessing import get_context
+
+    host = "127.0.0.1" if address[0] in ("0.0.0.0", "") else address[0]
+    context = get_context("spawn")
+    processes = [context.Process(target=_local_worker, args=((host, address[1]), index, token), daemon=True)
+                 for index in range(count)]
+    for process in processes:
+        process.start()
+    return processes
@@ -0,0 +1,198 @@
+"""
+被动操作系统指纹：签名表、回包特征的收集与匹配。
+
+扫描引擎收到 SYN-ACK / RST / ICMP 回包时记录 TTL、DF 位、窗口大小和 TCP 选项顺序，
+os_fingerprint 优先用这些已有数据识别，只有没有任何数据时才另外发包探测。
+签名按 (初始 TTL, 选项顺序) 建立索引，匹配时只比较同一个桶里的少数几条签名。
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from core.packet import IPv4Header, parse_tcp_options
+
+UNKNOWN_OS = "未知操作系统"
+
+
+class OsSignature(NamedTuple):
+    name: str
+    ttl: int                             # 初始 TTL
+    windows: Optional[FrozenSet[int]]    # 常见的 SYN-ACK 窗口大小，None 表示不限
+    options: Optional[str]               # SYN-ACK 的 TCP 选项顺序（p0f 记法），None 表示不限
+    df: Optional[bool] = None            # 是否设置 DF 位，None 表示不限
+
+
+def _sig(name, ttl, windows, options, df=None) -> OsSignature:
+    return OsSignature(name, ttl, frozenset(windows) if windows else None, options, df)
+
+
+# 按 SYN-ACK 特征整理的签名，同一个桶内越靠前优先级越高
+# 选项记法：M=MSS N=NOP W=窗口扩大 S=SACK 允许 T=时间戳 E=选项结束
+OS_SIGNATURES: List[OsSignature] = [
+    # Linux 3.x 及以后（含 Android），默认开启时间戳
+    _sig("Linux", 64, [65160, 64240, 43440, 29200, 28960, 26847, 14480], "M,S,T,N,W", True),
+    # Linux 关闭时间戳
+    _sig("Linux", 64, [65160, 64240, 29200, 14600], "M,N,N,S,N,W", True),
+    # Linux 2.4 / 2.6
+    _sig("Linux 2.x", 64, [5840, 5792, 5720], "M,S,T,N,W", True),
+    _sig("Linux 2.x", 64, [5840, 5792, 5720], "M,N,N,S,N,W", True),
+    _sig("Linux 2.x", 64, [5840, 5792], "M", True),
+    # macOS / iOS
+    _sig("Mac OS", 64, [65535], "M,N,W,N,N,T,S,E", True),
+    _sig("Mac OS", 64, [65535], "M,N,W,S,T,E", True),
+    # FreeBSD / NetBSD
+    _sig("FreeBSD", 64, [65535, 65228], "M,N,W,S,T", True),
+    _sig("OpenBSD", 64, [16384], "M,N,N,S,N,W,N,N,T", True),
+    _sig("Solaris", 64, [49232, 64240, 32806], "N,N,T,M,N,W,N,N,S", True),
+    _sig("Solaris", 64, [49232, 64240], "M,N,W,N,N,S", True),
+    # Windows Vista 及以后默认不带时间戳
+    _sig("Windows", 128, [8192, 65535, 64240, 65160, 62727], "M,N,W,N,N,S", True),
+    _sig("Windows", 128, [8192, 65535, 64240], "M,N,W,S,T", True),
+    _sig("Windows", 128, [8192, 65535], "M,N,W,N,N,T,N,N,S", True),
+    _sig("Windows XP", 128, [65535, 64240, 64512, 16384], "M,N,N,S", True),
+    _sig("Windows XP", 128, [65535, 64240, 16384], "M", True),
+    # 网络设备和嵌入式系统
+    _sig("Router/Cisco", 255, [4128, 4096, 2048, 8192], "M", False),
+    _sig("Router/Cisco", 255, None, "M"),
+    _sig("嵌入式设备", 64, [2144, 2920, 4380, 5744, 8192], "M"),
+    _sig("嵌入式设备", 255, [2144, 2920, 5744], None),
+]
+
+# 只有 TTL（RST、ICMP 回包或选项无法匹配）时按初始 TTL 给出的大致结果
+TTL_FAMILIES = {
+    32: "Windows 9x/嵌入式设备",
+    64: "Linux/Unix",
+    128: "Windows",
+    255: "Router/Cisco",
+}
+
+
+def guess_initial_ttl(ttl):
+    for likely in [32, 64, 128, 255]:
+        if ttl <= likely:
+            return likely
+    return ttl
+
+
+def _build_index():
+    by_layout: Dict[Tuple[int, Optional[str]], List[OsSignature]] = {}
+    by_window: Dict[Tuple[int, int], List[OsSignature]] = {}
+    for sig in OS_SIGNATURES:
+        by_layout.setdefault((sig.ttl, sig.options), []).append(sig)
+        for window in sig.windows or ():
+            by_window.setdefault((sig.ttl, window), []).append(sig)
+    return by_layout, by_window
+
+
+_BY_LAYOUT, _BY_WINDOW = _build_index()
+
+
+def _pick(candidates: List[OsSignature], window: Optional[int], df: Optional[bool]) -> Optional[OsSignature]:
+    """窗口匹配优先，其次 DF 位匹配，都不匹配时取桶内第一条"""
+    best, best_score = None, -1
+    for sig in candidates:
+        score = 0
+        if sig.windows is not None and window in sig.windows:
+            score += 2
+        if sig.df is not None and sig.df == df:
+            score += 1
+        if score > best_score:
+            best, best_score = sig, score
+    return best
+
+
+def classify(ttl: int, window: Optional[int] = None, options: Optional[str] = None,
+             df: Optional[bool] = None) -> Optional[str]:
+    """
+    按回包特征匹配签名，无法判断时返回 None。
+    有 TCP 选项时先在 (初始 TTL, 选项顺序) 桶内匹配，否则退回 (初始 TTL, 窗口) 和只按 TTL 判断。
+    """
+    initial = guess_initial_ttl(ttl)
+    if options:
+        sig = _pick(_BY_LAYOUT.get((initial, options), []), window, df)
+        if sig is not None:
+            return sig.name
+    if window:
+        sig = _pick(_BY_WINDOW.get((initial, window), []), window, df)
+        if sig is not None:
+            return sig.name
+    return TTL_FAMILIES.get(initial)
+
+
+class Observation(NamedTuple):
+    ttl: int
+    df: bool
+    window: Optional[int]       # ICMP 回包没有窗口
+    options: Optional[str]      # 只有 SYN-ACK 带有可用的选项
+    mss: Optional[int]
+    wscale: Optional[int]
+    seen: float                 # 记录时间（time.time()）
+
+    @property
+    def is_synack(self) -> bool:
+        return self.options is not None
+
+    def classify(self) -> Optional[str]:
+        return classify(self.ttl, self.window, self.options, self.df)
+
+
+_MAX_OBSERVATIONS = 65536
+# 已有 SYN-ACK 记录时，该时间（秒）内的 RST / ICMP 记录不覆盖它
+_SYNACK_PREFERENCE = 3600
+
+
+class ObservationStore:
+    """每台主机最近一次的回包特征，SYN-ACK 优先于 RST / ICMP，容量有上限"""
+
+    def __init__(self, max_size: int = _MAX_OBSERVATIONS):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Observation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def record(self, ip: str, observation: Observation):
+        with self._lock:
+            current = self._entries.get(ip)
+            if current is not None and current.is_synack and not observation.is_synack \
+                    and observation.seen - current.seen < _SYNACK_PREFERENCE:
+                return
+            self._entries[ip] = observation
+            self._entries.move_to_end(ip)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, ip: str, max_age: Optional[float] = None) -> Optional[Observation]:
+        observation = self._entries.get(ip)
+        if observation is None or (max_age is not None and time.time() - observation.seen > max_age):
+            return None
+        return observation
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_store = ObservationStore()
+
+
+def get_observations() -> ObservationStore:
+    """返回进程内各扫描引擎共享的回包特征记录"""
+    return _store
+
+
+def record_tcp_reply(hdr: IPv4Header, tcp: bytes, synack: bool):
+    """记录一个 SYN-ACK / RST 回包（tcp 从 TCP 头开始）；RST 的窗口和选项不反映系统特征，只记 TTL"""
+    if synack:
+        window = int.from_bytes(tcp[14:16], "big")
+        opts = parse_tcp_options(tcp)
+        observation = Observation(hdr.ttl, hdr.df, window, opts.layout, opts.mss, opts.wscale, time.time())
+    else:
+        observation = Observation(hdr.ttl, hdr.df, None, None, None, None, time.time())
+    _store.record(hdr.src, observation)
+
+
+def record_icmp_reply(hdr: IPv4Header):
+    _store.record(hdr.src, Observation(hdr.ttl, hdr.df, None, None, None, None, time.time()))
@@ -0,0 +1,461 @@
+"""
+扫描历史存储（SQLite）。
+
+每次扫描追加为一条 scans 记录和若干 results 行，只写入新增数据，不再整体重写文件；
+按 IP（整数形式，可做子网区间查询）、时间、端口建立索引，界面按页读取。
+首次打开时把旧的 data/scan_results.json 导入数据库，原文件保持不动，是否已导入记录在 meta 表中。
+"""
+import ipaddress
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from core.packet import ip_to_int
+from core.utils import get_runtime_data_path
+
+HISTORY_DB_FILE = "data/scan_history.db"
+LEGACY_HISTORY_FILE = "data/scan_results.json"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    finished REAL,
+    target TEXT,
+    scan_type TEXT,
+    host_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scan_id INTEGER NOT NULL REFERENCES scans(id),
+    ip TEXT NOT NULL,
+    ip_int INTEGER,
+    scan_type TEXT,
+    status TEXT,
+    open_ports TEXT,
+    port_count INTEGER NOT NULL DEFAULT 0,
+    services TEXT,
+    os TEXT
+);
+CREATE TABLE IF NOT EXISTS ports (
+    result_id INTEGER NOT NULL REFERENCES results(id),
+    scan_id INTEGER NOT NULL,
+    port INTEGER NOT NULL
+);
+-- 每台主机最近一次已知的状态，供增量扫描对比；普通扫描和增量扫描都会更新。
+-- scanned_ports 为检查过的端口（区间形式，如 1-1024,3389），NULL 表示未知（旧数据）
+CREATE TABLE IF NOT EXISTS host_state (
+    ip_int INTEGER PRIMARY KEY,
+    ip TEXT NOT NULL,
+    alive INTEGER NOT NULL,
+    open_ports TEXT,
+    last_seen REAL,
+    last_checked REAL,
+    scanned_ports TEXT
+);
+-- 增量扫描只保存变化：new_host / lost_host / opened / closed
+CREATE TABLE IF NOT EXISTS changes (
+    scan_id INTEGER NOT NULL REFERENCES scans(id),
+    ip TEXT NOT NULL,
+    ip_int INTEGER,
+    kind TEXT NOT NULL,
+    port INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_scans_started ON scans(started);
+CREATE INDEX IF NOT EXISTS idx_changes_scan ON changes(scan_id);
+CREATE INDEX IF NOT EXISTS idx_changes_ip ON changes(ip_int, scan_id);
+CREATE INDEX IF NOT EXISTS idx_results_scan ON results(scan_id);
+CREATE INDEX IF NOT EXISTS idx_results_ip ON results(ip_int, scan_id);
+CREATE INDEX IF NOT EXISTS idx_ports_port ON ports(port, scan_id);
+"""
+
+
+def _ip_int(ip: str) -> Optional[int]:
+    try:
+        return ip_to_int(ip)
+    except OSError:
+        return None
+
+
+def encode_ports(ports: Iterable[int]) -> str:
+    """[1, 2, 3, 80] -> 1-3,80（连续端口合并为区间）"""
+    runs = []
+    for port in sorted(set(ports)):
+        if runs and port == runs[-1][1] + 1:
+            runs[-1][1] = port
+        else:
+            runs.append([port, port])
+    return ",".join(str(lo) if lo == hi else f"{lo}-{hi}" for lo, hi in runs)
+
+
+def decode_ports(text: Optional[str]) -> Set[int]:
+    ports = set()
+    for part in (text or "").split(","):
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        ports.update(range(int(lo), int(hi or lo) + 1))
+    return ports
+
+
+def result_type(result: Dict) -> str:
+    """按结果内容判断扫描类型：有 open_ports 为端口扫描，有 status 为主机扫描"""
+    return result.get("scan_type") or (
+        "port" if "open_ports" in result else "host" if "status" in result else "unknown")
+
+
+class HistoryStore:
+    """
+    :param path: 数据库文件路径
+    :param legacy_json: 旧的 JSON 历史文件，数据库中尚未导入时自动迁移
+    """
+
+    def __init__(self, path: str, legacy_json: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(host_state)")}
+            if "scanned_ports" not in columns:
+                self._conn.execute("ALTER TABLE host_state ADD COLUMN scanned_ports TEXT")
+        if legacy_json:
+            self.migrate_json(legacy_json)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---- 写入 ----
+
+    def add_scan(self, results: Iterable[Dict], target: Optional[str] = None, scan_type: Optional[str] = None,
+                 started: Optional[float] = None, finished: Optional[float] = None,
+                 ports: Optional[Iterable[int]] = None) -> int:
+        """
+        追加一次扫描的全部结果（单个事务），返回扫描编号。
+        ports 为本次扫描检查的端口，主机状态只按这些端口更新；为 None 时只记录新发现的开放端口。
+        """
+        finished = time.time() if finished is None else finished
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO scans (started, finished, target, scan_type) VALUES (?, ?, ?, ?)",
+                (finished if started is None else started, finished, target, scan_type))
+            scan_id = cur.lastrowid
+            count = self._insert_results(scan_id, results, finished, ports)
+            self._conn.execute("UPDATE scans SET host_count = ? WHERE id = ?", (count, scan_id))
+        return scan_id
+
+    def begin_scan(self, target: Optional[str] = None, scan_type: Optional[str] = None,
+                   started: Optional[float] = None) -> int:
+        """开始一次分批写入的扫描（如分布式扫描），之后用 append_results 追加、finish_scan 结束"""
+        started = time.time() if started is None else started
+        with self._lock, self._conn:
+            cur = self._conn.execute("INSERT INTO scans (started, target, scan_type) VALUES (?, ?, ?)",
+                                     (started, target, scan_type))
+        return cur.lastrowid
+
+    def append_results(self, scan_id: int, results: Iterable[Dict], ports: Optional[Iterable[int]] = None) -> int:
+        """向 begin_scan 开始的扫描追加一批结果（单个事务），返回写入的条数；ports 同 add_scan"""
+        with self._lock, self._conn:
+            count = self._insert_results(scan_id, results, time.time(), ports)
+            self._conn.execute("UPDATE scans SET host_count = host_count + ? WHERE id = ?", (count, scan_id))
+        return count
+
+    def finish_scan(self, scan_id: int, finished: Optional[float] = None):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE scans SET finished = ? WHERE id = ?",
+                               (time.time() if finished is None else finished, scan_id))
+
+    def _insert_results(self, scan_id: int, results: Iterable[Dict], stamp: float,
+                        ports: Optional[Iterable[int]] = None) -> int:
+        scanned = None if ports is None else set(ports)
+        count = 0
+        for res in results:
+            ip = res.get("ip", "unknown")
+            open_ports = res.get("open_ports")
+            services = res.get("services")
+            cur = self._conn.execute(
+                "INSERT INTO results (scan_id, ip, ip_int, scan_type, status, open_ports, port_count, services, os)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (scan_id, ip, _ip_int(ip), result_type(res), res.get("status"),
+                 None if open_ports is None else ",".join(map(str, open_ports)),
+                 len(open_ports or ()),
+                 json.dumps(services, ensure_ascii=False) if services else None,
+                 res.get("os")))
+            if open_ports:
+                self._conn.executemany("INSERT INTO ports (result_id, scan_id, port) VALUES (?, ?, ?)",
+                                       [(cur.lastrowid, scan_id, port) for port in open_ports])
+            self._update_state(ip, bool(open_ports) or res.get("status") == "UP", open_ports, stamp,
+                               None if open_ports is None else scanned)
+            count += 1
+        return count
+
+    def _update_state(self, ip: str, alive: bool, open_ports: Optional[Iterable[int]], stamp: float,
+                      scanned: Optional[Set[int]] = None):
+        """
+        更新主机的最新状态。
+        open_ports 为 None（如主机扫描）时只更新在线状态，保留原有的端口记录；
+        否则只替换 scanned 范围内的端口状态，范围外已知的开放端口保留（只扫 80,443 的快速扫描
+        不会把其余端口记为关闭，也不会仅因这两个端口未开放就把主机记为离线）。
+        scanned 为 None 表示检查范围未知，只合并新发现的开放端口。
+        """
+        ip_int = _ip_int(ip)
+        if ip_int is None:
+            return
+        if open_ports is None:
+            self._conn.execute(
+                "INSERT INTO host_state (ip_int, ip, alive, last_seen, last_checked) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(ip_int) DO UPDATE SET alive = excluded.alive,"
+                " last_seen = COALESCE(excluded.last_seen, host_state.last_seen),"
+                " last_checked = excluded.last_checked",
+                (ip_int, ip, int(alive), stamp if alive else None, stamp))
+            return
+
+        row = self._conn.execute("SELECT alive, open_ports, scanned_ports FROM host_state WHERE ip_int = ?",
+                                 (ip_int,)).fetchone()
+        opened = set(open_ports)
+        if row is None:
+            covered = scanned
+        else:
+            before = decode_ports(row["open_ports"])
+            if scanned is None:
+                opened |= before
+                alive = alive or bool(row["alive"])
+                covered = None if row["scanned_ports"] is None else decode_ports(row["scanned_ports"]) | opened
+            else:
+                opened |= before - scanned
+                alive = alive or bool(opened)
+                # 旧记录没有检查范围时，把已知的开放端口视为检查过
+                previous = before if row["scanned_ports"] is None else decode_ports(row["scanned_ports"])
+                covered = previous | scanned
+        self._conn.execute(
+            "INSERT INTO host_state (ip_int, ip, alive, open_ports, last_seen, last_checked, scanned_ports)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(ip_int) DO UPDATE SET alive = excluded.alive, open_ports = excluded.open_ports,"
+            " last_seen = COALESCE(excluded.last_seen, host_state.last_seen),"
+            " last_checked = excluded.last_checked, scanned_ports = excluded.scanned_ports",
+            (ip_int, ip, int(alive), ",".join(map(str, sorted(opened))), stamp if alive else None, stamp,
+             None if covered is None else encode_ports(covered)))
+
+    def add_changes(self, diff: Dict, states: Dict[str, Optional[List[int]]], target: Optional[str] = None,
+                    started: Optional[float] = None, scanned: Optional[Dict[str, Iterable[int]]] = None) -> int:
+        """
+        保存一次增量扫描：只写入变化记录，并更新被检查主机的最新状态。
+        :param diff: {"new_hosts": [{"ip", "open_ports"}], "lost_hosts": [ip], "opened": {ip: [port]},
+                      "closed": {ip: [port]}}
+        :param states: 本次检查过的主机 -> 当前开放端口（None 表示已离线）
+        :param scanned: 主机 -> 本次检查过的端口，未给出的主机按检查范围未知处理
+        :return: 扫描编号
+        """
+        scanned = scanned or {}
+        finished = time.time()
+        rows = [(host["ip"], "new_host", None) for host in diff.get("new_hosts", [])]
+        rows += [(ip, "lost_host", None) for ip in diff.get("lost_hosts", [])]
+        for kind in ("opened", "closed"):
+            rows += [(ip, kind, port) for ip, ports in diff.get(kind, {}).items() for port in ports]
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO scans (started, finished, target, scan_type, host_count) VALUES (?, ?, ?, 'delta', ?)",
+                (finished if started is None else started, finished, target, len(rows)))
+            scan_id = cur.lastrowid
+            self._conn.executemany(
+                "INSERT INTO changes (scan_id, ip, ip_int, kind, port) VALUES (?, ?, ?, ?, ?)",
+                [(scan_id, ip, _ip_int(ip), kind, port) for ip, kind, port in rows])
+            for ip, open_ports in states.items():
+                ports = scanned.get(ip)
+                if open_ports is None:
+                    # 已确认离线（TCP Ping 也无回应）：清除已知的开放端口
+                    self._conn.execute("UPDATE host_state SET alive = 0, open_ports = '', last_checked = ?"
+                                       " WHERE ip_int = ?", (finished, _ip_int(ip)))
+                else:
+                    self._update_state(ip, True, open_ports, finished, None if ports is None else set(ports))
+        return scan_id
+
+    def next_rotation(self, target: str) -> int:
+        """返回并递增该目标的轮换计数，增量扫描据此选择本轮扫描的地址子集"""
+        key = f"rotation:{target}"
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            value = int(row[0]) if row else 0
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value + 1)))
+        return value
+
+    def migrate_json(self, path: str) -> int:
+        """把旧的 JSON 历史导入数据库（只执行一次，记录在 meta 的 migrated_json 中），返回导入的扫描数；原文件不改动"""
+        if not os.path.exists(path) or self._meta("migrated_json"):
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                history = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 迁移扫描历史时发生错误: {e}")
+            return 0
+        # 旧格式没有时间信息，统一使用文件的修改时间
+        stamp = os.path.getmtime(path)
+        with self._lock, self._conn:
+            for record in history:
+                cur = self._conn.execute(
+                    "INSERT INTO scans (started, finished, target, scan_type) VALUES (?, ?, NULL, NULL)",
+                    (stamp, stamp))
+                count = self._insert_results(cur.lastrowid, record.get("results", []), stamp)
+                self._conn.execute("UPDATE scans SET host_count = ? WHERE id = ?", (count, cur.lastrowid))
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', ?)", (path,))
+        print(f"✅ 已将 {len(history)} 条扫描历史迁移到 {self.path}")
+        return len(history)
+
+    def _meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    # ---- 查询 ----
+
+    def count_scans(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM scans").fetchone()[0]
+
+    def list_scans(self, offset: int = 0, limit: int = 20) -> List[Dict]:
+        """按时间倒序列出扫描记录（不含结果）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM scans ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return [dict(row) for row in rows]
+
+    def latest_scan(self, target: Optional[str] = None) -> Optional[Dict]:
+        with self._lock:
+            if target is None:
+                row = self._conn.execute("SELECT * FROM scans ORDER BY id DESC LIMIT 1").fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT * FROM scans WHERE target = ? ORDER BY id DESC LIMIT 1", (target,)).fetchone()
+        return dict(row) if row else None
+
+    def alive_hosts(self) -> Dict[str, List[int]]:
+        """上次已知在线的主机 -> 已知开放端口"""
+        return {ip: ports for ip, (ports, _) in self.host_states().items()}
+
+    def host_states(self) -> Dict[str, Tuple[List[int], Optional[Set[int]]]]:
+        """上次已知在线的主机 -> (已知开放端口, 检查过的端口；未知时为 None)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ip, open_ports, scanned_ports FROM host_state WHERE alive = 1").fetchall()
+        return {row[0]: ([int(port) for port in (row[1] or "").split(",") if port],
+                         None if row[2] is None else decode_ports(row[2])) for row in rows}
+
+    def changes(self, scan_id: Optional[int] = None, ip: Optional[str] = None, limit: int = 1000) -> List[Dict]:
+        """查询增量扫描记录下的变化"""
+        where, params = [], []
+        if scan_id is not None:
+            where.append("c.scan_id = ?")
+            params.append(scan_id)
+        if ip:
+            where.append("c.ip_int = ?")
+            params.append(_ip_int(ip))
+        sql = ("SELECT c.*, s.started AS scan_time, s.target AS scan_target FROM changes c"
+               " JOIN scans s ON s.id = c.scan_id")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY c.scan_id DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    def scan_results(self, scan_id: int) -> List[Dict]:
+        return self.query(scan_id=scan_id, limit=None)
+
+    def query(self, ip: Optional[str] = None, subnet: Optional[str] = None, port: Optional[int] = None,
+              since: Optional[float] = None, until: Optional[float] = None, scan_id: Optional[int] = None,
+              interesting: bool = False, offset: int = 0, limit: Optional[int] = 200) -> List[Dict]:
+        """
+        按条件查询历史结果，按扫描倒序排列，每行附带所属扫描的编号、时间和目标。
+        :param subnet: CIDR，如 "192.168.1.0/24"，按 IP 整数区间使用索引
+        :param port: 只返回该端口开放的结果
+        :param interesting: 跳过没有开放端口的端口扫描结果
+        """
+        where, params = self._conditions(ip, subnet, port, since, until, scan_id, interesting)
+        sql = ("SELECT r.*, s.started AS scan_time, s.target AS scan_target FROM results r"
+               " JOIN scans s ON s.id = r.scan_id")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY r.scan_id DESC, r.id"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_result(row) for row in rows]
+
+    def count(self, **conditions) -> int:
+        """与 query 条件相同的结果行数（用于分页）"""
+        where, params = self._conditions(**conditions)
+        sql = "SELECT COUNT(*) FROM results r JOIN scans s ON s.id = r.scan_id"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    @staticmethod
+    def _conditions(ip=None, subnet=None, port=None, since=None, until=None, scan_id=None, interesting=False):
+        where, params = [], []
+        if ip:
+            where.append("r.ip_int = ?")
+            params.append(_ip_int(ip))
+        if subnet:
+            try:
+                network = ipaddress.IPv4Network(subnet, strict=False)
+            except ValueError:
+                raise ValueError(f"无效的子网格式: {subnet}")
+            where.append("r.ip_int BETWEEN ? AND ?")
+            params += [int(network.network_address), int(network.broadcast_address)]
+        if port is not None:
+            where.append("r.id IN (SELECT result_id FROM ports WHERE port = ?)")
+            params.append(port)
+        if since is not None:
+            where.append("s.started >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("s.started < ?")
+            params.append(until)
+        if scan_id is not None:
+            where.append("r.scan_id = ?")
+            params.append(scan_id)
+        if interesting:
+            where.append("NOT (r.scan_type = 'port' AND r.port_count = 0)")
+        return where, params
+
+    @staticmethod
+    def _to_result(row) -> Dict:
+        result = {"ip": row["ip"], "scan_type": row["scan_type"], "scan_id": row["scan_id"],
+                  "scan_time": row["scan_time"], "scan_target": row["scan_target"]}
+        if row["status"] is not None:
+            result["status"] = row["status"]
+        if row["open_ports"] is not None:
+            result["open_ports"] = [int(port) for port in row["open_ports"].split(",") if port]
+        if row["services"]:
+            result["services"] = {int(port): name for port, name in json.loads(row["services"]).items()}
+        if row["os"]:
+            result["os"] = row["os"]
+        return result
+
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """返回进程内共享的历史存储（data/scan_history.db），首次打开时迁移旧的 JSON 历史"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore(get_runtime_data_path(HISTORY_DB_FILE),
+                                  legacy_json=get_runtime_data_path(LEGACY_HISTORY_FILE))
+        return _store
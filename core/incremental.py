@@ -0,0 +1,132 @@
+"""
+增量（差异）扫描：利用历史中记录的主机状态，只检查可能变化的部分。
+
+1. 先复查上次在线的主机上曾开放的端口，最快发现服务关闭；
+2. 再扫描这些主机的其余端口，发现新开放的端口，仍无回应的主机用 TCP Ping 确认是否离线；
+3. 其余地址按轮换子集扫描：每次只扫 1/rotation，rotation 次后覆盖整个目标范围。
+结果为与上次状态的差异（新增/消失的主机、新开放/关闭的端口），历史中只保存这些差异。
+"""
+from typing import Callable, Dict, List, Optional
+
+from core.async_scanner import DEFAULT_CONCURRENCY, resolve_timing, tcp_ping_sweep
+from core.discovery import DEFAULT_TCP_PING_PORTS
+from core.history import get_history_store
+from core.packet import int_to_ip, ip_to_int
+from core.port_scanner import scan_hosts
+from core.utils import iter_targets
+
+DEFAULT_ROTATION = 4  # 未知地址分几轮扫完
+
+
+class IncrementalScan:
+    """
+    :param ports: 要检查的端口
+    :param rotation: 未知地址的轮换份数，1 表示每次都全部扫描
+    :param engine: 端口扫描引擎，同 scan_port
+    :param store: 历史存储，默认使用 data/ 下的共享存储
+    :param on_result: 每台主机得出当前状态时回调 {"ip": ..., "open_ports": [...]}
+    :param progress: core.utils.ScanProgress，按探测推进
+    """
+
+    def __init__(self, ports=range(1, 1025), rotation: int = DEFAULT_ROTATION, engine: str = "async",
+                 timeout: Optional[float] = None, concurrency: int = DEFAULT_CONCURRENCY, timing=None,
+                 store=None, on_result: Optional[Callable[[Dict], None]] = None, progress=None):
+        self.ports = sorted(set(ports))
+        self.rotation = max(1, rotation)
+        self.engine = engine
+        self.concurrency = concurrency
+        self.timing = resolve_timing(timing, timeout)
+        self.store = store or get_history_store()
+        self.on_result = on_result
+        self.progress = progress
+        self.results: List[Dict] = []
+
+    def _scan(self, ip_list, ports, on_result=None):
+        return scan_hosts(ip_list, ports, engine=self.engine, concurrency=self.concurrency,
+                          on_result=on_result, progress=self.progress, timing=self.timing)
+
+    def _rotating_subset(self, targets, known, round_index: int):
+        """本轮负责的未知地址：扫描顺序下标对 rotation 取模等于轮次的地址，直接按下标定位，不遍历全部目标"""
+        for position in range(round_index % self.rotation, targets.size, self.rotation):
+            value = targets.at(position)
+            if targets.is_excluded(value):
+                continue
+            ip = int_to_ip(value)
+            if ip not in known:
+                yield ip
+
+    def run(self, subnet: str) -> Dict:
+        targets = iter_targets(subnet)
+        states_before = {ip: state for ip, state in self.store.host_states().items() if ip_to_int(ip) in targets}
+        known = {ip: ports for ip, (ports, _) in states_before.items()}
+        known_set = set(port for ports in known.values() for port in ports)
+        known_ports = sorted(known_set)
+        other_ports = [port for port in self.ports if port not in known_set]
+        round_index = self.store.next_rotation(subnet)
+        sweep_count = max(0, -(-(len(targets) - len(known)) // self.rotation))
+        if self.progress:
+            self.progress.total = (len(known) * (len(known_ports) + len(other_ports))
+                                   + sweep_count * len(self.ports))
+
+        # 1. 已知开放端口，2. 已知在线主机的其余端口
+        current = {ip: set() for ip in known}
+        for result in self._scan(list(known), known_ports):
+            current[result["ip"]].update(result["open_ports"])
+        for result in self._scan(list(known), other_ports):
+            current[result["ip"]].update(result["open_ports"])
+
+        # 没有任何开放端口的主机，用 TCP Ping（SYN-ACK 或 RST 均算在线）确认是否离线
+        silent = [ip for ip, ports in current.items() if not ports]
+        alive_silent = {result["ip"] for result in tcp_ping_sweep(
+            silent, DEFAULT_TCP_PING_PORTS, concurrency=self.concurrency, timing=self.timing)
+            if result["status"] == "UP"} if silent else set()
+
+        diff = {"new_hosts": [], "lost_hosts": [], "opened": {}, "closed": {}}
+        states: Dict[str, Optional[List[int]]] = {}
+        checked_ports = known_set.union(self.ports)
+        scanned = {ip: checked_ports for ip in known}
+        for ip, ports in current.items():
+            before = set(known[ip])
+            if not ports and ip not in alive_silent:
+                diff["lost_hosts"].append(ip)
+                states[ip] = None
+                continue
+            states[ip] = sorted(ports)
+            # 只比较上次也检查过的端口：上次未检查的端口开放不算变化（检查范围未知时全部比较）
+            previously_scanned = states_before[ip][1]
+            opened = ports - before if previously_scanned is None else (ports - before) & previously_scanned
+            if opened:
+                diff["opened"][ip] = sorted(opened)
+            if before - ports:
+                diff["closed"][ip] = sorted(before - ports)
+            self._emit({"ip": ip, "open_ports": sorted(ports)})
+
+        # 3. 轮换子集中的未知地址，有开放端口即为新主机
+        def on_swept(result):
+            if result["open_ports"]:
+                diff["new_hosts"].append(result)
+                states[result["ip"]] = result["open_ports"]
+                scanned[result["ip"]] = self.ports
+                self._emit(result)
+
+        self._scan(self._rotating_subset(targets, known, round_index), self.ports, on_swept)
+
+        diff["checked"] = len(known)
+        diff["swept"] = sweep_count
+        diff["scan_id"] = self.store.add_changes(diff, states, target=subnet, scanned=scanned)
+        return diff
+
+    def _emit(self, result):
+        self.results.append(result)
+        if self.on_result:
+            self.on_result(result)
+
+
+def incremental_scan(subnet: str, ports=range(1, 1025), **kwargs) -> Dict:
+    """
+    基于历史状态对目标做增量扫描，返回差异：
+    {"new_hosts": [{"ip", "open_ports"}], "lost_hosts": [ip], "opened": {ip: [port]},
+     "closed": {ip: [port]}, "checked": 复查的已知主机数, "swept": 本轮扫描的未知地址数, "scan_id": ...}
+    其余参数同 IncrementalScan。
+    """
+    return IncrementalScan(ports=ports, **kwargs).run(subnet)
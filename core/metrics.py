@@ -0,0 +1,446 @@
+"""
+扫描指标与性能剖析。
+
+进程内的指标注册表，各扫描模块在热路径上直接更新：
+- 计数器：发出的探测、收到的回应、重传、超时、按 errno 分类的错误（按引擎区分）
+- 仪表：在途探测数、打开的套接字数、流水线各阶段的队列长度
+- 直方图：各阶段的耗时（探测 RTT、服务识别、操作系统识别、界面刷新）
+可导出为 Prometheus 文本格式或 JSON，界面的“性能指标”标签页定时读取。
+
+性能剖析（ScanProfiler）可在一次扫描期间开启：
+- cprofile：cProfile 记录发起扫描的线程（事件循环所在线程），输出 .prof 和按累计耗时排序的摘要
+- sample：后台线程定期采样所有线程的调用栈，输出 collapsed stack 格式（可直接生成火焰图）
+多进程 / 分布式扫描时，子进程和工作端的指标不汇总到本进程。
+"""
+import bisect
+import errno
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILE_DIR = "data/profiles"
+SAMPLE_INTERVAL = 0.005    # 采样剖析的采样间隔（秒）
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def get(self) -> float:
+        return self.value
+
+    def reset(self):
+        with self._lock:
+            self.value = 0.0
+
+
+class _GaugeValue(_CounterValue):
+    def __init__(self):
+        super().__init__()
+        self._function: Optional[Callable[[], float]] = None
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, function: Optional[Callable[[], float]]):
+        """读取时调用 function 取值（如队列长度），不必在每次变化时更新"""
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception:
+                return self.value
+        return self.value
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # 最后一个为 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.sum = 0.0
+            self.count = 0
+
+    def time(self):
+        """with metric.time(): ... 记录代码块的耗时"""
+        return _Timer(self)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶边界估算分位数（落在 +Inf 桶时返回最大的有限边界）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class _Timer:
+    def __init__(self, histogram: _HistogramValue):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Metric:
+    """
+    一个指标及其按标签区分的取值。没有标签的指标可以直接调用 inc / set / observe，
+    有标签时先用 labels(...) 取得对应的取值对象；热路径上应在模块级缓存 labels 的返回值。
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), **options):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._options = options
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        key = tuple(str(value) for value in values) or tuple(str(kwargs[name]) for name in self.labelnames)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+        value = self._values.get(key)
+        if value is None:
+            with self._lock:
+                value = self._values.setdefault(key, self._new_value())
+        return value
+
+    def items(self) -> List[Tuple[Dict[str, str], object]]:
+        with self._lock:
+            values = list(self._values.items())
+        return [(dict(zip(self.labelnames, key)), value) for key, value in values]
+
+    def reset(self):
+        # 只清零取值，不删除：各模块在模块级缓存了 labels() 返回的对象
+        for _, value in self.items():
+            value.reset()
+
+    def __getattr__(self, attr):
+        # 无标签指标：metric.inc() 等同于 metric.labels().inc()
+        if attr.startswith("_") or self.labelnames:
+            raise AttributeError(attr)
+        return getattr(self.labels(), attr)
+
+
+class CounterMetric(Metric):
+    kind = "counter"
+
+    def _new_value(self):
+        return _CounterValue()
+
+
+class GaugeMetric(Metric):
+    kind = "gauge"
+
+    def reset(self):
+        pass  # 仪表反映当前状态（在途探测、打开的套接字），不随扫描清零
+
+    def _new_value(self):
+        return _GaugeValue()
+
+
+class HistogramMetric(Metric):
+    kind = "histogram"
+
+    def _new_value(self):
+        return _HistogramValue(self._options.get("buckets", DEFAULT_BUCKETS))
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def _register(self, metric_class, name, help_text, labelnames=(), **options) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, help_text, labelnames, **options)
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> CounterMetric:
+        return self._register(CounterMetric, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> GaugeMetric:
+        return self._register(GaugeMetric, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> HistogramMetric:
+        return self._register(HistogramMetric, name, help_text, labelnames, buckets=tuple(buckets))
+
+    def metrics(self) -> List[Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def reset(self):
+        """每次扫描开始时把计数器和直方图清零（界面和导出的数值都从本次扫描算起）"""
+        for metric in self.metrics():
+            metric.reset()
+        self.started = time.time()
+
+    # ---- 导出 ----
+
+    def snapshot(self) -> Dict:
+        """JSON 友好的快照：{名称: {"type", "help", "values": [{"labels", ...}]}}"""
+        result = {}
+        for metric in self.metrics():
+            values = []
+            for labels, value in metric.items():
+                if metric.kind == "histogram":
+                    values.append({"labels": labels, "count": value.count, "sum": round(value.sum, 6),
+                                   "buckets": dict(zip([str(b) for b in value.buckets] + ["+Inf"],
+                                                       _cumulative(value.counts))),
+                                   "p50": value.quantile(0.5), "p95": value.quantile(0.95)})
+                else:
+                    values.append({"labels": labels, "value": value.get()})
+            result[metric.name] = {"type": metric.kind, "help": metric.help, "values": values}
+        return {"started": self.started, "collected": time.time(), "metrics": result}
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in metric.items():
+                if metric.kind == "histogram":
+                    bounds = [_format_number(bound) for bound in value.buckets] + ["+Inf"]
+                    for bound, total in zip(bounds, _cumulative(value.counts)):
+                        lines.append(f"{metric.name}_bucket{_format_labels(dict(labels, le=bound))} {total}")
+                    lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_number(value.sum)}")
+                    lines.append(f"{metric.name}_count{_format_labels(labels)} {value.count}")
+                else:
+                    lines.append(f"{metric.name}{_format_labels(labels)} {_format_number(value.get())}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        _write_atomic(path, self.to_prometheus())
+
+    def write_json(self, path: str):
+        _write_atomic(path, json.dumps(self.snapshot(), ensure_ascii=False, indent=2))
+
+    def write(self, path: str):
+        """按扩展名选择格式：.json 写 JSON，其余写 Prometheus 文本"""
+        if path.lower().endswith(".json"):
+            self.write_json(path)
+        else:
+            self.write_prometheus(path)
+
+
+def _cumulative(counts: List[int]) -> List[int]:
+    total, result = 0, []
+    for count in counts:
+        total += count
+        result.append(total)
+    return result
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path: str, text: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    """返回进程内共享的指标注册表"""
+    return _registry
+
+
+# ---- 扫描模块使用的指标 ----
+
+PROBES_SENT = _registry.counter("scanner_probes_sent_total", "发出的探测数（含重传）", ["engine"])
+REPLIES = _registry.counter("scanner_replies_total", "收到回应的探测数（SYN-ACK / RST / echo reply）", ["engine"])
+RETRIES = _registry.counter("scanner_retries_total", "重传次数", ["engine"])
+TIMEOUTS = _registry.counter("scanner_timeouts_total", "等待回应超时的探测数", ["engine"])
+ERRORS = _registry.counter("scanner_errors_total", "按 errno 分类的探测错误", ["engine", "errno"])
+IN_FLIGHT = _registry.gauge("scanner_probes_in_flight", "在途探测数（全局限速器的窗口占用）")
+OPEN_SOCKETS = _registry.gauge("scanner_open_sockets", "扫描引擎当前打开的套接字数")
+QUEUE_DEPTH = _registry.gauge("scanner_queue_depth", "流水线各阶段等待处理的主机数", ["queue"])
+STAGE_SECONDS = _registry.histogram("scanner_stage_seconds", "各阶段单次操作的耗时（秒）", ["stage"])
+
+
+def record_error(engine: str, err: int):
+    ERRORS.labels(engine, errno.errorcode.get(err, str(err))).inc()
+
+
+def _limiter_in_flight():
+    from core.ratelimit import get_rate_limiter
+    return get_rate_limiter().in_flight
+
+
+IN_FLIGHT.set_function(_limiter_in_flight)
+
+
+class MetricsExporter:
+    """
+    with MetricsExporter("scan.prom", interval=10): ...
+    扫描期间每 interval 秒把指标写到 path（可供 node_exporter 的 textfile 收集器读取），结束时再写一次。
+    interval 为 0 时只在结束时写出。
+    """
+
+    def __init__(self, path: str, interval: float = 0, registry: Optional[MetricsRegistry] = None):
+        self.path = path
+        self.interval = interval
+        self.registry = registry or _registry
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._loop, name="metrics-exporter", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.registry.write(self.path)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.registry.write(self.path)
+            except OSError as e:
+                print(f"⚠️ 写出扫描指标失败：{e}")
+
+
+# ---- 性能剖析 ----
+
+class ScanProfiler:
+    """
+    with ScanProfiler("cprofile"): scan_port(...)
+    mode 为 "cprofile" 或 "sample"；path 为输出文件前缀，默认 data/profiles/scan-时间。
+    结束后 output 为写出的文件列表。
+    """
+
+    MODES = ("cprofile", "sample")
+
+    def __init__(self, mode: str = "cprofile", path: Optional[str] = None, interval: float = SAMPLE_INTERVAL):
+        if mode not in self.MODES:
+            raise ValueError(f"未知剖析方式：{mode}")
+        self.mode = mode
+        self.path = path
+        self.interval = interval
+        self.output: List[str] = []
+        self._profile = None
+        self._samples = _Tally()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.path is None:
+            from core.utils import get_runtime_data_path
+            self.path = get_runtime_data_path(os.path.join(PROFILE_DIR, time.strftime("scan-%Y%m%d-%H%M%S")))
+        if self.mode == "cprofile":
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._thread = threading.Thread(target=self._sample_loop, name="scan-profiler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.mode == "cprofile":
+            self._profile.disable()
+            self._profile.dump_stats(self.path + ".prof")
+            import io
+            import pstats
+            summary = io.StringIO()
+            pstats.Stats(self._profile, stream=summary).sort_stats("cumulative").print_stats(40)
+            with open(self.path + ".txt", "w", encoding="utf-8") as f:
+                f.write(summary.getvalue())
+            self.output = [self.path + ".prof", self.path + ".txt"]
+        else:
+            self._stop.set()
+            self._thread.join()
+            with open(self.path + ".folded", "w", encoding="utf-8") as f:
+                for stack, count in self._samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            self.output = [self.path + ".folded"]
+        print(f"性能剖析结果已写入：{', '.join(self.output)}")
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if ident not in names:
+                    names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                self._samples[";".join([names.get(ident, str(ident))] + stack[::-1])] += 1
@@ -1,46 +1,191 @@
-import scapy.all as scapy
+import atexit
 import logging
-from typing import Dict
-from functools import lru_cache
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+from core import metrics
+from core.cache import PersistentCache
+from core.fingerprints import UNKNOWN_OS, Observation, get_observations
+from core.ratelimit import NEUTRAL, REPLY, get_rate_limiter
+from core.timing import get_timing
+from core.utils import get_runtime_data_path
 # 设置日志记录
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 定义操作系统指纹的常见TTL值和窗口大小
-OS_FINGERPRINTS = {
-    "Windows": {"TTL": (128, 255), "Window": (8192, 65535)},
-    "Linux": {"TTL": (64, 128), "Window": (5840, 64240)},
-    "Mac OS": {"TTL": (64, 128), "Window": (8192, 65535)},
-    "Router/Cisco": {"TTL": (255, 255), "Window": (2048, 4096)},
-}
-
-def guess_initial_ttl(ttl):
-    for likely in [32, 64, 128, 255]:
-        if ttl <= likely:
-            return likely
-    return ttl
-
-@lru_cache(maxsize=128)
-def os_fingerprint(ip: str) -> str:
+FINGERPRINT_PORTS = [22, 80, 443, 8000]
+ERROR_OS = "错误"
+
+OS_CACHE_FILE = "data/os_cache.json"
+OS_CACHE_TTL = 24 * 3600   # 识别结果的有效期（秒），过期后重新探测
+OS_CACHE_SIZE = 4096       # 缓存的主机数上限，超出后淘汰最久未使用的主机
+DEFAULT_OS_WORKERS = 32
+
+# scapy 的选项名 -> p0f 风格的单字母记法（与 core.packet.TCP_OPTION_CODES 一致）
+_SCAPY_OPTION_CODES = {"EOL": "E", "NOP": "N", "MSS": "M", "WScale": "W", "SAckOK": "S", "SAck": "K",
+                       "Timestamp": "T"}
+
+# 与 SYN 扫描使用相同的 SYN 选项，对端才会在 SYN-ACK 中给出完整的选项顺序
+_SYN_OPTIONS = [("MSS", 1460), ("SAckOK", b""), ("Timestamp", (1, 0)), ("NOP", None), ("WScale", 10)]
+
+
+def _observe(response) -> Observation:
+    """把 scapy 收到的 SYN-ACK / RST 转成 Observation 并记录下来"""
+    from scapy.layers.inet import TCP
+
+    tcp = response[TCP]
+    options = dict((name, value) for name, value in tcp.options if isinstance(name, str))
+    synack = tcp.flags & 0x12 == 0x12
+    layout = None
+    if synack:
+        codes = []
+        for name, _ in tcp.options:
+            codes.append(_SCAPY_OPTION_CODES.get(name, f"?{name}"))
+            if name == "EOL":
+                break
+        layout = ",".join(codes)
+    observation = Observation(
+        ttl=response.ttl,
+        df=bool(response.flags & 0x2),
+        window=tcp.window if synack else None,
+        options=layout,
+        mss=options.get("MSS") if synack else None,
+        wscale=options.get("WScale") if synack else None,
+        seen=time.time(),
+    )
+    get_observations().record(response.src, observation)
+    return observation
+
+
+def probe_os(ip: str, ports: Iterable[int] = FINGERPRINT_PORTS) -> str:
+    """同时向 ports 发送 SYN，优先用 SYN-ACK 的特征识别，否则用 RST 的 TTL"""
+    # scapy 只在第一次主动探测时导入，且只导入用到的协议层
+    from scapy.layers.inet import IP, TCP
+    from scapy.sendrecv import sr
+
+    ports = list(ports)
+    packets = IP(dst=ip)/TCP(dport=ports, flags="S", options=_SYN_OPTIONS)
+    limiter = get_rate_limiter()
+    limiter.acquire(len(ports))
+    answered = []
     try:
-        for port in [22, 80, 443, 8000]:
-            syn_packet = scapy.IP(dst=ip)/scapy.TCP(dport=port, flags="S")
-            response = scapy.sr1(syn_packet, timeout=1, verbose=0)
-
-            if response and response.haslayer(scapy.TCP):
-                ttl = response.ttl
-                window = response[scapy.TCP].window
-                flags = response[scapy.TCP].flags
-                logger.debug(f"收到响应: TTL={ttl} Window={window} Flags={flags}")
-
-                init_ttl = guess_initial_ttl(ttl)
-
-                for os_name, params in OS_FINGERPRINTS.items():
-                    ttl_min, ttl_max = params["TTL"]
-                    win_min, win_max = params["Window"]
-                    if ttl_min <= init_ttl <= ttl_max and win_min <= window <= win_max:
-                        return os_name
-        return "未知操作系统"
+        answered, _ = sr(packets, timeout=get_timing().timeout(ip), verbose=0)
+    finally:
+        limiter.release(REPLY if answered else NEUTRAL, len(ports))
+
+    observations = []
+    for _, response in answered:
+        if response.haslayer(TCP):
+            observation = _observe(response)
+            logger.debug(f"收到响应: TTL={observation.ttl} Window={observation.window} "
+                         f"Options={observation.options}")
+            observations.append(observation)
+    # SYN-ACK 排在 RST 前面
+    observations.sort(key=lambda observation: not observation.is_synack)
+    for observation in observations:
+        os_name = observation.classify()
+        if os_name:
+            return os_name
+    return UNKNOWN_OS
+
+
+class OsFingerprintCache(PersistentCache):
+    """ip -> 操作系统 的识别结果缓存"""
+
+    def __init__(self, path: Optional[str] = None, ttl: float = OS_CACHE_TTL, max_size: int = OS_CACHE_SIZE):
+        super().__init__(path, ttl, max_size)
+
+
+_cache: Optional[OsFingerprintCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_os_cache() -> OsFingerprintCache:
+    """返回进程内共享的识别缓存（首次使用时从 data/ 目录加载）"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OsFingerprintCache(get_runtime_data_path(OS_CACHE_FILE))
+            atexit.register(_cache.save)
+        return _cache
+
+
+def os_fingerprint(ip: str, refresh: bool = False) -> str:
+    """
+    识别主机的操作系统，依次使用：
+    1. 缓存中未过期的识别结果；
+    2. 扫描过程中记录的回包特征（SYN 扫描的 SYN-ACK / RST、ICMP 回包），不再发包；
+    3. 都没有时主动发送 SYN 探测。
+    refresh=True 时跳过前两步，强制重新探测。
+    """
+    cache = get_os_cache()
+    if not refresh:
+        cached = cache.get(ip)
+        if cached is not None:
+            return cached
+        observation = get_observations().get(ip, max_age=cache.ttl)
+        result = observation.classify() if observation is not None else None
+        if result:
+            cache.put(ip, result)
+            return result
+    try:
+        with metrics.STAGE_SECONDS.labels("os").time():
+            result = probe_os(ip)
     except Exception as e:
         logger.error(f"探测失败: {str(e)}", exc_info=True)
-        return "错误"
+        return ERROR_OS
+    cache.put(ip, result)
+    return result
+
+
+class FingerprintService:
+    """
+    后台操作系统识别服务：线程池并发识别多台主机，每台主机得出结果即回调，
+    同一主机同时只探测一次。所有主机完成后把缓存写回磁盘。
+    回调在工作线程中执行，界面需要通过信号转到主线程。
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_OS_WORKERS, cache: Optional[OsFingerprintCache] = None):
+        self.cache = cache or get_os_cache()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="os-fingerprint")
+        # ip -> 等待该主机结果的回调列表
+        self._waiters: Dict[str, List[Callable[[str, str], None]]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, ips: Iterable[str], on_result: Callable[[str, str], None]) -> Dict[str, str]:
+        """
+        提交一批主机。缓存命中的结果直接返回 {ip: 操作系统}，
+        其余主机在后台探测，完成后调用 on_result(ip, 操作系统)。
+        """
+        cached = {}
+        for ip in ips:
+            os_name = self.cache.get(ip)
+            if os_name is not None:
+                cached[ip] = os_name
+                continue
+            with self._lock:
+                waiters = self._waiters.get(ip)
+                if waiters is not None:
+                    waiters.append(on_result)
+                    continue
+                self._waiters[ip] = [on_result]
+            self._executor.submit(self._run, ip)
+        return cached
+
+    def _run(self, ip: str):
+        os_name = os_fingerprint(ip)
+        with self._lock:
+            waiters = self._waiters.pop(ip, [])
+            idle = not self._waiters
+        for callback in waiters:
+            callback(ip, os_name)
+        if idle:
+            self.cache.save()
+
+    def pending(self) -> int:
+        return len(self._waiters)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.cache.save()
@@ -0,0 +1,161 @@
+"""
+扫描结果的流式输出：JSONL、greppable（同 nmap -oG）和 nmap 兼容的 XML（同 nmap -oX）。
+
+每台主机得出结果就立即写出并刷新，不在内存中缓存结果列表，输出可以直接通过管道交给其他程序处理。
+XML 先写出 <nmaprun> 开头，逐台主机追加 <host>，扫描结束时再补上 <runstats> 和结尾标签。
+"""
+import json
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, TextIO
+from html import escape
+
+from core.service_probe import guess_service
+
+SCANNER_NAME = "nmap-visual-scanner"
+XML_OUTPUT_VERSION = "1.05"
+
+
+def quoteattr(value: str) -> str:
+    # 不用 xml.sax.saxutils：它会连带导入 urllib，拖慢命令行启动
+    return f'"{escape(value, quote=True)}"'
+
+
+def _split_service(text: str):
+    """"SSH (OpenSSH 8.9p1)" -> ("SSH", "OpenSSH 8.9p1")"""
+    name, sep, detail = text.partition(" (")
+    return name, detail[:-1] if sep and detail.endswith(")") else None
+
+
+class ResultWriter:
+    """
+    输出格式的基类：start 写文件头，write 写一台主机（可在多个扫描线程中调用），finish 写汇总。
+    :param stream: 输出流，默认标准输出
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream or sys.stdout
+        self.hosts_up = 0
+        self.hosts_down = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def start(self, args: str, scan_type: str):
+        self.started = time.time()
+        self._emit(self.header(args, scan_type))
+
+    def write(self, result: Dict):
+        with self._lock:
+            if result.get("status", "UP") == "UP":
+                self.hosts_up += 1
+            else:
+                self.hosts_down += 1
+        self._emit(self.format(result))
+
+    def finish(self, total: int):
+        self._emit(self.footer(total, time.time() - self.started))
+
+    def _emit(self, text: str):
+        if not text:
+            return
+        with self._lock:
+            self.stream.write(text)
+            self.stream.flush()
+
+    def header(self, args: str, scan_type: str) -> str:
+        return ""
+
+    def format(self, result: Dict) -> str:
+        raise NotImplementedError
+
+    def footer(self, total: int, elapsed: float) -> str:
+        return ""
+
+
+class JsonlWriter(ResultWriter):
+    """每行一个 JSON 对象，与 scan_port / pipeline_scan 返回的结果字段相同"""
+
+    def format(self, result: Dict) -> str:
+        return json.dumps(result, ensure_ascii=False) + "\n"
+
+
+class GrepableWriter(ResultWriter):
+    """nmap -oG 格式：每台主机一行状态，有开放端口时再加一行端口，字段以制表符分隔"""
+
+    def header(self, args: str, scan_type: str) -> str:
+        return f"# {SCANNER_NAME} scan initiated {time.ctime(self.started)} as: {args}\n"
+
+    def format(self, result: Dict) -> str:
+        ip = result["ip"]
+        status = "Up" if result.get("status", "UP") == "UP" else "Down"
+        line = f"Host: {ip} ()\tStatus: {status}\n"
+        if not result.get("open_ports"):
+            return line
+        services = result.get("services", {})
+        ports = []
+        for port in result["open_ports"]:
+            name, detail = _split_service(services.get(port) or guess_service(port))
+            # 端口/状态/协议/所有者/服务/RPC 信息/版本/，字段内的 / 和 , 需要替换
+            fields = [str(port), "open", "tcp", "", name, "", detail or ""]
+            ports.append("/".join(field.replace("/", "|").replace(",", " ") for field in fields) + "/")
+        line += f"Host: {ip} ()\tPorts: {', '.join(ports)}"
+        if result.get("os"):
+            line += f"\tOS: {result['os']}"
+        return line + "\n"
+
+    def footer(self, total: int, elapsed: float) -> str:
+        return (f"# {SCANNER_NAME} done at {time.ctime()} -- {total} IP addresses "
+                f"({self.hosts_up} hosts up) scanned in {elapsed:.2f} seconds\n")
+
+
+class XmlWriter(ResultWriter):
+    """nmap -oX 兼容的 XML：<nmaprun> 下每台主机一个 <host>"""
+
+    def header(self, args: str, scan_type: str) -> str:
+        start = int(self.started)
+        return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<!DOCTYPE nmaprun>\n'
+                f'<nmaprun scanner={quoteattr(SCANNER_NAME)} args={quoteattr(args)} start="{start}" '
+                f'startstr={quoteattr(time.ctime(start))} xmloutputversion="{XML_OUTPUT_VERSION}">\n'
+                f'<scaninfo type={quoteattr(scan_type)} protocol="tcp"/>\n')
+
+    def format(self, result: Dict) -> str:
+        state = "up" if result.get("status", "UP") == "UP" else "down"
+        now = int(time.time())
+        lines: List[str] = [
+            f'<host starttime="{int(self.started)}" endtime="{now}">'
+            f'<status state="{state}" reason="{"syn-ack" if "open_ports" in result else "echo-reply"}"/>',
+            f'<address addr={quoteattr(result["ip"])} addrtype="ipv4"/>',
+            "<hostnames/>",
+        ]
+        if result.get("open_ports"):
+            services = result.get("services", {})
+            lines.append("<ports>")
+            for port in result["open_ports"]:
+                probed = port in services
+                name, detail = _split_service(services.get(port) or guess_service(port))
+                product = f" product={quoteattr(detail)}" if detail else ""
+                lines.append(f'<port protocol="tcp" portid="{port}"><state state="open" reason="syn-ack"/>'
+                             f'<service name={quoteattr(name)}{product} '
+                             f'method="{"probed" if probed else "table"}" conf="{10 if probed else 3}"/></port>')
+            lines.append("</ports>")
+        if result.get("os"):
+            lines.append(f'<os><osmatch name={quoteattr(result["os"])} accuracy="85"/></os>')
+        if result.get("error"):
+            lines.append(f"<!-- {escape(result['error'], quote=False).replace('--', '- -')} -->")
+        lines.append("</host>")
+        return "\n".join(lines) + "\n"
+
+    def footer(self, total: int, elapsed: float) -> str:
+        end = int(time.time())
+        down = max(self.hosts_down, total - self.hosts_up)
+        summary = f"{SCANNER_NAME} done at {time.ctime(end)}; {total} IP addresses ({self.hosts_up} hosts up) " \
+                  f"scanned in {elapsed:.2f} seconds"
+        return (f'<runstats><finished time="{end}" timestr={quoteattr(time.ctime(end))} elapsed="{elapsed:.2f}" '
+                f'summary={quoteattr(summary)} exit="success"/>'
+                f'<hosts up="{self.hosts_up}" down="{down}" total="{total}"/></runstats>\n'
+                "</nmaprun>\n")
+
+
+WRITERS = {"json": JsonlWriter, "grepable": GrepableWriter, "xml": XmlWriter}
@@ -0,0 +1,121 @@
+"""
+原始套接字扫描共用的报文工具：校验和、IPv4 头解析、源地址选择等。
+只依赖标准库，SYN 扫描、ICMP 扫描等高吞吐路径不经过 scapy 的逐包解析。
+"""
+import socket
+import struct
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+IP_PROTO_ICMP = 1
+IP_PROTO_TCP = 6
+
+
+class IPv4Header(NamedTuple):
+    ihl: int          # 头部长度（字节）
+    ttl: int
+    proto: int
+    src: str
+    dst: str
+    df: bool          # Don't Fragment 标志
+
+
+def checksum(data: bytes) -> int:
+    """RFC 1071 互联网校验和"""
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    return fold(total)
+
+
+def fold(total: int) -> int:
+    """把 32 位累加和折叠为 16 位反码校验和"""
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def parse_ipv4(buf: bytes) -> IPv4Header:
+    ver_ihl, _, _, _, flags_frag, ttl, proto, _, src, dst = struct.unpack("!BBHHHBBH4s4s", buf[:20])
+    return IPv4Header(
+        ihl=(ver_ihl & 0x0F) * 4,
+        ttl=ttl,
+        proto=proto,
+        src=socket.inet_ntoa(src),
+        dst=socket.inet_ntoa(dst),
+        df=bool(flags_frag & 0x4000),
+    )
+
+
+class TcpOptions(NamedTuple):
+    layout: str              # 选项顺序，如 "M,S,T,N,W"（p0f 记法）
+    mss: Optional[int]
+    wscale: Optional[int]
+
+
+# TCP 选项类型 -> p0f 风格的单字母记法
+TCP_OPTION_CODES = {0: "E", 1: "N", 2: "M", 3: "W", 4: "S", 5: "K", 8: "T"}
+
+
+def parse_tcp_options(tcp: bytes) -> TcpOptions:
+    """解析 TCP 头中的选项部分（tcp 从 TCP 头开始）"""
+    end = min(len(tcp), (tcp[12] >> 4) * 4)
+    layout, mss, wscale = [], None, None
+    i = 20
+    while i < end:
+        kind = tcp[i]
+        layout.append(TCP_OPTION_CODES.get(kind, f"?{kind}"))
+        if kind == 0:
+            break  # 选项结束，之后只是填充
+        if kind == 1:
+            i += 1
+            continue
+        if i + 1 >= end or tcp[i + 1] < 2:
+            break  # 长度字段损坏
+        length = tcp[i + 1]
+        if kind == 2 and length == 4 and i + 4 <= end:
+            mss = struct.unpack("!H", tcp[i + 2:i + 4])[0]
+        elif kind == 3 and length == 3 and i + 3 <= end:
+            wscale = tcp[i + 2]
+        i += length
+    return TcpOptions(",".join(layout), mss, wscale)
+
+
+def ip_to_int(ip: str) -> int:
+    return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+
+def int_to_ip(value: int) -> str:
+    return socket.inet_ntoa(struct.pack("!I", value))
+
+
+@lru_cache(maxsize=4096)
+def source_ip_for(dst: str) -> str:
+    """借助 UDP connect 让内核按路由表选出发往 dst 时使用的本机地址（不会真正发包）"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        try:
+            s.connect((dst, 9))
+            return s.getsockname()[0]
+        except OSError:
+            return "0.0.0.0"
+
+
+def open_raw_sender() -> socket.socket:
+    """打开自带 IP 头的原始发送套接字"""
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_RAW)
+    except PermissionError:
+        raise PermissionError("原始套接字需要管理员权限")
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_HDRINCL, 1)
+    return sock
+
+
+def open_raw_receiver(proto: int, timeout: float = 0.2) -> socket.socket:
+    """打开按协议接收的原始套接字，收到的数据包含 IPv4 头"""
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, proto)
+    except PermissionError:
+        raise PermissionError("原始套接字需要管理员权限")
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sock.settimeout(timeout)
+    return sock
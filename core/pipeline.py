@@ -0,0 +1,188 @@
+"""
+分阶段流水线扫描：主机发现 → 端口扫描 → 服务识别 → 操作系统识别。
+
+各阶段通过队列衔接并同时运行：发现阶段每确认一台在线主机就立即交给端口扫描和
+操作系统识别，端口扫描得到开放端口后再交给服务识别。离线主机不会进入后续阶段，
+总耗时主要取决于在线主机数量，而不是地址空间大小。
+"""
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from core import metrics
+from core.async_scanner import DEFAULT_CONCURRENCY, resolve_timing
+from core.discovery import scan_subnet
+from core.os_fingerprint import os_fingerprint
+from core.port_scanner import scan_hosts
+from core.service_probe import DEFAULT_SERVICE_CONCURRENCY, get_service_cache, identify_services
+from core.syn_scanner import DEFAULT_RATE
+
+_DONE = object()
+
+_PORTS_SECONDS = metrics.STAGE_SECONDS.labels("host_ports")
+
+
+class ScanPipeline:
+    """
+    :param ports: 端口扫描阶段要扫描的端口
+    :param discovery_method: 主机发现方式 icmp / tcp / ping
+    :param timeout: 固定探测超时（秒），为 None 时按 RTT 自适应
+    :param timing: 时序模板名（T0 ~ T5）或 TimingEngine，各阶段共享 RTT 估计
+    :param engine: 端口扫描引擎 async（connect）/ syn，同 scan_port
+    :param concurrency: connect 扫描的总并发上限，由各端口扫描线程平分
+    :param rate: SYN 扫描的总发包速率，由各端口扫描线程平分
+    :param retries: SYN 扫描的最大重传次数，为 None 时使用时序模板的上限
+    :param port_workers: 同时做端口扫描的主机数
+    :param service_workers: 服务识别线程数（banner 抓取与协议探测），为 0 时跳过该阶段
+    :param os_workers: 操作系统识别线程数，为 0 时跳过该阶段
+    :param on_result: 每台在线主机所有阶段完成后回调
+    :param progress: core.utils.ScanProgress，发现阶段按主机推进，端口阶段按探测推进
+    """
+
+    def __init__(self, ports: Iterable[int] = range(1, 1025), discovery_method: str = "tcp",
+                 timeout: Optional[float] = None, port_workers: int = 8, service_workers: int = 4,
+                 os_workers: int = 4, on_result: Optional[Callable[[Dict], None]] = None, progress=None,
+                 timing=None, engine: str = "async", concurrency: int = DEFAULT_CONCURRENCY,
+                 rate: int = DEFAULT_RATE, retries: Optional[int] = None):
+        self.ports = list(ports)
+        self.discovery_method = discovery_method
+        self.timing = resolve_timing(timing, timeout)
+        self.engine = engine
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.port_workers = max(1, port_workers)
+        self.service_workers = max(0, service_workers)
+        self.os_workers = os_workers
+        self.on_result = on_result
+        self.progress = progress
+
+        self.results: List[Dict] = []
+        self._hosts: Dict[str, Dict] = {}
+        self._remaining: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._port_q = queue.Queue()
+        self._service_q = queue.Queue()
+        self._os_q = queue.Queue()
+        for name, stage_q in (("ports", self._port_q), ("services", self._service_q), ("os", self._os_q)):
+            metrics.QUEUE_DEPTH.labels(name).set_function(stage_q.qsize)
+
+    def run(self, subnet: str) -> List[Dict]:
+        port_threads = self._start(self.port_workers, self._port_stage)
+        service_threads = self._start(self.service_workers, self._service_stage)
+        os_threads = self._start(self.os_workers, self._os_stage)
+
+        try:
+            scan_subnet(subnet, method=self.discovery_method, timing=self.timing,
+                        on_result=self._on_discovered, progress=self.progress)
+        finally:
+            # 上游结束后逐级关闭：端口阶段全部退出后才能关闭服务阶段
+            self._stop(self._port_q, port_threads)
+            self._stop(self._service_q, service_threads)
+            self._stop(self._os_q, os_threads)
+            get_service_cache().save()
+        return self.results
+
+    @staticmethod
+    def _start(count, target):
+        threads = [threading.Thread(target=target, daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    @staticmethod
+    def _stop(stage_q, threads):
+        for _ in threads:
+            stage_q.put(_DONE)
+        for thread in threads:
+            thread.join()
+
+    @staticmethod
+    def _drain(stage_q):
+        while True:
+            item = stage_q.get()
+            if item is _DONE:
+                return
+            yield item
+
+    def _on_discovered(self, result):
+        if result.get("status") != "UP":
+            return
+        ip = result["ip"]
+        with self._lock:
+            self._hosts[ip] = {"ip": ip, "status": "UP", "open_ports": [], "services": {}}
+            self._remaining[ip] = 2 if self.os_workers else 1
+        if self.progress:
+            self.progress.add_total(len(self.ports))
+        self._port_q.put(ip)
+        if self.os_workers:
+            self._os_q.put(ip)
+
+    def _port_stage(self):
+        # 各端口扫描线程平分全局并发上限和 SYN 发包速率
+        concurrency = max(1, self.concurrency // self.port_workers)
+        rate = max(1, self.rate // self.port_workers)
+        for ip in self._drain(self._port_q):
+            started = time.perf_counter()
+            try:
+                scanned = scan_hosts([ip], ports=self.ports, engine=self.engine, concurrency=concurrency,
+                                     rate=rate, retries=self.retries, timing=self.timing, progress=self.progress)
+                open_ports = scanned[0]["open_ports"] if scanned else []
+            except OSError as e:
+                error, open_ports = str(e), []
+            else:
+                error = None
+            _PORTS_SECONDS.observe(time.perf_counter() - started)
+            # 主机字典与其他阶段线程共享，只在持有锁时修改
+            with self._lock:
+                host = self._hosts[ip]
+                if error is not None:
+                    host["error"] = error
+                host["open_ports"] = open_ports
+                if open_ports and self.service_workers:
+                    self._remaining[ip] += 1
+            if open_ports and self.service_workers:
+                self._service_q.put(ip)
+            self._complete(ip)
+
+    def _service_stage(self):
+        # 各服务识别线程平分全局连接上限
+        concurrency = max(1, DEFAULT_SERVICE_CONCURRENCY // self.service_workers)
+        for ip in self._drain(self._service_q):
+            with self._lock:
+                host = self._hosts[ip]
+                open_ports = list(host["open_ports"])
+            matches = identify_services([(ip, port) for port in open_ports],
+                                        concurrency=concurrency, timing=self.timing)
+            with self._lock:
+                host["services"] = {port: str(matches[(ip, port)]) for port in open_ports}
+            self._complete(ip)
+
+    def _os_stage(self):
+        for ip in self._drain(self._os_q):
+            os_name = os_fingerprint(ip)
+            with self._lock:
+                self._hosts[ip]["os"] = os_name
+            self._complete(ip)
+
+    def _complete(self, ip):
+        """某台主机的一个阶段完成；所有阶段完成后产出该主机的结果"""
+        with self._lock:
+            self._remaining[ip] -= 1
+            if self._remaining[ip]:
+                return
+            del self._remaining[ip]
+            host = self._hosts.pop(ip)
+            self.results.append(host)
+        if self.on_result:
+            self.on_result(host)
+
+
+def pipeline_scan(subnet: str, ports: Iterable[int] = range(1, 1025), **kwargs) -> List[Dict]:
+    """
+    对子网做流水线扫描，只返回在线主机：
+    [{"ip": ..., "status": "UP", "open_ports": [...], "services": {port: name}, "os": ...}, ...]
+    其余参数同 ScanPipeline。
+    """
+    return ScanPipeline(ports=ports, **kwargs).run(subnet)
@@ -1,15 +1,31 @@
+import errno
 import socket
 from concurrent.futures import ThreadPoolExecutor
-from core.utils import concurrent_port_scan,normalize_subnet
-def scan_ports_for_ip(ip, ports=range(1, 1025), timeout=1.0):
+from core.utils import concurrent_port_scan,iter_targets
+from core.async_scanner import connect_scan, DEFAULT_CONCURRENCY, resolve_timing
+from core.syn_scanner import SynScanner, DEFAULT_RATE
+from core.ratelimit import NEUTRAL, REPLY, get_rate_limiter
+from core.checkpoint import ScanCheckpoint, default_checkpoint_path
+
+SCAN_ENGINES = ("async", "syn", "thread")
+
+
+def _scan_ports_threaded(ip, ports, timeout):
+    """旧的线程池实现，保留为 engine="thread" 备用"""
     open_ports = []
+    limiter = get_rate_limiter()
 
     def scan_single_port(port):
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.settimeout(timeout)
-            result = s.connect_ex((ip, port))
-            if result == 0:
-                return port
+        limiter.acquire()
+        result = None
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.settimeout(timeout)
+                result = s.connect_ex((ip, port))
+                if result == 0:
+                    return port
+        finally:
+            limiter.release(REPLY if result in (0, errno.ECONNREFUSED) else NEUTRAL)
         return None
 
     with ThreadPoolExecutor(max_workers=100) as executor:
@@ -22,11 +38,107 @@ def scan_ports_for_ip(ip, ports=range(1, 1025), timeout=1.0):
     return open_ports
 
 
-def scan_port(subnet_prefix: str, ports=range(1, 1025), timeout=1.0):
-    ip_list = normalize_subnet(subnet_prefix)
+def _check_engine(engine):
+    # 在开始扫描前检查，不要等到每台主机各自报错（也不要先写下断点文件）
+    if engine not in SCAN_ENGINES:
+        raise ValueError(f"未知扫描引擎：{engine}")
+
+
+def scan_ports_for_ip(ip, ports=range(1, 1025), timeout=None, engine="async",
+                      concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, retries=None, timing=None):
+    if engine == "thread":
+        return _scan_ports_threaded(ip, ports, resolve_timing(timing, timeout).timeout(ip))
+    if engine == "async":
+        results = connect_scan([ip], ports=ports, timeout=timeout, concurrency=concurrency, timing=timing,
+                               retries=retries)
+    elif engine == "syn":
+        results = SynScanner(rate=rate, timeout=timeout, retries=retries, timing=timing).scan([ip], ports=ports)
+    else:
+        raise ValueError(f"未知扫描引擎：{engine}")
+    return results[0]["open_ports"] if results else []
+
+
+def scan_port(subnet_prefix: str, ports=range(1, 1025), timeout=None, engine="async",
+              concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, retries=None, on_result=None, progress=None,
+              timing=None, checkpoint=None):
+    """
+    扫描子网内所有主机的端口。
+    timeout 为 None 时按 RTT 自适应超时，timing 选择时序模板（T0 ~ T5，默认 T3）
+    engine="async"（默认）：所有 (ip, port) 在同一个事件循环内扫描，共享 concurrency 并发上限，超时探测按模板重传
+    engine="syn"：原始套接字 SYN 半开扫描，按 rate 限速发包，未应答探测按模板重传（retries 可另设上限，需要管理员权限）
+    engine="thread"：旧的主机线程池 × 端口线程池实现
+    on_result：每台主机扫描完成时回调 {"ip": ..., "open_ports": [...]}
+    progress：core.utils.ScanProgress，total 为 主机数 × 端口数，按探测推进
+    checkpoint：断点文件路径，设置后定期保存进度，中断后可用 resume_scan 继续；正常结束时删除
+    """
+    _check_engine(engine)
+    ports = list(ports)
+    if checkpoint:
+        options = {"timeout": timeout, "engine": engine, "concurrency": concurrency, "rate": rate,
+                   "retries": retries, "timing": timing if isinstance(timing, str) else None}
+        return _scan_checkpointed(ScanCheckpoint(checkpoint, subnet_prefix, ports, options),
+                                  on_result=on_result, progress=progress, timing=timing)
+    targets = iter_targets(subnet_prefix)
+    if progress:
+        progress.total = len(targets) * len(ports)
+    return scan_hosts(targets.hosts(), ports, timeout=timeout, engine=engine, concurrency=concurrency, rate=rate,
+                      retries=retries, on_result=on_result, progress=progress, timing=timing)
+
+
+def scan_hosts(ip_list, ports=range(1, 1025), timeout=None, engine="async", concurrency=DEFAULT_CONCURRENCY,
+               rate=DEFAULT_RATE, retries=None, on_result=None, progress=None, timing=None):
+    """扫描任意一组主机（可迭代对象）的端口，参数同 scan_port；progress.total 由调用方设置"""
+    _check_engine(engine)
+    ports = list(ports)
+    if engine == "async":
+        return connect_scan(ip_list, ports=ports, timeout=timeout, concurrency=concurrency,
+                            on_result=on_result, progress=progress, timing=timing, retries=retries)
+    if engine == "syn":
+        return SynScanner(rate=rate, timeout=timeout, retries=retries, timing=timing).scan(
+            ip_list, ports=ports, on_result=on_result, progress=progress)
 
     def scan_func(ip):
         # print(f"🔍 正在扫描 {ip} ...")
-        return scan_ports_for_ip(ip, ports=ports, timeout=timeout)
+        open_ports = scan_ports_for_ip(ip, ports=ports, timeout=timeout, engine=engine, timing=timing)
+        if progress:
+            progress.advance(len(ports))
+        return open_ports
+
+    return concurrent_port_scan(ip_list, scan_func, on_result=on_result)
+
+
+def _scan_checkpointed(checkpoint: ScanCheckpoint, on_result=None, progress=None, timing=None):
+    options = dict(checkpoint.options)
+    if timing is not None:
+        options["timing"] = timing
+    if progress:
+        progress.total = len(checkpoint.targets) * len(checkpoint.ports)
+        progress.advance(checkpoint.scanned * len(checkpoint.ports))
+
+    def record(result):
+        checkpoint.complete(result)
+        if on_result:
+            on_result(result)
+
+    checkpoint.save()
+    try:
+        results = scan_hosts(checkpoint.hosts(), checkpoint.ports, on_result=record, progress=progress, **options)
+    except BaseException:
+        checkpoint.save()
+        raise
+    checkpoint.remove()
+    return results
+
 
-    return concurrent_port_scan(ip_list, scan_func)
\ No newline at end of file
+def resume_scan(path=None, on_result=None, progress=None, timing=None):
+    """
+    从断点文件（默认 data/scan_checkpoint.json）继续中断的 scan_port 扫描。
+    已保存的有开放端口的主机先通过 on_result 回放，再扫描剩余目标；
+    返回值为之前保存的结果加上本次扫描的结果。timing 不为 None 时替换原来的时序模板。
+    """
+    checkpoint = ScanCheckpoint.load(path or default_checkpoint_path())
+    restored = list(checkpoint.results)
+    if on_result:
+        for result in restored:
+            on_result(result)
+    return restored + _scan_checkpointed(checkpoint, on_result=on_result, progress=progress, timing=timing)
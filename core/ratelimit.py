@@ -0,0 +1,138 @@
+"""
+全局发包速率限制与拥塞控制。
+
+所有探测路径（ICMP、TCP Ping、connect、SYN、服务探测、系统识别）在发包前都向
+同一个限速器申请令牌：
+- 令牌桶限制每秒发包数，上限为 max_pps（None 表示不限速）；
+- 拥塞窗口限制同时在途的探测数。丢包率（对已回应主机的超时比例）上升时
+  窗口和速率减半，回包持续正常时再逐步恢复，下限为 min_window / min_pps。
+"""
+import asyncio
+import threading
+import time
+from typing import Optional
+
+# 探测结果对拥塞控制的意义
+REPLY = "reply"    # 收到回应
+DROP = "drop"      # 对已知在线主机的超时，视为丢包
+NEUTRAL = None     # 无法判断（如离线主机的超时）
+
+DEFAULT_MIN_PPS = 50
+DEFAULT_MAX_WINDOW = 10000
+DEFAULT_MIN_WINDOW = 16
+
+DROP_THRESHOLD = 0.10     # 丢包率估计超过该值时退避
+CLEAN_THRESHOLD = 0.02    # 丢包率估计低于该值时增长
+BACKOFF_INTERVAL = 0.2    # 两次退避之间的最短间隔（秒），避免同一轮丢包反复减半
+_EWMA_WEIGHT = 0.05
+
+
+class RateLimiter:
+    """
+    :param max_pps: 每秒最大发包数，None 表示不限速
+    :param min_pps: 退避时速率的下限
+    :param max_window: 拥塞窗口上限（最大在途探测数）
+    :param min_window: 退避时窗口的下限
+    """
+
+    def __init__(self, max_pps: Optional[float] = None, min_pps: float = DEFAULT_MIN_PPS,
+                 max_window: int = DEFAULT_MAX_WINDOW, min_window: int = DEFAULT_MIN_WINDOW):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.configure(max_pps, min_pps, max_window, min_window)
+
+    def configure(self, max_pps: Optional[float] = None, min_pps: float = DEFAULT_MIN_PPS,
+                  max_window: int = DEFAULT_MAX_WINDOW, min_window: int = DEFAULT_MIN_WINDOW):
+        with self._lock:
+            self.max_pps = max_pps
+            self.min_pps = min(min_pps, max_pps) if max_pps else min_pps
+            self.max_window = max(1, max_window)
+            self.min_window = max(1, min(min_window, self.max_window))
+            self.rate = max_pps
+            self.window = float(self.max_window)
+            self.drop_rate = 0.0
+            self._tokens = 1.0
+            self._last_refill = time.monotonic()
+            self._last_backoff = 0.0
+
+    def try_acquire(self, count: int = 1) -> float:
+        """尝试占用 count 个令牌和窗口位置；成功返回 0，否则返回建议等待的秒数"""
+        with self._lock:
+            if self.in_flight and self.in_flight + count > self.window:
+                return 0.001
+            if self.rate:
+                now = time.monotonic()
+                burst = max(1.0, self.rate / 100)  # 允许约 10ms 的突发
+                self._tokens = min(burst, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens < count and self._tokens < burst:
+                    return (min(count, burst) - self._tokens) / self.rate
+                self._tokens -= count
+            self.in_flight += count
+            return 0.0
+
+    def acquire(self, count: int = 1):
+        """阻塞直到可以发送 count 个探测（线程中使用）"""
+        while True:
+            wait = self.try_acquire(count)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, count: int = 1):
+        """acquire 的协程版本（事件循环中使用）"""
+        while True:
+            wait = self.try_acquire(count)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, outcome=NEUTRAL, count: int = 1):
+        """探测结束时归还窗口位置，并按结果调整窗口和速率"""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - count)
+            self._feedback(outcome)
+
+    def record(self, outcome):
+        """只反馈结果、不归还窗口位置（用于原地重传的探测）"""
+        with self._lock:
+            self._feedback(outcome)
+
+    def _feedback(self, outcome):
+        if outcome is NEUTRAL:
+            return
+        dropped = 1.0 if outcome == DROP else 0.0
+        self.drop_rate += (dropped - self.drop_rate) * _EWMA_WEIGHT
+        if dropped and self.drop_rate > DROP_THRESHOLD:
+            self._back_off()
+        elif not dropped and self.drop_rate < CLEAN_THRESHOLD:
+            self._grow()
+
+    def _back_off(self):
+        now = time.monotonic()
+        if now - self._last_backoff < BACKOFF_INTERVAL:
+            return
+        self._last_backoff = now
+        self.window = max(self.min_window, self.window / 2)
+        if self.rate:
+            self.rate = max(self.min_pps, self.rate / 2)
+
+    def _grow(self):
+        # 加性增长：每 10 个正常回包窗口 +1，速率 +1%
+        self.window = min(self.max_window, self.window + 0.1)
+        if self.rate:
+            self.rate = min(self.max_pps, self.rate * 1.01)
+
+
+_limiter = RateLimiter()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """返回进程内所有扫描模块共享的限速器"""
+    return _limiter
+
+
+def configure_rate_limit(max_pps: Optional[float] = None, min_pps: float = DEFAULT_MIN_PPS,
+                         max_window: int = DEFAULT_MAX_WINDOW, min_window: int = DEFAULT_MIN_WINDOW):
+    """设置全局限速参数，例如 configure_rate_limit(max_pps=2000)"""
+    _limiter.configure(max_pps, min_pps, max_window, min_window)
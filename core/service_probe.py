@@ -1,3 +1,24 @@
+"""
+服务识别：按端口号猜测，以及基于 asyncio 的 banner 抓取与协议探测。
+
+识别引擎对每个开放端口先读取服务端主动发送的 banner，再按需发送 HTTP GET、
+TLS 握手、SMTP EHLO、Redis PING 等探测，用预编译的签名库匹配回应。
+签名库按回应的首字节和端口建立索引，每次只尝试可能匹配的少数正则。
+"""
+import asyncio
+import atexit
+import hashlib
+import re
+import ssl
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Pattern, Tuple
+
+from core import metrics
+from core.async_scanner import resolve_timing
+from core.cache import PersistentCache
+from core.ratelimit import NEUTRAL, REPLY, get_rate_limiter
+from core.utils import get_runtime_data_path
+
 COMMON_PORT_SERVICES = {
     21: "FTP",
     22: "SSH",
@@ -23,5 +44,367 @@ COMMON_PORT_SERVICES = {
     8080: "HTTP-Proxy",
 }
 
+# 按开放频率排序的常见 TCP 端口（取自 nmap-services 统计）
+TOP_TCP_PORTS = [
+    80, 23, 443, 21, 22, 25, 3389, 110, 445, 139, 143, 53, 135, 3306, 8080, 1723, 111, 995, 993, 5900,
+    1025, 587, 8888, 199, 1720, 465, 548, 113, 81, 6001, 10000, 514, 5060, 179, 1026, 2000, 8443, 8000,
+    32768, 554, 26, 1433, 49152, 2001, 515, 8008, 49154, 1027, 5666, 646, 5000, 5631, 631, 49153, 8081,
+    2049, 88, 79, 5800, 106, 2121, 1110, 49155, 6000, 513, 990, 5357, 427, 49156, 543, 544, 5101, 144,
+    7, 389, 6379, 5432,
+]
+
+
 def guess_service(port):
-    return COMMON_PORT_SERVICES.get(port, "未知服务")
\ No newline at end of file
+    return COMMON_PORT_SERVICES.get(port, "未知服务")
+
+
+def top_ports(n: int):
+    """返回最常见的前 n 个 TCP 端口"""
+    return TOP_TCP_PORTS[:n]
+
+
+DEFAULT_SERVICE_CONCURRENCY = 200   # 同时进行的服务探测连接数上限
+DEFAULT_READ_TIMEOUT = 2.0          # 等待 banner / 探测回应的时间（秒）
+MAX_PROBES = 6                      # 每个端口最多尝试的探测数
+MAX_SILENT_PROBES = 2               # 连续这么多个探测都没有回应时放弃（多为不回应任何数据的服务）
+MAX_RESPONSE = 4096                 # 每次最多读取的回应字节数
+_READ_IDLE = 0.2                    # 收到首个数据块后，再等待后续数据块的时间
+
+SERVICE_CACHE_FILE = "data/service_cache.json"
+SERVICE_CACHE_TTL = 24 * 3600       # 识别结果的有效期（秒）
+SERVICE_CACHE_SIZE = 65536          # 缓存的 (主机, 端口, banner) 条目上限
+
+
+class Probe(NamedTuple):
+    name: str
+    payload: bytes                  # 为空表示只等待服务端主动发送的 banner；{host} 会替换为目标地址
+    ports: FrozenSet[int]           # 优先使用该探测的端口
+    tls: bool = False               # 先完成 TLS 握手（发送 ClientHello），再在加密通道上发送 payload
+
+
+PROBES: List[Probe] = [
+    Probe("NULL", b"", frozenset({21, 22, 23, 25, 110, 143, 587, 3306, 5900, 5901, 2121, 1110})),
+    Probe("GetRequest", b"GET / HTTP/1.0\r\nHost: {host}\r\nUser-Agent: Mozilla/5.0\r\n\r\n",
+          frozenset({80, 81, 591, 3000, 5000, 8000, 8008, 8080, 8081, 8888, 9000, 10000})),
+    Probe("TLSClientHello", b"GET / HTTP/1.0\r\nHost: {host}\r\n\r\n",
+          frozenset({443, 465, 636, 990, 993, 995, 5986, 8443, 9443}), tls=True),
+    Probe("SMTPEhlo", b"EHLO nmap-visual-scanner\r\n", frozenset({25, 465, 587, 2525})),
+    Probe("RedisPing", b"PING\r\n", frozenset({6379, 6380})),
+    Probe("GenericLines", b"\r\n\r\n", frozenset()),
+]
+
+
+class ServiceSignature(NamedTuple):
+    name: str
+    pattern: Pattern[bytes]         # 可带命名分组 product / version
+    prefix: bytes = b""             # 回应必须以此开头，用于按首字节建立索引；为空表示不限
+    ports: FrozenSet[int] = frozenset()
+
+
+def _sig(name, pattern, prefix=b"", ports=()) -> ServiceSignature:
+    return ServiceSignature(name, re.compile(pattern, re.S | re.I), prefix, frozenset(ports))
+
+
+# 签名库：同一首字节下，端口匹配的签名优先，其余按列表顺序尝试
+SERVICE_SIGNATURES: List[ServiceSignature] = [
+    _sig("SSH", rb"^SSH-[\d.]+-(?P<product>[^\s_\r\n]+)(?:_(?P<version>[^\s\r\n]+))?", b"SSH-", [22]),
+    _sig("HTTP", rb"^HTTP/[\d.]+ \d{3}(?:.*?\r\nServer:[ \t]*(?P<product>[^\r\n/]+)(?:/(?P<version>[^\s\r\n]+))?)?",
+         b"HTTP/", [80, 8080, 8000, 443]),
+    _sig("FTP", rb"^220[ -][^\r\n]*?(?P<product>FileZilla|vsFTPd|ProFTPD|Pure-FTPd|Microsoft FTP)"
+         rb"(?:[ \w]*?(?P<version>\d[\w.]*))?", b"220", [21, 2121]),
+    _sig("SMTP", rb"^220[ -][^\r\n]*?(?P<product>Postfix|Exim|Sendmail|Microsoft ESMTP|qmail)"
+         rb"(?:[ \w]*?(?P<version>\d[\w.]*))?", b"220", [25, 465, 587]),
+    _sig("SMTP", rb"^220[ -][^\r\n]*E?SMTP", b"220", [25, 465, 587]),
+    _sig("FTP", rb"^220[ -][^\r\n]*FTP", b"220", [21, 2121]),
+    _sig("SMTP", rb"^250[ -]", b"250", [25, 465, 587]),
+    _sig("FTP", rb"^220[ -]", b"220", [21, 2121]),
+    _sig("SMTP", rb"^220[ -]", b"220", [25, 465, 587]),
+    _sig("POP3", rb"^\+OK(?:[^\r\n]*?(?P<product>Dovecot|Cyrus|Courier))?", b"+OK", [110, 995]),
+    _sig("Redis", rb"^\+PONG", b"+PONG", [6379]),
+    _sig("Redis", rb"^-(?:NOAUTH|ERR operation not permitted|DENIED Redis)", b"-", [6379]),
+    _sig("IMAP", rb"^\* OK(?:[^\r\n]*?(?P<product>Dovecot|Cyrus|Courier|Microsoft Exchange))?[^\r\n]*IMAP",
+         b"* OK", [143, 993]),
+    _sig("IMAP", rb"^\* OK", b"* OK", [143, 993]),
+    _sig("VNC", rb"^RFB (?P<version>\d+\.\d+)", b"RFB ", [5900, 5901]),
+    _sig("AMQP", rb"^AMQP", b"AMQP", [5672]),
+    _sig("Telnet", rb"^\xff[\xfb-\xfe]", b"\xff", [23]),
+    # MySQL 握手包：3 字节长度 + 序号 0 + 协议版本 10 + 以 NUL 结尾的版本号
+    _sig("MySQL", rb"^.\x00\x00\x00\x0a(?P<version>[\d.]+[^\x00]*)\x00", ports=[3306]),
+    _sig("MySQL", rb"^.\x00\x00\x00\xffj\x04Host .* is not allowed to connect", ports=[3306]),
+    _sig("SSL/TLS", rb"^[\x15\x16]\x03[\x00-\x04]", b"", [443, 8443]),
+    _sig("HTTP", rb"^<!DOCTYPE html|^<html", b"<", [80, 8080]),
+]
+
+
+def _build_index():
+    by_first: Dict[int, List[ServiceSignature]] = {}
+    anywhere: List[ServiceSignature] = []
+    for sig in SERVICE_SIGNATURES:
+        if sig.prefix:
+            by_first.setdefault(sig.prefix[0], []).append(sig)
+        else:
+            anywhere.append(sig)
+    return by_first, anywhere
+
+
+_BY_FIRST_BYTE, _ANY_PREFIX = _build_index()
+
+
+class ServiceMatch(NamedTuple):
+    name: str
+    product: Optional[str] = None
+    version: Optional[str] = None
+    banner: bytes = b""             # 第一次交互得到的回应（banner 或首个探测的回应）
+    probe: Optional[str] = None     # 命中的探测名；None 表示没有识别出，按端口号猜测
+
+    def __str__(self):
+        detail = " ".join(part for part in (self.product, self.version) if part)
+        return f"{self.name} ({detail})" if detail else self.name
+
+
+def match_response(data: bytes, port: Optional[int] = None) -> Optional[ServiceMatch]:
+    """用签名库匹配一段回应，只尝试首字节相符（或不限首字节）的签名，端口相符的优先"""
+    if not data:
+        return None
+    candidates = _BY_FIRST_BYTE.get(data[0], []) + _ANY_PREFIX
+    if port is not None:
+        candidates.sort(key=lambda sig: port not in sig.ports)
+    for sig in candidates:
+        if sig.prefix and not data.startswith(sig.prefix):
+            continue
+        m = sig.pattern.search(data)
+        if m is None:
+            continue
+        groups = m.groupdict()
+        product = groups.get("product")
+        version = groups.get("version")
+        return ServiceMatch(
+            sig.name,
+            product.decode("latin-1").strip() if product else None,
+            version.decode("latin-1").strip() if version else None,
+        )
+    return None
+
+
+# 每次请求都会变化的内容（时间、Cookie、长度等），计算 banner 摘要前去掉
+_VOLATILE = re.compile(
+    rb"(?im)^(?:date|expires|last-modified|set-cookie|etag|content-length|age|x-request-id|x-runtime)"
+    rb"[ \t]*:[^\r\n]*\r?\n?"
+    rb"|\d{1,2}:\d{2}:\d{2}"
+)
+
+
+def banner_digest(data: bytes) -> str:
+    """banner 的摘要：HTTP 等带头部的回应只取头部，并去掉时间等易变字段"""
+    end = data.find(b"\r\n\r\n")
+    if end >= 0:
+        data = data[:end]
+    return hashlib.sha1(_VOLATILE.sub(b"", data[:MAX_RESPONSE])).hexdigest()[:16]
+
+
+class ServiceCache(PersistentCache):
+    """(ip, port, banner 摘要) -> 识别结果；banner 不变时直接复用，跳过多轮探测（只缓存非空 banner）"""
+
+    def __init__(self, path: Optional[str] = None, ttl: float = SERVICE_CACHE_TTL,
+                 max_size: int = SERVICE_CACHE_SIZE):
+        super().__init__(path, ttl, max_size)
+
+    @staticmethod
+    def key(ip: str, port: int, banner: bytes) -> str:
+        return f"{ip}:{port}:{banner_digest(banner)}"
+
+    def lookup(self, ip: str, port: int, banner: bytes) -> Optional["ServiceMatch"]:
+        value = self.get(self.key(ip, port, banner))
+        if value is None:
+            return None
+        name, product, version, probe = value
+        return ServiceMatch(name, product, version, banner, probe)
+
+    def store(self, ip: str, port: int, banner: bytes, match: "ServiceMatch"):
+        self.put(self.key(ip, port, banner), [match.name, match.product, match.version, match.probe])
+
+
+_cache: Optional[ServiceCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_service_cache() -> ServiceCache:
+    """返回进程内共享的服务识别缓存（首次使用时从 data/ 目录加载）"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ServiceCache(get_runtime_data_path(SERVICE_CACHE_FILE))
+            atexit.register(_cache.save)
+        return _cache
+
+
+def probe_order(port: int) -> List[Probe]:
+    """端口对应的探测排在前面；banner 型端口先等待 banner，其余端口直接发送探测"""
+    hinted = [probe for probe in PROBES if port in probe.ports]
+    rest = [probe for probe in PROBES if port not in probe.ports]
+    return (hinted + rest)[:MAX_PROBES]
+
+
+def _tls_context() -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+_TLS_CONTEXT = None
+
+
+async def _read_response(reader: asyncio.StreamReader, timeout: float) -> bytes:
+    data = b""
+    wait = timeout
+    while len(data) < MAX_RESPONSE:
+        try:
+            chunk = await asyncio.wait_for(reader.read(MAX_RESPONSE - len(data)), wait)
+        except (asyncio.TimeoutError, OSError):
+            break
+        if not chunk:
+            break
+        data += chunk
+        wait = _READ_IDLE
+    return data
+
+
+_SENT = metrics.PROBES_SENT.labels("service")
+_REPLIES = metrics.REPLIES.labels("service")
+_TIMEOUTS = metrics.TIMEOUTS.labels("service")
+_SERVICE_SECONDS = metrics.STAGE_SECONDS.labels("service")
+
+
+async def run_probe(ip: str, port: int, probe: Probe, connect_timeout: float,
+                    read_timeout: float = DEFAULT_READ_TIMEOUT) -> Tuple[bool, bytes]:
+    """
+    新建一个连接执行单个探测，返回 (是否连接成功, 回应)。
+    TLS 探测握手失败时视为连接失败。
+    """
+    global _TLS_CONTEXT
+    context = None
+    if probe.tls:
+        if _TLS_CONTEXT is None:
+            _TLS_CONTEXT = _tls_context()
+        context = _TLS_CONTEXT
+    limiter = get_rate_limiter()
+    await limiter.acquire_async()
+    _SENT.inc()
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(ip, port, ssl=context), connect_timeout + (read_timeout if context else 0))
+    except (asyncio.TimeoutError, OSError, ssl.SSLError) as e:
+        if isinstance(e, asyncio.TimeoutError):
+            _TIMEOUTS.inc()
+        elif isinstance(e, OSError) and e.errno:
+            metrics.record_error("service", e.errno)
+        limiter.release(NEUTRAL)
+        return False, b""
+    limiter.release(REPLY)
+    _REPLIES.inc()
+    try:
+        if probe.payload:
+            writer.write(probe.payload.replace(b"{host}", ip.encode()))
+            await writer.drain()
+        return True, await _read_response(reader, read_timeout)
+    except (OSError, ssl.SSLError):
+        return True, b""
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (OSError, ssl.SSLError):
+            pass
+
+
+async def identify_service(ip: str, port: int, timing=None, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                           cache: Optional[ServiceCache] = None) -> ServiceMatch:
+    """
+    识别单个开放端口上的服务：按 probe_order 依次探测，回应命中签名即返回。
+    给出 cache 时，先只做第一个探测（读取 banner），(ip, port, banner 摘要) 命中缓存则直接返回；
+    没有 banner 的端口（等客户端先说话的服务）每次都完整探测，不读写缓存。
+    都没有命中时，有回应的返回 "未知服务" 并附带 banner，没有回应的按端口号猜测。
+    """
+    timing = resolve_timing(timing, None)
+    probes = probe_order(port)
+    started = asyncio.get_running_loop().time()
+    try:
+        connected, banner = await run_probe(ip, port, probes[0], timing.timeout(ip), read_timeout)
+        if not connected and not probes[0].tls:
+            return ServiceMatch(guess_service(port))  # 端口已不可连接
+        if cache is not None and connected and banner:
+            cached = cache.lookup(ip, port, banner)
+            if cached is not None:
+                return cached
+
+        match = await _run_probes(ip, port, probes, timing, read_timeout, (connected, banner))
+        if cache is not None and connected and banner:
+            cache.store(ip, port, banner, match)
+        return match
+    finally:
+        _SERVICE_SECONDS.observe(asyncio.get_running_loop().time() - started)
+
+
+async def _run_probes(ip, port, probes, timing, read_timeout, first_result) -> ServiceMatch:
+    first_banner = None
+    responded = False
+    silent = 0
+    for index, probe in enumerate(probes):
+        if silent >= MAX_SILENT_PROBES and not probe.tls:
+            continue  # 服务不主动发送数据，也不回应明文探测时，只再试一次 TLS
+        if index == 0:
+            connected, data = first_result
+        else:
+            connected, data = await run_probe(ip, port, probe, timing.timeout(ip), read_timeout)
+        if not connected and not probe.tls:
+            break  # 端口已不可连接，不再尝试其余探测
+        if connected and first_banner is None:
+            first_banner = data
+        match = match_response(data, port)
+        if match is not None:
+            if probe.tls:
+                name = "HTTPS" if match.name == "HTTP" else f"{match.name} (SSL)"
+                match = match._replace(name=name)
+            return match._replace(banner=first_banner, probe=probe.name)
+        if probe.tls and connected:
+            # 握手成功但内层协议未识别
+            return ServiceMatch(guess_service(port) if port in COMMON_PORT_SERVICES else "SSL/TLS",
+                                banner=first_banner, probe=probe.name)
+        if data:
+            responded = True
+            silent = 0
+            continue
+        silent += 1
+    if responded:
+        return ServiceMatch("未知服务", banner=first_banner or b"")
+    return ServiceMatch(guess_service(port), banner=first_banner or b"")
+
+
+def identify_services(targets: Iterable[Tuple[str, int]], concurrency: int = DEFAULT_SERVICE_CONCURRENCY,
+                      timing=None, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                      on_result: Optional[Callable[[str, int, ServiceMatch], None]] = None,
+                      use_cache: bool = True) -> Dict[Tuple[str, int], ServiceMatch]:
+    """
+    在单个事件循环中识别一批 (ip, port) 上的服务，同时进行的探测不超过 concurrency。
+    use_cache=True 时使用 data/ 下的持久化缓存，banner 未变化的端口不再做后续探测
+    （缓存在进程退出或调用 get_service_cache().save() 时写回磁盘）。
+    :return: {(ip, port): ServiceMatch}
+    """
+    timing = resolve_timing(timing, None)
+    cache = get_service_cache() if use_cache else None
+    targets = iter(targets)
+    results: Dict[Tuple[str, int], ServiceMatch] = {}
+
+    async def worker():
+        for ip, port in targets:
+            match = await identify_service(ip, port, timing, read_timeout, cache)
+            results[(ip, port)] = match
+            if on_result:
+                on_result(ip, port, match)
+
+    async def main():
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+    asyncio.run(main())
+    return results
@@ -0,0 +1,161 @@
+"""
+多进程分片扫描：把目标按扫描顺序交错分给多个子进程，每个子进程运行自己的事件循环 / 原始套接字引擎，
+绕开单进程的 GIL 限制。
+
+子进程按批次（约 100ms 或 256 条）把结果和进度增量放进同一个队列，
+主进程取出后依次调用 on_result、推进 progress，调用方看到的结果流与单进程扫描相同，
+界面和命令行不需要区分结果来自哪个进程。
+
+全局限速（configure_rate_limit 的 max_pps）按进程数平分；拥塞窗口由各进程独立调整。
+子进程使用 spawn 方式启动（Windows 和打包后的程序只支持 spawn，且不会继承界面进程的线程状态）。
+"""
+import os
+import queue
+import time
+from multiprocessing import get_context
+from typing import Callable, Dict, Iterable, List, Optional
+
+from core.packet import int_to_ip
+from core.ratelimit import configure_rate_limit, get_rate_limiter
+from core.utils import ScanProgress, iter_targets
+
+BATCH_SIZE = 256
+BATCH_INTERVAL = 0.1       # 子进程发送一批结果的最长间隔（秒）
+POLL_INTERVAL = 0.2        # 主进程等待队列时检查子进程存活的间隔（秒）
+
+# 队列消息：(类型, 分片序号, 结果列表, 进度增量)
+_RESULTS = "results"
+_DONE = "done"
+_ERROR = "error"
+
+
+def default_processes() -> int:
+    return os.cpu_count() or 1
+
+
+class _ShardReporter:
+    """子进程内收集结果，按批次放进队列"""
+
+    def __init__(self, out_queue, index: int):
+        self.queue = out_queue
+        self.index = index
+        self.progress = ScanProgress()
+        self._batch: List[Dict] = []
+        self._reported = 0
+        self._last_flush = time.monotonic()
+
+    def on_result(self, result: Dict):
+        self._batch.append(result)
+        if len(self._batch) >= BATCH_SIZE or time.monotonic() - self._last_flush >= BATCH_INTERVAL:
+            self.flush()
+
+    def flush(self, kind: str = _RESULTS):
+        done = self.progress.done
+        batch, self._batch = self._batch, []
+        self.queue.put((kind, self.index, batch, done - self._reported))
+        self._reported = done
+        self._last_flush = time.monotonic()
+
+
+def _shard_worker(kind: str, targets, index: int, count: int, options: Dict, max_pps: Optional[float], out_queue):
+    """子进程入口：扫描第 index 份目标"""
+    if max_pps:
+        configure_rate_limit(max_pps=max_pps)
+    reporter = _ShardReporter(out_queue, index)
+    hosts = map(int_to_ip, targets.shard(index, count))
+    try:
+        if kind == "host":
+            from core.discovery import sweep_hosts
+            sweep_hosts(hosts, on_result=reporter.on_result, progress=reporter.progress, **options)
+        else:
+            from core.port_scanner import scan_hosts
+            scan_hosts(hosts, on_result=reporter.on_result, progress=reporter.progress, **options)
+    except Exception as e:
+        reporter.flush()
+        out_queue.put((_ERROR, index, [], 0, f"{type(e).__name__}: {e}"))
+        return
+    reporter.flush(_DONE)
+
+
+def _parse(subnet):
+    # 主机名只在主进程解析一次，子进程拿到的是解析好的 TargetSpec
+    targets = iter_targets(subnet)
+    if not len(targets):
+        raise ValueError(f"无效的子网前缀：{subnet}")
+    return targets
+
+
+def _run_shards(kind: str, targets, processes: Optional[int], on_result, progress, options: Dict) -> List[Dict]:
+    count = max(1, min(processes or default_processes(), len(targets)))
+    limiter = get_rate_limiter()
+    max_pps = limiter.max_pps / count if limiter.max_pps else None
+
+    context = get_context("spawn")
+    out_queue = context.Queue()
+    workers = [context.Process(target=_shard_worker, args=(kind, targets, index, count, options, max_pps, out_queue),
+                               daemon=True, name=f"scan-shard-{index}")
+               for index in range(count)]
+    for worker in workers:
+        worker.start()
+
+    results: List[Dict] = []
+    errors: List[str] = []
+    running = set(range(count))
+    try:
+        while running:
+            try:
+                message = out_queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                # 子进程异常退出（如被系统结束）时不会发送 done 消息
+                for index in list(running):
+                    if not workers[index].is_alive() and out_queue.empty():
+                        running.discard(index)
+                        errors.append(f"分片 {index} 异常退出（退出码 {workers[index].exitcode}）")
+                continue
+            kind_, index, batch, done = message[:4]
+            results.extend(batch)
+            if progress and done:
+                progress.advance(done)
+            if on_result:
+                for result in batch:
+                    on_result(result)
+            if kind_ == _ERROR:
+                errors.append(f"分片 {index}：{message[4]}")
+            if kind_ in (_DONE, _ERROR):
+                running.discard(index)
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        out_queue.close()
+
+    if errors:
+        print(f"⚠️ {len(errors)} 个分片扫描失败，结果不完整：{'; '.join(errors)}")
+    return results
+
+
+def sharded_scan_port(subnet, ports: Iterable[int] = range(1, 1025), processes: Optional[int] = None,
+                      on_result: Optional[Callable[[Dict], None]] = None, progress: Optional[ScanProgress] = None,
+                      **options) -> List[Dict]:
+    """
+    多进程版 scan_port：目标分成 processes 份（默认 CPU 核数），每个子进程用 scan_hosts 扫描自己的一份。
+    其余参数（timeout、engine、concurrency、timing 等）原样传给各子进程；concurrency 是每个进程的并发上限。
+    不支持断点续扫。结果顺序按完成先后，不保证与单进程扫描一致。
+    """
+    ports = list(ports)
+    targets = _parse(subnet)
+    if progress:
+        progress.total = len(targets) * len(ports)
+    return _run_shards("port", targets, processes, on_result, progress, dict(options, ports=ports))
+
+
+def sharded_scan_subnet(subnet, method: str = "icmp", processes: Optional[int] = None,
+                        on_result: Optional[Callable[[Dict], None]] = None, progress: Optional[ScanProgress] = None,
+                        **options) -> List[Dict]:
+    """多进程版 scan_subnet，参数同 scan_subnet（method、timeout、ports、timing 等）"""
+    targets = _parse(subnet)
+    if progress:
+        progress.total = len(targets)
+    print(f"开始使用 {method.upper()} 多进程扫描 {subnet}")
+    return _run_shards("host", targets, processes, on_result, progress, dict(options, method=method))
@@ -0,0 +1,235 @@
+"""
+原始套接字 SYN（半开）扫描引擎。
+
+发送线程按设定速率推送预先构造好的 SYN 模板，单个接收线程从原始套接字读取
+SYN-ACK / RST 回包，通过 (ip, port) 查找表匹配到探测；超时未应答的探测按次数重传。
+整个过程不为每个探测建立内核连接，也不逐包经过 scapy。
+"""
+import heapq
+import itertools
+import os
+import random
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional
+
+from core import metrics
+from core.async_scanner import CLOSED, DEFAULT_HOSTGROUP, FILTERED, OPEN, HostAggregator, resolve_timing
+from core.fingerprints import record_tcp_reply
+from core.ratelimit import DROP, NEUTRAL, REPLY, get_rate_limiter
+from core.packet import (
+    IP_PROTO_TCP, fold, ip_to_int, open_raw_receiver, open_raw_sender, parse_ipv4, source_ip_for,
+)
+
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+DEFAULT_RATE = 10000  # 每秒发包数
+
+_IP_ID = 54321
+_IP_TTL = 64
+_WINDOW = 1024
+# MSS=1460、SACK 允许、时间戳、NOP、窗口扩大=10（与 Linux 的 SYN 相同）。
+# 对端只在 SYN-ACK 中回应 SYN 里出现过的选项，带全这些选项才能得到可用于识别系统的选项顺序
+_SYN_OPTIONS = b"\x02\x04\x05\xb4" b"\x04\x02" b"\x08\x0a\x00\x00\x00\x01\x00\x00\x00\x00" b"\x01" b"\x03\x03\x0a"
+_TCP_LEN = 20 + len(_SYN_OPTIONS)
+_PKT_LEN = 20 + _TCP_LEN
+
+_IP_STRUCT = struct.Struct("!BBHHHBBHII")
+_TCP_STRUCT = struct.Struct("!HHIIBBHHH")
+
+_SENT = metrics.PROBES_SENT.labels("syn")
+_REPLIES = metrics.REPLIES.labels("syn")
+_RETRIES = metrics.RETRIES.labels("syn")
+_TIMEOUTS = metrics.TIMEOUTS.labels("syn")
+_RTT = metrics.STAGE_SECONDS.labels("syn")
+
+
+class SynTemplate:
+    """
+    SYN 报文模板：常量字段的校验和部分和预先算好，
+    每个探测只需要补上地址、端口、序列号并折叠校验和。
+    """
+
+    def __init__(self, sport: int):
+        self.sport = sport
+        self._ip_base = 0x4500 + _PKT_LEN + _IP_ID + ((_IP_TTL << 8) | IP_PROTO_TCP)
+        opt_words = sum(struct.unpack(f"!{len(_SYN_OPTIONS) // 2}H", _SYN_OPTIONS))
+        self._tcp_base = (
+            IP_PROTO_TCP + _TCP_LEN                       # 伪首部：协议号 + TCP 长度
+            + sport + ((_TCP_LEN // 4) << 12 | TCP_SYN)    # 源端口、数据偏移 + 标志位
+            + _WINDOW + opt_words
+        )
+
+    def build(self, src: int, dst: int, dport: int, seq: int) -> bytes:
+        addr = (src >> 16) + (src & 0xFFFF) + (dst >> 16) + (dst & 0xFFFF)
+        ip_csum = fold(self._ip_base + addr)
+        tcp_csum = fold(self._tcp_base + addr + dport + (seq >> 16) + (seq & 0xFFFF))
+        return (
+            _IP_STRUCT.pack(0x45, 0, _PKT_LEN, _IP_ID, 0, _IP_TTL, IP_PROTO_TCP, ip_csum, src, dst)
+            + _TCP_STRUCT.pack(self.sport, dport, seq, 0, (_TCP_LEN // 4) << 4, TCP_SYN, _WINDOW, tcp_csum, 0)
+            + _SYN_OPTIONS
+        )
+
+
+class SynScanner:
+    """
+    SYN 扫描器。
+    :param rate: 发包速率（包/秒，含重传）
+    :param timeout: 固定的回包超时（秒）；为 None 时按主机 RTT 自适应
+    :param retries: 未应答探测的最大重传次数；为 None 时使用时序模板的上限
+    :param timing: 时序模板名（T0 ~ T5）或 TimingEngine
+    :param on_reply: 收到 SYN-ACK / RST 时回调 (ip, port, flags, IPv4Header, tcp_header_bytes)
+    """
+
+    def __init__(self, rate: int = DEFAULT_RATE, timeout: Optional[float] = None, retries: Optional[int] = None,
+                 sport: Optional[int] = None, on_reply: Optional[Callable] = None, timing=None):
+        self.timing = resolve_timing(timing, timeout)
+        if self.timing.template.scan_delay:
+            rate = min(rate, 1.0 / self.timing.template.scan_delay)
+        self.rate = max(1e-3, rate)
+        self.retries = retries
+        self.sport = sport or random.randint(40000, 60000)
+        self.on_reply = on_reply
+        self.template = SynTemplate(self.sport)
+        self.limiter = get_rate_limiter()
+        self._secret = int.from_bytes(os.urandom(4), "big")
+        # (ip, port) -> [seq, 已发送次数, 最近一次发送时间]，只保存未决探测
+        self._table: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _cookie(self, dst: int, port: int) -> int:
+        """无状态序列号：由目标地址、端口和本次扫描的随机密钥生成，用来校验回包"""
+        return zlib.crc32(struct.pack("!III", dst, port, self._secret)) & 0xFFFFFFFF
+
+    def scan(self, ip_list: Iterable[str], ports: Iterable[int] = range(1, 1025),
+             hostgroup: int = DEFAULT_HOSTGROUP,
+             on_result: Optional[Callable[[Dict[str, object]], None]] = None,
+             progress=None) -> List[Dict[str, object]]:
+        """扫描并返回与 connect 扫描相同结构的结果：[{"ip": ..., "open_ports": [...]}, ...]"""
+        hosts = HostAggregator(ports, hostgroup, on_result, progress)
+        sender = open_raw_sender()
+        receiver = open_raw_receiver(IP_PROTO_TCP)
+        self._stop.clear()
+        recv_thread = threading.Thread(target=self._recv_loop, args=(receiver, hosts), daemon=True)
+        recv_thread.start()
+        try:
+            self._send_loop(sender, hosts.pairs(ip_list), hosts)
+        finally:
+            self._stop.set()
+            recv_thread.join()
+            sender.close()
+            receiver.close()
+        return hosts.results
+
+    def _resolve(self, key, state, hosts: HostAggregator, outcome):
+        with self._lock:
+            if self._table.pop(key, None) is None:
+                return
+        self.limiter.release(outcome)
+        hosts.record(key[0], key[1], state)
+
+    def _send_loop(self, sender, pairs, hosts: HostAggregator):
+        interval = 1.0 / self.rate
+        next_send = time.monotonic()
+        # 小顶堆 (截止时间, 序号, key, 发送序号)：各主机超时不同，堆顶即最早到期的探测
+        outstanding = []
+        counter = itertools.count()
+        exhausted = False
+
+        def transmit(key, dst, entry):
+            nonlocal next_send
+            now = time.monotonic()
+            if next_send > now:
+                time.sleep(next_send - now)
+            elif next_send < now - 0.05:
+                next_send = now  # 落后太多时不补发突发
+            next_send += interval
+            packet = self.template.build(ip_to_int(source_ip_for(key[0])), dst, key[1], entry[0])
+            entry[2] = time.monotonic()
+            _SENT.inc()
+            try:
+                sender.sendto(packet, (key[0], 0))
+            except OSError as e:
+                metrics.record_error("syn", e.errno or 0)
+            deadline = entry[2] + self.timing.timeout(key[0])
+            heapq.heappush(outstanding, (deadline, next(counter), key, entry[1]))
+
+        # 每个探测向全局限速器占用一个窗口位置，得出结论（回包或最终超时）时归还，
+        # 重传沿用原来的位置，只把超时反馈给拥塞控制
+        while not exhausted or outstanding:
+            now = time.monotonic()
+            while outstanding and (outstanding[0][0] <= now or (exhausted and outstanding[0][2] not in self._table)):
+                deadline, _, key, attempt = heapq.heappop(outstanding)
+                entry = self._table.get(key)
+                if entry is None or entry[1] != attempt:
+                    continue
+                outcome = DROP if self.timing.is_responsive(key[0]) else NEUTRAL
+                _TIMEOUTS.inc()
+                if not self.timing.should_retry(key[0], entry[1] - 1, self.retries):
+                    self._resolve(key, FILTERED, hosts, outcome)
+                    continue
+                self.limiter.record(outcome)
+                entry[1] += 1
+                _RETRIES.inc()
+                transmit(key, ip_to_int(key[0]), entry)
+
+            if not exhausted:
+                wait = self.limiter.try_acquire()
+                if wait:
+                    time.sleep(min(wait, 0.01))
+                    continue
+                try:
+                    ip, port = next(pairs)
+                except StopIteration:
+                    self.limiter.release()
+                    exhausted = True
+                    continue
+                dst = ip_to_int(ip)
+                key = (ip, port)
+                entry = [self._cookie(dst, port), 1, 0.0]
+                with self._lock:
+                    self._table[key] = entry
+                transmit(key, dst, entry)
+            elif outstanding:
+                time.sleep(min(0.01, max(0.0, outstanding[0][0] - time.monotonic())))
+
+    def _recv_loop(self, receiver, hosts: HostAggregator):
+        while not self._stop.is_set():
+            try:
+                buf = receiver.recv(65535)
+            except OSError:
+                continue
+            if len(buf) < 40:
+                continue
+            hdr = parse_ipv4(buf)
+            if hdr.proto != IP_PROTO_TCP:
+                continue
+            tcp = buf[hdr.ihl:]
+            sport, dport, _, ack, _, flags = struct.unpack("!HHIIBB", tcp[:14])
+            if dport != self.sport or not flags & (TCP_RST | TCP_ACK):
+                continue
+            key = (hdr.src, sport)
+            entry = self._table.get(key)
+            if entry is None or ack != (entry[0] + 1) & 0xFFFFFFFF:
+                continue
+            if flags & TCP_SYN and flags & TCP_ACK:
+                state = OPEN
+            elif flags & TCP_RST:
+                state = CLOSED
+            else:
+                continue
+            rtt = time.monotonic() - entry[2]
+            self.timing.record_rtt(hdr.src, rtt, entry[1] - 1)
+            _REPLIES.inc()
+            _RTT.observe(rtt)
+            # 顺带记录回包特征，供操作系统识别使用，无需再单独发包
+            record_tcp_reply(hdr, tcp, state == OPEN)
+            if self.on_reply:
+                self.on_reply(hdr.src, sport, flags, hdr, tcp)
+            self._resolve(key, state, hosts, REPLY)
+
@@ -0,0 +1,367 @@
+"""
+扫描目标描述的解析与惰性展开。
+
+支持的写法（可混用，空白分隔）：
+    192.168.1.0/24          CIDR（与 normalize_subnet 一致，不含网络地址和广播地址）
+    10.0.0.1-10.0.3.254     完整地址区间
+    10.0.0.1-50             按八位组的范围，等价于 10.0.0.1 ~ 10.0.0.50
+    10.0-3.*.1              每个八位组可为 *、n、n-m 或逗号分隔的组合
+    scanme.example.com      主机名（解析时查询一次 DNS）
+排除列表和输入文件使用相同语法，文件中 # 之后为注释。
+
+目标以整数形式逐个产出，不会生成完整列表；总数通过区间运算得到。
+重叠或重复的目标在解析时合并，每个地址只产出一次（地址区间按从小到大的顺序排在八位组块之前）。
+需要随机顺序时使用 Feistel 置换对下标做加密，而不是打乱列表。
+"""
+import bisect
+import ipaddress
+import random
+import socket
+from itertools import accumulate
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from core.packet import int_to_ip, ip_to_int
+
+
+class AddressRange:
+    """连续地址区间 [start, start + count)"""
+
+    def __init__(self, start: int, count: int):
+        self.start = start
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index: int) -> int:
+        return self.start + index
+
+    def __contains__(self, value: int) -> bool:
+        return self.start <= value < self.start + self.count
+
+    def count_in(self, lo: int, hi: int) -> int:
+        """落在闭区间 [lo, hi] 内的地址个数"""
+        return max(0, min(hi, self.start + self.count - 1) - max(lo, self.start) + 1)
+
+    def intervals(self) -> List[Tuple[int, int]]:
+        return [(self.start, self.start + self.count - 1)] if self.count else []
+
+
+class OctetBlock:
+    """按八位组描述的地址集合，如 10.0-3.*.1，等价于四个八位组取值集合的笛卡尔积"""
+
+    def __init__(self, octets: List[List[int]]):
+        self.octets = octets
+        self._sets = [set(values) for values in octets]
+        # _strides[i]：第 i 个八位组之后所有组合的个数，用于按下标定位
+        sizes = [len(values) for values in octets]
+        self._strides = [1, 1, 1, 1]
+        for i in range(2, -1, -1):
+            self._strides[i] = self._strides[i + 1] * sizes[i + 1]
+        self._len = self._strides[0] * sizes[0]
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index: int) -> int:
+        value = 0
+        for values, stride in zip(self.octets, self._strides):
+            digit, index = divmod(index, stride)
+            value = (value << 8) | values[digit]
+        return value
+
+    def __contains__(self, value: int) -> bool:
+        return all(((value >> (24 - 8 * i)) & 0xFF) in self._sets[i] for i in range(4))
+
+    def count_in(self, lo: int, hi: int) -> int:
+        """逐个八位组递归统计落在 [lo, hi] 内的地址数，只有边界分支需要继续展开"""
+
+        def walk(level, prefix):
+            shift = 24 - 8 * level
+            total = 0
+            for value in self.octets[level]:
+                first = prefix | (value << shift)
+                last = first | ((1 << shift) - 1)
+                if last < lo or first > hi:
+                    continue
+                if lo <= first and last <= hi:
+                    total += self._strides[level]
+                else:
+                    total += walk(level + 1, first)
+            return total
+
+        return walk(0, 0)
+
+    def intervals(self) -> List[Tuple[int, int]]:
+        """展开为连续区间列表（仅用于排除列表，一般规模很小）"""
+        result = []
+        runs = _runs(self.octets[3])
+        for a in self.octets[0]:
+            for b in self.octets[1]:
+                for c in self.octets[2]:
+                    prefix = (a << 24) | (b << 16) | (c << 8)
+                    result.extend((prefix | lo, prefix | hi) for lo, hi in runs)
+        return result
+
+
+def _runs(values: List[int]) -> List[Tuple[int, int]]:
+    runs = []
+    for value in values:
+        if runs and runs[-1][1] == value - 1:
+            runs[-1] = (runs[-1][0], value)
+        else:
+            runs.append((value, value))
+    return runs
+
+
+def _parse_octet(part: str) -> List[int]:
+    values = set()
+    for item in part.split(","):
+        if item == "*":
+            lo, hi = 0, 255
+        elif "-" in item:
+            lo_text, hi_text = item.split("-", 1)
+            lo = int(lo_text) if lo_text else 0
+            hi = int(hi_text) if hi_text else 255
+        else:
+            lo = hi = int(item)
+        if not 0 <= lo <= hi <= 255:
+            raise ValueError(item)
+        values.update(range(lo, hi + 1))
+    return sorted(values)
+
+
+def parse_block(spec: str):
+    """把单个目标描述解析为 AddressRange / OctetBlock"""
+    try:
+        if "/" in spec:
+            host, prefix = spec.split("/", 1)
+            if not _looks_numeric(host):
+                host = socket.gethostbyname(host)
+            network = ipaddress.IPv4Network(f"{host}/{prefix}", strict=False)
+            first, last = int(network.network_address), int(network.broadcast_address)
+            if network.prefixlen < 31:
+                first, last = first + 1, last - 1
+            return AddressRange(first, last - first + 1)
+
+        parts = spec.split(".")
+        if "-" in spec and spec.count(".") == 6:
+            lo_text, hi_text = spec.split("-")
+            lo, hi = ip_to_int(lo_text), ip_to_int(hi_text)
+            if lo > hi:
+                raise ValueError(spec)
+            return AddressRange(lo, hi - lo + 1)
+        if len(parts) == 4 and _looks_numeric(spec):
+            octets = [_parse_octet(part) for part in parts]
+            if all(len(values) == 1 for values in octets):
+                return AddressRange(ip_to_int(spec), 1)
+            return OctetBlock(octets)
+        if _looks_numeric(spec):
+            raise ValueError(spec)
+
+        return AddressRange(ip_to_int(socket.gethostbyname(spec)), 1)
+    except (ValueError, OSError):
+        raise ValueError(f"无效的目标：{spec}")
+
+
+def _looks_numeric(text: str) -> bool:
+    return bool(text) and all(ch.isdigit() or ch in ".-,*" for ch in text)
+
+
+def read_target_file(path: str) -> List[str]:
+    """读取目标文件，返回其中的目标描述（# 之后为注释）"""
+    specs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            specs.extend(line.split("#", 1)[0].split())
+    return specs
+
+
+def _split_specs(specs) -> List[str]:
+    if specs is None:
+        return []
+    if isinstance(specs, str):
+        specs = [specs]
+    result = []
+    for spec in specs:
+        result.extend(spec.split())
+    return result
+
+
+class FeistelPermutation:
+    """
+    [0, n) 上的伪随机置换：在不小于 n 的 2^k 域上做 Feistel 加密，
+    落在 n 之外时继续加密（cycle walking），无需存储任何下标。
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, n: int, seed: Optional[int] = None):
+        self.n = n
+        bits = max(2, (max(n, 2) - 1).bit_length())
+        bits += bits % 2
+        self._half = bits // 2
+        self._mask = (1 << self._half) - 1
+        rng = random.Random(seed)
+        self._keys = [rng.getrandbits(32) for _ in range(self.ROUNDS)]
+
+    def _encrypt(self, value: int) -> int:
+        half, mask = self._half, self._mask
+        left, right = value >> half, value & mask
+        for key in self._keys:
+            # 轮函数：乘法 + 移位异或的整数散列
+            x = ((right ^ key) * 0x45D9F3B) & 0xFFFFFFFF
+            x ^= x >> 16
+            x = (x * 0x45D9F3B) & 0xFFFFFFFF
+            left, right = right, left ^ ((x ^ (x >> 16)) & mask)
+        return (left << half) | right
+
+    def __getitem__(self, index: int) -> int:
+        value = self._encrypt(index)
+        while value >= self.n:
+            value = self._encrypt(value)
+        return value
+
+
+class TargetSpec:
+    """
+    惰性目标集合。
+    :param specs: 目标描述（字符串或字符串列表）
+    :param exclude: 需要排除的目标描述
+    :param input_file: 从文件读取额外的目标
+    :param exclude_file: 从文件读取需要排除的目标
+    :param randomize: 是否以伪随机顺序产出目标
+    :param seed: 随机顺序的种子，相同种子得到相同顺序（便于断点续扫）
+    """
+
+    def __init__(self, specs=None, exclude=None, input_file: Optional[str] = None,
+                 exclude_file: Optional[str] = None, randomize: bool = False, seed: Optional[int] = None):
+        spec_list = _split_specs(specs)
+        if input_file:
+            spec_list += read_target_file(input_file)
+        exclude_list = _split_specs(exclude)
+        if exclude_file:
+            exclude_list += read_target_file(exclude_file)
+
+        self.specs = spec_list
+        self.blocks = _disjoint_blocks([parse_block(spec) for spec in spec_list])
+        self._offsets = [0] + list(accumulate(len(block) for block in self.blocks))
+        self._excluded = _merge([interval for spec in exclude_list for interval in parse_block(spec).intervals()])
+        self._excluded_starts = [lo for lo, _ in self._excluded]
+        self.randomize = randomize
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self._permutation = FeistelPermutation(self.size, self.seed) if randomize else None
+        self._count = self.size - sum(
+            block.count_in(lo, hi) for block in self.blocks for lo, hi in self._excluded
+        )
+
+    @property
+    def size(self) -> int:
+        """排除前的目标总数（下标空间大小）"""
+        return self._offsets[-1]
+
+    def __len__(self):
+        """排除后的目标总数"""
+        return self._count
+
+    def __contains__(self, value: int) -> bool:
+        """地址（整数形式）是否属于目标集合且未被排除"""
+        return any(value in block for block in self.blocks) and not self.is_excluded(value)
+
+    def __str__(self):
+        return " ".join(self.specs)
+
+    def is_excluded(self, value: int) -> bool:
+        i = bisect.bisect_right(self._excluded_starts, value) - 1
+        return i >= 0 and value <= self._excluded[i][1]
+
+    def at(self, position: int) -> int:
+        """扫描顺序中第 position 个下标对应的地址（可能属于排除列表）"""
+        index = self._permutation[position] if self._permutation else position
+        block = bisect.bisect_right(self._offsets, index) - 1
+        return self.blocks[block][index - self._offsets[block]]
+
+    def iter_ints(self, start: int = 0) -> Iterator[int]:
+        """从扫描顺序的第 start 个下标开始，逐个产出未被排除的地址"""
+        if self._permutation and len(self.blocks) == 1:
+            block, permutation = self.blocks[0], self._permutation
+            values = (block[permutation[position]] for position in range(start, self.size))
+        elif self._permutation:
+            values = (self.at(position) for position in range(start, self.size))
+        else:
+            values = self._iter_sequential(start)
+        for value in values:
+            if not self._excluded or not self.is_excluded(value):
+                yield value
+
+    def iter_positions(self, start: int = 0) -> Iterator[Tuple[int, int]]:
+        """同 iter_ints，但同时产出地址在扫描顺序中的下标 (position, value)，用于记录断点"""
+        if self._permutation:
+            values = ((position, self.at(position)) for position in range(start, self.size))
+        else:
+            values = enumerate(self._iter_sequential(start), start)
+        for position, value in values:
+            if not self._excluded or not self.is_excluded(value):
+                yield position, value
+
+    def shard(self, index: int, count: int) -> Iterator[int]:
+        """
+        把扫描顺序按下标交错分成 count 份，产出第 index 份中未被排除的地址。
+        交错而不是切成连续的段，各份都均匀覆盖整个目标范围，不会有一份恰好落在空网段上。
+        """
+        for position in range(index, self.size, count):
+            value = self.at(position)
+            if not self._excluded or not self.is_excluded(value):
+                yield value
+
+    def _iter_sequential(self, start: int) -> Iterator[int]:
+        first = bisect.bisect_right(self._offsets, start) - 1
+        for i in range(max(first, 0), len(self.blocks)):
+            block = self.blocks[i]
+            for index in range(max(0, start - self._offsets[i]), len(block)):
+                yield block[index]
+
+    def __iter__(self) -> Iterator[int]:
+        return self.iter_ints()
+
+    def hosts(self, start: int = 0) -> Iterator[str]:
+        """逐个产出点分十进制形式的地址"""
+        return (int_to_ip(value) for value in self.iter_ints(start))
+
+
+def _octets_overlap(a: OctetBlock, b: OctetBlock) -> bool:
+    return all(a._sets[i] & b._sets[i] for i in range(4))
+
+
+def _disjoint_blocks(blocks: list) -> list:
+    """
+    把可能重叠的块整理为互不相交的块：地址区间合并；与其他块重叠的八位组块展开为区间参与合并
+    （重叠很少见，不重叠的八位组块保持原样，不展开）。
+    """
+    ranges = _merge(interval for block in blocks if isinstance(block, AddressRange) for interval in block.intervals())
+    octet_blocks = [block for block in blocks if isinstance(block, OctetBlock)]
+    intervals = list(ranges)
+    kept = []
+    for i, block in enumerate(octet_blocks):
+        overlaps = any(_octets_overlap(block, other) for j, other in enumerate(octet_blocks) if j != i) or \
+            any(block.count_in(lo, hi) for lo, hi in ranges)
+        if overlaps:
+            intervals.extend(block.intervals())
+        else:
+            kept.append(block)
+    return [AddressRange(lo, hi - lo + 1) for lo, hi in _merge(intervals)] + kept
+
+
+def _merge(intervals: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged = []
+    for lo, hi in sorted(intervals):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def parse_targets(specs, exclude=None, **kwargs) -> TargetSpec:
+    """解析目标描述，参数同 TargetSpec"""
+    return TargetSpec(specs, exclude=exclude, **kwargs)
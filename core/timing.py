@@ -0,0 +1,173 @@
+"""
+自适应超时与重传（参考 nmap 的时序引擎）。
+
+按主机、按 /24 子网和全局三级维护平滑 RTT（SRTT）与 RTT 方差（RTTVAR），
+探测超时取 SRTT + 4 × RTTVAR，并限制在时序模板给出的上下限之间。
+没有样本的主机先借用同子网的估计，再退回全局估计和模板初始值。
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+
+@dataclass(frozen=True)
+class TimingTemplate:
+    name: str
+    initial_rtt_timeout: float   # 没有任何 RTT 样本时使用的超时（秒）
+    min_rtt_timeout: float
+    max_rtt_timeout: float
+    max_retries: int             # 单个探测超时后的最大重传次数
+    scan_delay: float            # 探测之间的最小间隔（秒）
+
+
+# 数值与 nmap -T0 ~ -T5 一致
+TIMING_TEMPLATES: Dict[str, TimingTemplate] = {
+    "T0": TimingTemplate("paranoid", 300.0, 0.1, 10.0, 10, 300.0),
+    "T1": TimingTemplate("sneaky", 15.0, 0.1, 10.0, 10, 15.0),
+    "T2": TimingTemplate("polite", 1.0, 0.1, 10.0, 10, 0.4),
+    "T3": TimingTemplate("normal", 1.0, 0.1, 10.0, 10, 0.0),
+    "T4": TimingTemplate("aggressive", 0.5, 0.1, 1.25, 6, 0.0),
+    "T5": TimingTemplate("insane", 0.25, 0.05, 0.3, 2, 0.0),
+}
+DEFAULT_TEMPLATE = "T3"
+
+# 按主机保存的估计器数量上限，超出后淘汰最久未使用的主机
+_MAX_TRACKED_HOSTS = 65536
+
+
+class RttEstimator:
+    """RFC 6298 风格的 SRTT / RTTVAR 估计"""
+
+    def __init__(self):
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.samples = 0
+        self.max_retries_seen = 0  # 得到回应的探测中最大的重传次数，用来判断是否存在丢包
+
+    def update(self, rtt: float):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            delta = rtt - self.srtt
+            self.srtt += delta / 8
+            self.rttvar += (abs(delta) - self.rttvar) / 4
+        self.samples += 1
+
+    def timeout(self) -> Optional[float]:
+        if self.srtt is None:
+            return None
+        return self.srtt + 4 * self.rttvar
+
+
+def get_template(template: Union[str, TimingTemplate, None]) -> TimingTemplate:
+    if isinstance(template, TimingTemplate):
+        return template
+    name = (template or DEFAULT_TEMPLATE).upper()
+    if not name.startswith("T"):
+        name = "T" + name
+    if name not in TIMING_TEMPLATES:
+        raise ValueError(f"未知时序模板：{template}")
+    return TIMING_TEMPLATES[name]
+
+
+class TimingEngine:
+    """
+    :param template: 时序模板名（T0 ~ T5）或 TimingTemplate
+    :param fixed_timeout: 指定后不再自适应，所有探测使用该超时
+    :param rtt_source: 与另一个引擎共用 RTT 估计（模板各自独立）
+    """
+
+    def __init__(self, template: Union[str, TimingTemplate, None] = None, fixed_timeout: Optional[float] = None,
+                 rtt_source: Optional["TimingEngine"] = None):
+        self.template = get_template(template)
+        self.fixed_timeout = fixed_timeout
+        if rtt_source is not None:
+            self._global = rtt_source._global
+            self._subnets = rtt_source._subnets
+            self._hosts = rtt_source._hosts
+            self._lock = rtt_source._lock
+            return
+        self._global = RttEstimator()
+        self._subnets: Dict[str, RttEstimator] = {}
+        self._hosts: "OrderedDict[str, RttEstimator]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_retries(self) -> int:
+        return self.template.max_retries
+
+    @staticmethod
+    def _subnet_key(ip: str) -> str:
+        return ip.rsplit(".", 1)[0]
+
+    def _clamp(self, value: float) -> float:
+        return min(self.template.max_rtt_timeout, max(self.template.min_rtt_timeout, value))
+
+    def timeout(self, ip: Optional[str] = None) -> float:
+        """给 ip 发送下一个探测时应使用的超时"""
+        if self.fixed_timeout is not None:
+            return self.fixed_timeout
+        if ip is not None:
+            host = self._hosts.get(ip)
+            if host is not None and host.samples:
+                return self._clamp(host.timeout())
+            subnet = self._subnets.get(self._subnet_key(ip))
+            if subnet is not None and subnet.samples:
+                return self._clamp(subnet.timeout())
+        if self._global.samples:
+            return self._clamp(self._global.timeout())
+        return self.template.initial_rtt_timeout
+
+    def record_rtt(self, ip: str, rtt: float, retries: int = 0):
+        """收到回应（包括 RST）时记录一次 RTT 样本，retries 为该探测此前重传的次数"""
+        with self._lock:
+            host = self._hosts.get(ip)
+            if host is None:
+                host = self._hosts[ip] = RttEstimator()
+                if len(self._hosts) > _MAX_TRACKED_HOSTS:
+                    self._hosts.popitem(last=False)
+            else:
+                self._hosts.move_to_end(ip)
+            host.update(rtt)
+            host.max_retries_seen = max(host.max_retries_seen, retries)
+            key = self._subnet_key(ip)
+            subnet = self._subnets.get(key)
+            if subnet is None:
+                subnet = self._subnets[key] = RttEstimator()
+            subnet.update(rtt)
+            self._global.update(rtt)
+
+    def is_responsive(self, ip: str) -> bool:
+        return ip in self._hosts
+
+    def should_retry(self, ip: str, retries_done: int, max_retries: Optional[int] = None) -> bool:
+        """
+        超时的探测是否需要重传。
+        与 nmap 一样，只对已经有过回应的主机重传：对从未回应的主机，
+        超时更可能意味着过滤或离线，而不是丢包。重传次数也只比该主机上
+        观察到的最大重传次数多一次，没有丢包迹象时不会把模板上限用满。
+        """
+        host = self._hosts.get(ip)
+        if host is None:
+            return False
+        limit = self.template.max_retries if max_retries is None else max_retries
+        return retries_done < min(limit, host.max_retries_seen + 1)
+
+
+_shared_engine = TimingEngine()
+
+
+def get_timing(template: Union[str, TimingTemplate, None] = None, timeout: Optional[float] = None) -> TimingEngine:
+    """
+    返回进程内共享的时序引擎，使端口扫描学到的 RTT 也能用于后续的操作系统识别等探测。
+    传入 template 时返回一个使用该模板、与共享引擎共用 RTT 估计的引擎，
+    不改变共享引擎和其他线程中正在进行的扫描所用的模板；
+    传入 timeout 时返回一个使用固定超时的独立引擎。
+    """
+    if timeout is not None:
+        return TimingEngine(template, fixed_timeout=timeout)
+    if template is not None:
+        return TimingEngine(template, rtt_source=_shared_engine)
+    return _shared_engine
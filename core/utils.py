@@ -1,8 +1,14 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Callable, List, Dict
-import ipaddress
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
 import sys
 import os
+import threading
+import time
+from core.targets import TargetSpec, parse_targets
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 def resource_path(relative_path):
     """获取打包后的资源路径"""
@@ -10,64 +16,177 @@ def resource_path(relative_path):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.abspath("."), relative_path)
 
+def get_runtime_data_path(relative_path):
+    """返回一个可用于写入文件的路径，适配打包后环境"""
+    if getattr(sys, 'frozen', False):
+        # PyInstaller 打包后的路径：可写的目录
+        base_path = os.path.dirname(sys.executable)
+    else:
+        # 普通运行时：当前目录
+        base_path = os.path.abspath(".")
+
+    full_path = os.path.join(base_path, relative_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    return full_path
+
+class ScanProgress:
+    """
+    扫描进度：已完成探测数 / 总探测数，供界面轮询显示进度和剩余时间。
+    各扫描引擎在每个探测（或每台主机）完成时调用 advance。
+    """
+
+    def __init__(self, total: int = 0):
+        self.total = total
+        self.done = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def advance(self, count: int = 1):
+        with self._lock:
+            self.done += count
+
+    def add_total(self, count: int):
+        """流水线等场景下总量在扫描过程中才逐步确定"""
+        with self._lock:
+            self.total += count
+
+    @property
+    def fraction(self) -> float:
+        return min(1.0, self.done / self.total) if self.total else 0.0
+
+    def eta(self) -> Optional[float]:
+        """按当前平均速率估算的剩余秒数，尚无进度时返回 None"""
+        if not self.done or not self.total:
+            return None
+        elapsed = time.monotonic() - self.started
+        return max(0.0, elapsed / self.done * (self.total - self.done))
+
+
+def iter_targets(subnet, exclude=None, **kwargs) -> TargetSpec:
+    """
+    惰性解析扫描目标，返回可重复迭代的 TargetSpec（len() 为目标总数，.hosts() 逐个产出 IP）。
+    :param subnet: 目标描述，如 "100.80.179.0/24"、"10.0.0.1-50 10.0-3.*.1"、主机名
+    :param exclude: 需要排除的目标描述
+    已经解析好的 TargetSpec 原样返回，扫描函数因此既可以接受目标描述，也可以接受 TargetSpec。
+    """
+    if isinstance(subnet, TargetSpec):
+        return subnet
+    try:
+        return parse_targets(subnet, exclude=exclude, **kwargs)
+    except ValueError:
+        raise ValueError(f"无效的子网格式: {subnet}")
+
+
 def normalize_subnet(subnet: str) -> List[str]:
     """
     规范化 CIDR 格式子网，返回该子网内的所有 IP 地址。
+    大网段请改用 iter_targets，避免一次性生成完整列表。
     :param subnet: CIDR 格式的子网，如 "100.80.179.0/24"
     :return: 包含所有 IP 地址的列表
     """
-    try:
-        # 使用 ipaddress 模块解析 CIDR 子网
-        network = ipaddress.IPv4Network(subnet, strict=False)
-        # 返回子网中的所有 IP 地址
-        return [str(ip) for ip in network.hosts()]  # network.hosts() 会排除网络地址和广播地址
-    except ValueError:
-        raise ValueError(f"无效的子网格式: {subnet}")
+    return list(iter_targets(subnet).hosts())  # CIDR 会排除网络地址和广播地址
+
+def bounded_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int = 100,
+    window: Optional[int] = None,
+) -> Iterator[Tuple[T, Future]]:
+    """
+    有界窗口的并发执行器：同一时刻最多 window 个任务在途，
+    每完成一个任务再从 items 中取下一个提交，按完成顺序产出 (item, future)。
+    内存占用只与 window 有关，与目标总数无关。
+    :param window: 在途任务上限，默认为 max_workers 的两倍，保证线程不空闲
+    """
+    window = window or max_workers * 2
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {executor.submit(func, item): item for item in islice(items, window)}
+        try:
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = in_flight.pop(future)
+                    for next_item in islice(items, 1):
+                        in_flight[executor.submit(func, next_item)] = next_item
+                    yield item, future
+        finally:
+            # 调用方提前停止迭代时，取消尚未开始的任务
+            for future in in_flight:
+                future.cancel()
+
+
+def iter_concurrent_scan(
+    ip_list: Iterable[str],
+    check_func: Callable[[str], bool],
+    max_workers: int = 100,
+    window: Optional[int] = None,
+) -> Iterator[Dict[str, str]]:
+    """concurrent_scan 的生成器版本：每台主机完成后立即产出 {"ip": ..., "status": ...}"""
+    for ip, future in bounded_map(check_func, ip_list, max_workers, window):
+        result = {"ip": ip, "status": "DOWN"}
+        try:
+            if future.result():
+                result["status"] = "UP"
+        except Exception as e:
+            result["status"] = f"Error: {e}"
+        yield result
+
 
 def concurrent_scan(
-    ip_list: List[str],
+    ip_list: Iterable[str],
     check_func: Callable[[str], bool],
-    max_workers: int = 100
+    max_workers: int = 100,
+    on_result: Optional[Callable[[Dict[str, str]], None]] = None,
+    progress: Optional[ScanProgress] = None,
 ) -> List[Dict[str, str]]:
     """
     并发扫描 IP 列表，返回存活的主机及其扫描结果。
-    :param ip_list: 要扫描的 IP 地址列表
+    :param ip_list: 要扫描的 IP 地址（列表或任意迭代器，按需读取）
     :param check_func: 判断主机是否存活的函数（参数是 IP，返回 bool）
     :param max_workers: 最大线程数
+    :param on_result: 每台主机完成时的回调
+    :param progress: 每台主机完成时推进的进度
     :return: 包含主机 IP 和扫描结果的字典列表
     """
     results = []
+    for result in iter_concurrent_scan(ip_list, check_func, max_workers):
+        results.append(result)
+        if progress:
+            progress.advance()
+        if on_result:
+            on_result(result)
+    return results
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_ip = {executor.submit(check_func, ip): ip for ip in ip_list}
-
-        for future in as_completed(future_to_ip):
-            ip = future_to_ip[future]
-            result = {"ip": ip, "status": "DOWN"}
-
-            try:
-                if future.result():
-                    result["status"] = "UP"
-            except Exception as e:
-                result["status"] = f"Error: {e}"
-
-            results.append(result)
 
-    return results
+def iter_concurrent_port_scan(
+    ip_list: Iterable[str],
+    scan_func: Callable[[str], List[int]],
+    max_workers: int = 100,
+    window: Optional[int] = None,
+) -> Iterator[Dict[str, object]]:
+    """concurrent_port_scan 的生成器版本：每台主机完成后立即产出 {"ip": ..., "open_ports": [...]}"""
+    for ip, future in bounded_map(scan_func, ip_list, max_workers, window):
+        try:
+            yield {"ip": ip, "open_ports": future.result()}
+        except Exception as e:
+            yield {"ip": ip, "open_ports": [], "error": str(e)}
 
 
 def concurrent_port_scan(
-    ip_list: List[str],
+    ip_list: Iterable[str],
     scan_func: Callable[[str], List[int]],
-    max_workers: int = 100
+    max_workers: int = 100,
+    on_result: Optional[Callable[[Dict[str, object]], None]] = None,
 ) -> List[Dict[str, object]]:
     """
     并发对多个 IP 扫描端口，返回每台主机的开放端口列表。
 
     参数:
-        ip_list: 要扫描的 IP 地址列表
+        ip_list: 要扫描的 IP 地址（列表或任意迭代器，按需读取）
         scan_func: 实际扫描函数，输入是 IP，返回开放端口列表
         max_workers: 最大并发线程数
+        on_result: 每台主机完成时的回调
 
     返回:
         List[dict]，如:
@@ -77,23 +196,8 @@ def concurrent_port_scan(
             ]
     """
     results = []
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_ip = {executor.submit(scan_func, ip): ip for ip in ip_list}
-
-        for future in as_completed(future_to_ip):
-            ip = future_to_ip[future]
-            try:
-                ports = future.result()
-                results.append({
-                    "ip": ip,
-                    "open_ports": ports
-                })
-            except Exception as e:
-                results.append({
-                    "ip": ip,
-                    "open_ports": [],
-                    "error": str(e)
-                })
-
-    return results
\ No newline at end of file
+    for result in iter_concurrent_port_scan(ip_list, scan_func, max_workers):
+        results.append(result)
+        if on_result:
+            on_result(result)
+    return results
@@ -1,4 +1,5 @@
 import sys
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from ui.main_window import MainWindow
 from core.utils import resource_path
@@ -19,4 +20,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包后的程序启动多进程扫描的子进程时需要
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,56 @@
+"""持久化缓存：过期、LRU 淘汰和 JSON 读写"""
+import json
+import time
+
+from core.cache import PersistentCache
+
+
+def test_ttl():
+    cache = PersistentCache(ttl=60)
+    cache.put("fresh", 1)
+    cache.put("stale", 2, stamp=time.time() - 120)
+    assert cache.get("fresh") == 1
+    assert cache.get("stale") is None
+    assert len(cache) == 1
+
+
+def test_lru_eviction():
+    cache = PersistentCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1      # a 变为最近使用
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = PersistentCache(path, ttl=60)
+    cache.put("a", [1, "x"])
+    cache.put("old", 0, stamp=time.time() - 3600)
+    cache.save()
+    loaded = PersistentCache(path, ttl=60)
+    assert loaded.get("a") == [1, "x"]
+    assert loaded.get("old") is None
+    assert len(loaded) == 1
+
+
+def test_save_only_when_dirty(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = PersistentCache(str(path))
+    cache.save()
+    assert not path.exists()
+    cache.put("a", 1)
+    cache.save()
+    path.write_text(json.dumps({"a": [2, time.time()]}))
+    cache.save()                    # 没有新的修改，不覆盖文件
+    assert json.loads(path.read_text())["a"][0] == 2
+
+
+def test_corrupt_file_is_ignored(tmp_path, capsys):
+    path = tmp_path / "cache.json"
+    path.write_text("{not json")
+    cache = PersistentCache(str(path))
+    assert len(cache) == 0
+    assert "⚠️" in capsys.readouterr().out
@@ -0,0 +1,93 @@
+"""分布式扫描协调端：单元租期、心跳续租上限和收回重试"""
+import time
+
+import pytest
+
+from core.distributed import MAX_ATTEMPTS, Coordinator
+
+
+@pytest.fixture
+def make_coordinator():
+    coordinators = []
+
+    def make(target="10.0.0.1-10.0.0.6", **kwargs):
+        kwargs.setdefault("unit_size", 2)
+        coordinator = Coordinator(target, ports=[80], address=("127.0.0.1", 0), history=False, **kwargs)
+        coordinators.append(coordinator)
+        return coordinator
+
+    yield make
+    for coordinator in coordinators:
+        coordinator._server.server_close()
+
+
+def test_units_cover_targets(make_coordinator):
+    coordinator = make_coordinator()
+    units = [coordinator._next_unit("w") for _ in range(3)]
+    assert [unit.hosts for unit in units] == [["10.0.0.1", "10.0.0.2"], ["10.0.0.3", "10.0.0.4"],
+                                              ["10.0.0.5", "10.0.0.6"]]
+    assert coordinator._next_unit("w") is None
+    for unit in units:
+        coordinator._add_results("w", unit.id, [{"ip": ip, "open_ports": []} for ip in unit.hosts])
+        coordinator._complete("w", unit.id)
+    assert coordinator._finished.is_set()
+    assert len(coordinator.results) == 6
+
+
+def test_expired_lease_is_reassigned(make_coordinator):
+    coordinator = make_coordinator(lease_timeout=0.05)
+    unit = coordinator._next_unit("a")
+    time.sleep(0.1)
+    coordinator._reclaim_expired()
+    assert unit.id not in coordinator._leased
+    again = coordinator._next_unit("b")
+    assert again is unit and again.holder == "b" and again.attempts == 2
+    # 原持有者迟到的结果和完成消息被丢弃
+    coordinator._add_results("a", unit.id, [{"ip": "10.0.0.1", "open_ports": [80]}])
+    coordinator._complete("a", unit.id)
+    assert unit.id in coordinator._leased and not unit.results
+
+
+def test_unit_fails_after_max_attempts(make_coordinator):
+    coordinator = make_coordinator(target="10.0.0.1-10.0.0.2", lease_timeout=0.01)
+    for attempt in range(MAX_ATTEMPTS):
+        assert coordinator._next_unit(f"w{attempt}") is not None
+        time.sleep(0.02)
+        coordinator._reclaim_expired()
+    assert coordinator.failed_hosts == ["10.0.0.1", "10.0.0.2"]
+    assert coordinator._next_unit("w") is None
+    assert coordinator._finished.is_set()
+
+
+def test_heartbeat_renews_only_reported_units(make_coordinator):
+    coordinator = make_coordinator(lease_timeout=0.2)
+    first, second = coordinator._next_unit("w"), coordinator._next_unit("w")
+    deadline = second.deadline
+    time.sleep(0.05)
+    coordinator._renew("w", [first.id])
+    assert first.deadline > deadline and second.deadline == deadline
+    coordinator._renew("other", [second.id])
+    assert second.deadline == deadline
+
+
+def test_heartbeat_cannot_extend_past_max_lease_age(make_coordinator):
+    coordinator = make_coordinator(lease_timeout=0.1, max_lease_age=0.15)
+    unit = coordinator._next_unit("w")
+    for _ in range(4):
+        time.sleep(0.05)
+        coordinator._renew("w", [unit.id])
+    assert unit.deadline == pytest.approx(unit.leased_at + 0.15)
+    coordinator._reclaim_expired()
+    assert unit.id not in coordinator._leased
+    # 上报结果说明扫描仍在推进，不受上限限制
+    unit = coordinator._next_unit("w")
+    time.sleep(0.2)
+    coordinator._add_results("w", unit.id, [])
+    assert unit.deadline > unit.leased_at + 0.15
+
+
+def test_disconnect_reclaims_units(make_coordinator):
+    coordinator = make_coordinator()
+    unit = coordinator._next_unit("w")
+    coordinator._reclaim_worker("w")
+    assert coordinator._next_unit("x") is unit
@@ -0,0 +1,85 @@
+"""扫描历史：旧 JSON 迁移、端口编码，以及部分端口扫描时的主机状态合并"""
+import json
+
+import pytest
+
+from core.history import HistoryStore, decode_ports, encode_ports
+
+FULL = range(1, 1025)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+
+def test_encode_ports():
+    assert encode_ports([80, 1, 3, 2, 443, 2]) == "1-3,80,443"
+    assert decode_ports("1-3,80,443") == {1, 2, 3, 80, 443}
+    assert decode_ports(None) == set() and encode_ports([]) == ""
+
+
+def test_migrate_json_once(tmp_path):
+    legacy = tmp_path / "scan_results.json"
+    legacy.write_text(json.dumps([
+        {"results": [{"ip": "10.0.0.1", "scan_type": "port", "open_ports": [22, 80]}]},
+        {"results": [{"ip": "10.0.0.2", "status": "UP"}, {"ip": "10.0.0.3", "status": "DOWN"}]},
+    ]), encoding="utf-8")
+    store = HistoryStore(str(tmp_path / "history.db"), legacy_json=str(legacy))
+    assert store.count_scans() == 2
+    assert store.alive_hosts() == {"10.0.0.1": [22, 80], "10.0.0.2": []}
+    assert [result["ip"] for result in store.query(port=22)] == ["10.0.0.1"]
+    store.close()
+    # 原文件保持不动，再次打开不会重复导入
+    assert legacy.exists()
+    store = HistoryStore(str(tmp_path / "history.db"), legacy_json=str(legacy))
+    assert store.count_scans() == 2
+    store.close()
+
+
+def test_partial_scan_keeps_other_ports(store):
+    store.add_scan([{"ip": "10.0.0.1", "open_ports": [22, 8080]}], ports=FULL)
+    # 只扫 80,443 的快速扫描没有发现开放端口：既不关闭 22，也不把主机记为离线
+    store.add_scan([{"ip": "10.0.0.1", "open_ports": []}], ports=[80, 443])
+    assert store.host_states() == {"10.0.0.1": ([22, 8080], set(FULL))}
+    # 覆盖 22 的扫描才会把它记为关闭
+    store.add_scan([{"ip": "10.0.0.1", "open_ports": [8080]}], ports=[22, 8080])
+    assert store.alive_hosts() == {"10.0.0.1": [8080]}
+    store.add_scan([{"ip": "10.0.0.1", "open_ports": []}], ports=[8080])
+    assert store.alive_hosts() == {}
+
+
+def test_unknown_scan_range_merges(store):
+    store.add_scan([{"ip": "10.0.0.2", "open_ports": [8080]}])
+    store.add_scan([{"ip": "10.0.0.2", "open_ports": [9090]}])
+    assert store.host_states() == {"10.0.0.2": ([8080, 9090], None)}
+
+
+def test_host_scan_keeps_ports(store):
+    store.add_scan([{"ip": "10.0.0.3", "open_ports": [443]}], ports=[443])
+    store.add_scan([{"ip": "10.0.0.3", "status": "UP"}])
+    assert store.alive_hosts() == {"10.0.0.3": [443]}
+    store.add_scan([{"ip": "10.0.0.3", "status": "DOWN"}])
+    assert store.alive_hosts() == {}
+
+
+def test_add_changes(store):
+    store.add_scan([{"ip": "10.0.0.1", "open_ports": [22]}, {"ip": "10.0.0.2", "open_ports": [80]}], ports=FULL)
+    diff = {"new_hosts": [{"ip": "10.0.0.9", "open_ports": [25]}], "lost_hosts": ["10.0.0.2"],
+            "opened": {"10.0.0.1": [443]}, "closed": {}}
+    states = {"10.0.0.1": [22, 443], "10.0.0.2": None, "10.0.0.9": [25]}
+    scan_id = store.add_changes(diff, states, target="10.0.0.0/24",
+                                scanned={"10.0.0.1": FULL, "10.0.0.9": FULL})
+    assert store.alive_hosts() == {"10.0.0.1": [22, 443], "10.0.0.9": [25]}
+    kinds = sorted((change["ip"], change["kind"], change["port"]) for change in store.changes(scan_id))
+    assert kinds == [("10.0.0.1", "opened", 443), ("10.0.0.2", "lost_host", None), ("10.0.0.9", "new_host", None)]
+
+
+def test_query_by_subnet(store):
+    store.add_scan([{"ip": "10.0.0.1", "open_ports": [22]}, {"ip": "10.0.1.1", "open_ports": []}], ports=[22])
+    assert [result["ip"] for result in store.query(subnet="10.0.0.0/24")] == ["10.0.0.1"]
+    assert store.count(subnet="10.0.0.0/16") == 2
+    with pytest.raises(ValueError):
+        store.query(subnet="10.0.0.0/99")
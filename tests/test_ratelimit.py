@@ -0,0 +1,65 @@
+"""全局限速器：令牌桶、拥塞窗口和 AIMD 调整"""
+import pytest
+
+from core.ratelimit import DROP, NEUTRAL, REPLY, RateLimiter
+
+
+def test_window_limits_in_flight():
+    limiter = RateLimiter(max_window=4, min_window=1)
+    for _ in range(4):
+        assert limiter.try_acquire() == 0
+    assert limiter.try_acquire() > 0
+    limiter.release(NEUTRAL)
+    assert limiter.in_flight == 3
+    assert limiter.try_acquire() == 0
+
+
+def test_token_bucket():
+    limiter = RateLimiter(max_pps=100)
+    assert limiter.try_acquire() == 0
+    wait = limiter.try_acquire()
+    assert 0 < wait <= 0.011
+
+
+def test_drops_halve_window_and_rate():
+    limiter = RateLimiter(max_pps=1000, min_pps=10, max_window=64, min_window=4)
+    for _ in range(5):
+        limiter.record(DROP)
+    # 同一轮丢包只退避一次
+    assert limiter.window == 32
+    assert limiter.rate == pytest.approx(500)
+    limiter._last_backoff = 0.0
+    limiter.record(DROP)
+    assert limiter.window == 16
+    assert limiter.rate == pytest.approx(250)
+
+
+def test_backoff_floor():
+    limiter = RateLimiter(max_pps=100, min_pps=60, max_window=8, min_window=6)
+    for _ in range(3):
+        limiter._last_backoff = 0.0
+        for _ in range(5):
+            limiter.record(DROP)
+    assert limiter.window == 6
+    assert limiter.rate == 60
+
+
+def test_replies_grow_back():
+    limiter = RateLimiter(max_pps=1000, max_window=64, min_window=4)
+    for _ in range(5):
+        limiter.record(DROP)
+    window, rate = limiter.window, limiter.rate
+    # 丢包率估计降到阈值以下之前不增长
+    limiter.record(REPLY)
+    assert limiter.window == window
+    for _ in range(200):
+        limiter.record(REPLY)
+    assert window < limiter.window <= 64
+    assert rate < limiter.rate <= 1000
+
+
+def test_neutral_outcome_is_ignored():
+    limiter = RateLimiter(max_window=16, min_window=1)
+    for _ in range(50):
+        limiter.record(NEUTRAL)
+    assert limiter.window == 16 and limiter.drop_rate == 0
@@ -0,0 +1,76 @@
+"""SYN 扫描：报文模板的校验和，以及序列号 cookie 与回包的匹配"""
+import struct
+import time
+
+from core.async_scanner import CLOSED, HostAggregator
+from core.packet import IP_PROTO_TCP, checksum, ip_to_int
+from core.syn_scanner import TCP_ACK, TCP_RST, TCP_SYN, SynScanner
+
+SRC, DST = "192.0.2.1", "198.51.100.7"
+
+
+def tcp_checksum_ok(packet: bytes) -> bool:
+    tcp = packet[20:]
+    pseudo = packet[12:20] + struct.pack("!BBH", 0, IP_PROTO_TCP, len(tcp))
+    return checksum(pseudo + tcp) == 0
+
+
+def reply(src: str, sport: int, dport: int, ack: int, flags: int) -> bytes:
+    ip = struct.pack("!BBHHHBBHII", 0x45, 0, 40, 0, 0x4000, 64, IP_PROTO_TCP, 0, ip_to_int(src), ip_to_int(SRC))
+    tcp = struct.pack("!HHIIBBHHH", sport, dport, 12345, ack, 5 << 4, flags, 65535, 0, 0)
+    return ip + tcp
+
+
+class FakeReceiver:
+    """按顺序交出预先准备的回包，取完后通知扫描器停止"""
+
+    def __init__(self, scanner, packets):
+        self.scanner = scanner
+        self.packets = list(packets)
+
+    def recv(self, size):
+        if not self.packets:
+            self.scanner._stop.set()
+            raise OSError("empty")
+        return self.packets.pop(0)
+
+
+def test_template_checksums():
+    scanner = SynScanner(sport=45000)
+    cookie = scanner._cookie(ip_to_int(DST), 443)
+    packet = scanner.template.build(ip_to_int(SRC), ip_to_int(DST), 443, cookie)
+    assert checksum(packet[:20]) == 0
+    assert tcp_checksum_ok(packet)
+    sport, dport, seq = struct.unpack("!HHI", packet[20:28])
+    assert (sport, dport, seq) == (45000, 443, cookie)
+
+
+def test_cookie_depends_on_target_and_secret():
+    scanner = SynScanner()
+    dst = ip_to_int(DST)
+    assert scanner._cookie(dst, 80) == scanner._cookie(dst, 80)
+    assert scanner._cookie(dst, 80) != scanner._cookie(dst, 81)
+    assert scanner._cookie(dst, 80) != scanner._cookie(dst + 1, 80)
+    other = SynScanner()
+    other._secret = scanner._secret ^ 1
+    assert other._cookie(dst, 80) != scanner._cookie(dst, 80)
+
+
+def test_reply_matches_cookie():
+    scanner = SynScanner(sport=45000)
+    hosts = HostAggregator([22, 80, 443])
+    list(hosts.pairs([DST]))
+    now = time.monotonic()
+    for port in (22, 80, 443):
+        scanner._table[(DST, port)] = [scanner._cookie(ip_to_int(DST), port), 1, now]
+    cookie = scanner._cookie(ip_to_int(DST), 22)
+    packets = [
+        reply(DST, 22, 45000, cookie, TCP_SYN | TCP_ACK),           # ack 不是 cookie + 1：忽略
+        reply(DST, 22, 45001, cookie + 1, TCP_SYN | TCP_ACK),       # 不是本扫描的源端口：忽略
+        reply(DST, 22, 45000, (cookie + 1) & 0xFFFFFFFF, TCP_SYN | TCP_ACK),
+        reply(DST, 80, 45000, (scanner._cookie(ip_to_int(DST), 80) + 1) & 0xFFFFFFFF, TCP_RST | TCP_ACK),
+    ]
+    scanner._recv_loop(FakeReceiver(scanner, packets), hosts)
+    assert set(scanner._table) == {(DST, 443)}
+    hosts.record(DST, 443, CLOSED)
+    assert hosts.results == [{"ip": DST, "open_ports": [22]}]
@@ -0,0 +1,86 @@
+"""目标解析：展开、计数、排除、去重，以及伪随机置换"""
+import pytest
+
+from core.packet import ip_to_int
+from core.targets import FeistelPermutation, TargetSpec
+
+
+def hosts(spec, **kwargs):
+    return list(TargetSpec(spec, **kwargs).hosts())
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("10.0.0.0/30", ["10.0.0.1", "10.0.0.2"]),
+    ("10.0.0.1-10.0.0.3", ["10.0.0.1", "10.0.0.2", "10.0.0.3"]),
+    ("10.0.0-1.1,5", ["10.0.0.1", "10.0.0.5", "10.0.1.1", "10.0.1.5"]),
+    ("192.168.1.7", ["192.168.1.7"]),
+])
+def test_expansion(spec, expected):
+    assert hosts(spec) == expected
+    assert len(TargetSpec(spec)) == len(expected)
+
+
+def test_exclude():
+    spec = TargetSpec("10.0.0.0/24", exclude="10.0.0.10-10.0.0.19 10.0.0.200")
+    result = list(spec.hosts())
+    assert len(spec) == len(result) == 254 - 11
+    assert "10.0.0.15" not in result and "10.0.0.200" not in result
+    assert ip_to_int("10.0.0.15") not in spec and ip_to_int("10.0.0.20") in spec
+
+
+@pytest.mark.parametrize("spec", [
+    "10.0.0.0/24 10.0.0.5",
+    "10.0.0.5 10.0.0.5 10.0.0.1",
+    "10.0.0.1-3 10.0.0.*",
+    "10.0-1.*.1 10.1.*.1 192.168.0.1",
+])
+@pytest.mark.parametrize("randomize", [False, True])
+def test_overlapping_specs_emit_each_address_once(spec, randomize):
+    targets = TargetSpec(spec, randomize=randomize, seed=7)
+    result = list(targets.hosts())
+    assert len(result) == len(set(result)) == len(targets)
+
+
+def test_overlap_with_exclude():
+    targets = TargetSpec("10.0.0.0/24 10.0.0.5", exclude="10.0.0.5-10.0.0.9")
+    assert len(targets) == len(list(targets.hosts())) == 249
+
+
+def test_randomized_order_is_a_permutation():
+    sequential = hosts("10.0.0.0/22", exclude="10.0.1.0/24")
+    shuffled = hosts("10.0.0.0/22", exclude="10.0.1.0/24", randomize=True, seed=1)
+    assert shuffled != sequential
+    assert sorted(shuffled, key=ip_to_int) == sequential
+    assert hosts("10.0.0.0/22", randomize=True, seed=1) == hosts("10.0.0.0/22", randomize=True, seed=1)
+
+
+def test_shards_cover_targets_once():
+    targets = TargetSpec("10.0.0.0/24 10.0.2.1-20", exclude="10.0.0.100", randomize=True, seed=3)
+    shards = [list(targets.shard(index, 3)) for index in range(3)]
+    merged = [value for shard in shards for value in shard]
+    assert sorted(merged) == sorted(targets.iter_ints())
+
+
+def test_resume_from_position():
+    targets = TargetSpec("10.0.0.0/24", exclude="10.0.0.50", randomize=True, seed=5)
+    positions = list(targets.iter_positions())
+    position, _ = positions[100]
+    assert list(targets.iter_ints(position)) == [value for _, value in positions[100:]]
+
+
+@pytest.mark.parametrize("spec", ["10.0.0.256", "10.0.0.0/33", "10.0.0.9-10.0.0.1", "1.2.3"])
+def test_invalid_spec(spec):
+    with pytest.raises(ValueError):
+        TargetSpec(spec)
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 10, 255, 1000, 4097])
+def test_feistel_is_bijection(n):
+    permutation = FeistelPermutation(n, seed=42)
+    assert sorted(permutation[i] for i in range(n)) == list(range(n))
+
+
+def test_feistel_seed():
+    a, b = FeistelPermutation(1000, seed=1), FeistelPermutation(1000, seed=2)
+    assert [a[i] for i in range(1000)] == [FeistelPermutation(1000, seed=1)[i] for i in range(1000)]
+    assert [a[i] for i in range(1000)] != [b[i] for i in range(1000)]
@@ -0,0 +1,71 @@
+"""自适应超时：RTT 估计、模板上下限、子网回退和重传判断"""
+import pytest
+
+from core.timing import TIMING_TEMPLATES, RttEstimator, TimingEngine, get_timing
+
+
+def test_rtt_estimator():
+    estimator = RttEstimator()
+    assert estimator.timeout() is None
+    estimator.update(0.2)
+    assert estimator.srtt == pytest.approx(0.2)
+    assert estimator.rttvar == pytest.approx(0.1)
+    assert estimator.timeout() == pytest.approx(0.2 + 4 * 0.1)
+    estimator.update(0.6)
+    # srtt += (0.6 - 0.2) / 8，rttvar += (|0.4| - 0.1) / 4
+    assert estimator.srtt == pytest.approx(0.25)
+    assert estimator.rttvar == pytest.approx(0.175)
+    assert estimator.timeout() == pytest.approx(0.25 + 4 * 0.175)
+
+
+def test_initial_and_clamped_timeout():
+    engine = TimingEngine("T4")
+    assert engine.timeout("10.0.0.1") == TIMING_TEMPLATES["T4"].initial_rtt_timeout
+    engine.record_rtt("10.0.0.1", 0.001)
+    assert engine.timeout("10.0.0.1") == TIMING_TEMPLATES["T4"].min_rtt_timeout
+    engine.record_rtt("10.0.0.2", 5.0)
+    assert engine.timeout("10.0.0.2") == TIMING_TEMPLATES["T4"].max_rtt_timeout
+
+
+def test_subnet_and_global_fallback():
+    engine = TimingEngine("T3")
+    engine.record_rtt("10.0.0.1", 0.5)
+    # 同一 /24 的主机借用子网估计，其他网段退回全局估计
+    assert engine.timeout("10.0.0.99") == pytest.approx(0.5 + 4 * 0.25)
+    engine.record_rtt("10.0.1.1", 0.3)
+    assert engine.timeout("10.0.1.2") == pytest.approx(0.3 + 4 * 0.15)
+    assert engine.timeout("192.168.0.1") == pytest.approx(engine._global.timeout())
+
+
+def test_fixed_timeout():
+    engine = get_timing("T5", timeout=2.5)
+    engine.record_rtt("10.0.0.1", 0.01)
+    assert engine.timeout("10.0.0.1") == 2.5
+
+
+def test_should_retry():
+    engine = TimingEngine("T3")
+    # 从未回应的主机不重传
+    assert not engine.should_retry("10.0.0.1", 0)
+    engine.record_rtt("10.0.0.1", 0.1)
+    assert engine.should_retry("10.0.0.1", 0)
+    assert not engine.should_retry("10.0.0.1", 1)
+    # 出现过重传后才回应的主机允许多重传一次，且不超过上限
+    engine.record_rtt("10.0.0.1", 0.1, retries=3)
+    assert engine.should_retry("10.0.0.1", 3)
+    assert not engine.should_retry("10.0.0.1", 4)
+    assert not engine.should_retry("10.0.0.1", 1, max_retries=1)
+
+
+def test_template_engines_share_rtt():
+    t5 = get_timing("T5")
+    t2 = get_timing("T2")
+    assert t5.template is TIMING_TEMPLATES["T5"] and t2.template is TIMING_TEMPLATES["T2"]
+    t5.record_rtt("203.0.113.7", 0.2)
+    assert t2.is_responsive("203.0.113.7")
+    assert t5.timeout("203.0.113.7") == TIMING_TEMPLATES["T5"].max_rtt_timeout
+
+
+def test_unknown_template():
+    with pytest.raises(ValueError):
+        TimingEngine("T9")
@@ -1,48 +1,49 @@
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QToolBar, QAction,
-    QLabel, QPushButton, QTextEdit, QLineEdit, QTabWidget, QComboBox, QGroupBox,QTableWidget, QTableWidgetItem
+    QLabel, QPushButton, QTextEdit, QLineEdit, QTabWidget, QComboBox, QGroupBox,QTableWidget, QTableWidgetItem,
+    QProgressBar, QMessageBox
 )
-from PyQt5.QtCore import QThread, pyqtSignal, Qt
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal, Qt
 from PyQt5.QtGui import QFont
 import os
-import json
+import sqlite3
 import sys
+import time
 import ipaddress
-import networkx as nx
+from collections import deque
 from core.discovery import scan_subnet
-from core.port_scanner import scan_port
-from core.os_fingerprint import os_fingerprint
-from core.service_probe import guess_service
+from core.port_scanner import resume_scan, scan_port
+from core.checkpoint import ScanCheckpoint, default_checkpoint_path, read_checkpoint_info
+from core.pipeline import pipeline_scan
+from core.sharding import sharded_scan_port
+from core.incremental import IncrementalScan
+from core.history import get_history_store, result_type
+from core.os_fingerprint import ERROR_OS, FingerprintService
+from ui.widgets import ResultTable
+from ui.topology import TopologyView
+from ui.metrics_panel import MetricsPanel
+from core import metrics
+from core.metrics import ScanProfiler, get_registry
+from core.utils import ScanProgress
+from core.timing import DEFAULT_TEMPLATE, TIMING_TEMPLATES
 from functools import partial
 
+# 正在使用断点文件的窗口：多个窗口同时扫描时只有一个写断点，避免互相覆盖
+_checkpoint_owner = None
+
 def resource_path(relative_path):
     """获取资源的绝对路径，兼容开发和打包环境"""
     base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
     return os.path.join(base_path, relative_path)
 
-def get_runtime_data_path(relative_path):
-    """返回一个可用于写入文件的路径，适配打包后环境"""
-    if getattr(sys, 'frozen', False):
-        # PyInstaller 打包后的路径：可写的目录
-        base_path = os.path.dirname(sys.executable)
-    else:
-        # 普通运行时：当前目录
-        base_path = os.path.abspath(".")
-
-    full_path = os.path.join(base_path, relative_path)
-    os.makedirs(os.path.dirname(full_path), exist_ok=True)
-    return full_path
-
-history_path = get_runtime_data_path("data/scan_results.json")
-
 class MainWindow(QMainWindow):
+    # 后台操作系统识别结果 (ip, 操作系统)，由工作线程发出、在主线程处理
+    os_result_signal = pyqtSignal(str, str)
+
     def __init__(self):
         super().__init__()
-        # 初始化扫描历史
-        self.scan_history = []
-
-        # 加载历史记录
-        self.load_scan_history()
+        # 扫描历史保存在 SQLite 中，切换到历史标签页时才按页读取
+        self.history_page = 0
 
         # 初始化扫描结果
         self.latest_scan_results = []
@@ -72,12 +73,23 @@ class MainWindow(QMainWindow):
         input_layout.addWidget(label_profile)
 
         self.profile_box = QComboBox()
-        self.profile_box.addItems(["端口扫描", "快速扫描", "主机扫描"])
+        self.profile_box.addItems(["端口扫描", "快速扫描", "主机扫描", "流水线扫描", "增量扫描", "多进程扫描"])
         input_layout.addWidget(self.profile_box)
 
+        # 时序模板：与 nmap -T0 ~ -T5 对应，决定初始/最小/最大超时和重传次数
+        self.timing_box = QComboBox()
+        for name, template in TIMING_TEMPLATES.items():
+            self.timing_box.addItem(f"{name} {template.name}", name)
+        self.timing_box.setCurrentIndex(list(TIMING_TEMPLATES).index(DEFAULT_TEMPLATE))
+        input_layout.addWidget(self.timing_box)
+
         self.scan_button = QPushButton("开始扫描")
         input_layout.addWidget(self.scan_button)
 
+        # 端口扫描中断后（崩溃、休眠、关闭窗口）从 data/ 下的断点继续
+        self.resume_button = QPushButton("恢复扫描")
+        input_layout.addWidget(self.resume_button)
+
         input_group.setLayout(input_layout)
         main_layout.addWidget(input_group)
 
@@ -93,6 +105,16 @@ class MainWindow(QMainWindow):
 
         main_layout.addLayout(command_layout)
 
+        # 扫描进度与预计剩余时间
+        progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setTextVisible(False)
+        progress_layout.addWidget(self.progress_bar)
+        self.progress_label = QLabel("就绪")
+        progress_layout.addWidget(self.progress_label)
+        main_layout.addLayout(progress_layout)
+
         self.tab_widget = QTabWidget()
         self.output_tabs = {}
 
@@ -102,19 +124,42 @@ class MainWindow(QMainWindow):
             "Topology": "拓扑结构",
             "Host Details": "主机详情",
             "Scan History": "扫描历史", 
+            "Metrics": "性能指标",
         }
 
         for key, name in tab_names.items():
             tab = QWidget()
             layout = QVBoxLayout()
 
-            if key == "Topology":
-                from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-                from matplotlib.figure import Figure
+            if key == "Scan History":
+                # 过滤条件与翻页控件
+                filter_layout = QHBoxLayout()
+                self.history_filter = QLineEdit()
+                self.history_filter.setPlaceholderText("按 IP / 子网（如 192.168.1.0/24）/ 端口（如 :22）过滤")
+                self.history_filter.returnPressed.connect(self.on_history_filter)
+                filter_layout.addWidget(self.history_filter)
+                self.history_prev = QPushButton("上一页")
+                self.history_prev.clicked.connect(partial(self.change_history_page, -1))
+                filter_layout.addWidget(self.history_prev)
+                self.history_page_label = QLabel("")
+                filter_layout.addWidget(self.history_page_label)
+                self.history_next = QPushButton("下一页")
+                self.history_next.clicked.connect(partial(self.change_history_page, 1))
+                filter_layout.addWidget(self.history_next)
+                layout.addLayout(filter_layout)
 
-                self.topology_figure = Figure()
-                self.topology_canvas = FigureCanvas(self.topology_figure)
-                layout.addWidget(self.topology_canvas)
+            if key == "Topology":
+                # 按子网聚合的拓扑图，布局在后台线程计算；matplotlib 在第一次绘制时才加载
+                self.topology_view = TopologyView()
+                layout.addWidget(self.topology_view)
+            elif key == "Metrics":
+                # 计数器、队列长度和各阶段耗时，只在标签页可见时刷新
+                self.metrics_panel = MetricsPanel()
+                layout.addWidget(self.metrics_panel)
+            elif key == "Ports / Hosts":
+                # 表格只绘制可见行，扫描结果逐批插入，不随标签页切换重建
+                self.result_table = ResultTable()
+                layout.addWidget(self.result_table)
             else:
                 text_edit = QTextEdit()
                 text_edit.setReadOnly(True)
@@ -128,32 +173,55 @@ class MainWindow(QMainWindow):
             # self.output_tabs[key] = text_edit
 
         main_layout.addWidget(self.tab_widget)
+        # 扫描输出只保留最近的行，避免大规模扫描时日志无限增长
+        self.output_tabs["Nmap Output"].document().setMaximumBlockCount(self.OUTPUT_MAX_LINES)
 
         # ✅ 绑定标签页切换事件
         self.tab_widget.currentChanged.connect(self.on_tab_changed)
 
         # ===== 绑定按钮事件 =====
         self.scan_button.clicked.connect(self.on_scan_clicked)
+        self.resume_button.clicked.connect(self.on_resume_clicked)
+        self.refresh_resume_button()
 
         # 保存最新扫描结果（用于主机详情）
         self.latest_scan_results = []
 
-    def save_scan_history(self):
-        # 保存扫描历史到 scan_results.json 文件
-        try:
-            with open(history_path, "w", encoding="utf-8") as f:
-                json.dump(self.scan_history, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            print(f"保存扫描历史时发生错误: {e}")
-
-    def load_scan_history(self):
-        # 加载扫描历史记录从 scan_results.json 文件
-        if os.path.exists(history_path):
-            try:
-                with open(history_path, "r", encoding="utf-8") as f:
-                    self.scan_history = json.load(f)
-            except Exception as e:
-                print(f"加载扫描历史时发生错误: {e}")
+        # 主机详情：操作系统在后台并发识别，结果到达后合并刷新
+        self.os_service = FingerprintService()
+        self.host_os = {}
+        self.os_result_signal.connect(self.on_os_result)
+        self._host_details_timer = QTimer(self)
+        self._host_details_timer.setSingleShot(True)
+        self._host_details_timer.setInterval(200)
+        self._host_details_timer.timeout.connect(self.render_host_details)
+
+    def closeEvent(self, event):
+        self.os_service.shutdown()
+        self.topology_view.shutdown()
+        super().closeEvent(event)
+
+    HISTORY_PAGE_SIZE = 200  # 历史标签页每页显示的结果行数
+    OUTPUT_MAX_LINES = 20000  # 扫描输出标签页保留的行数
+
+    def history_conditions(self):
+        """把过滤框内容解析为查询条件：":端口"、CIDR 子网或单个 IP"""
+        text = self.history_filter.text().strip()
+        if not text:
+            return {}
+        if text.startswith(":") and text[1:].isdigit():
+            return {"port": int(text[1:])}
+        if "/" in text:
+            return {"subnet": text}
+        return {"ip": text}
+
+    def on_history_filter(self):
+        self.history_page = 0
+        self.display_scan_history()
+
+    def change_history_page(self, step):
+        self.history_page = max(0, self.history_page + step)
+        self.display_scan_history()
 
     def display_scan_history(self):
         text_edit = self.output_tabs["Scan History"]
@@ -161,56 +229,65 @@ class MainWindow(QMainWindow):
 
         text_edit.append('<span style="font-size:16px; font-weight:bold; color:#2e86de;">✅ 扫描历史记录：</span><br>')
 
-        if not self.scan_history:
+        store = get_history_store()
+        try:
+            conditions = self.history_conditions()
+            total = store.count(interesting=True, **conditions)
+        except ValueError as e:
+            text_edit.append(f'<span style="color:#e74c3c;">❗ {e}</span>')
+            return
+        pages = max(1, -(-total // self.HISTORY_PAGE_SIZE))
+        self.history_page = min(self.history_page, pages - 1)
+        self.history_page_label.setText(f"{self.history_page + 1} / {pages}")
+        self.history_prev.setEnabled(self.history_page > 0)
+        self.history_next.setEnabled(self.history_page < pages - 1)
+
+        if not total:
             text_edit.append('<span style="color:gray;">🔹 当前没有扫描记录。</span>')
             return
 
-        for idx, history in enumerate(self.scan_history, start=1):
-            results = history.get("results", [])
-
-            # 过滤掉没有内容的历史
-            filtered_results = []
-            for res in results:
-                scan_type = res.get("scan_type", "unknown")
-                if scan_type == "port" and not res.get("open_ports"):  # 跳过无开放端口
-                    continue
-                filtered_results.append(res)
-
-            if not filtered_results:
-                continue  # 整条记录没有需要展示的内容，就跳过
-
-            text_edit.append(f"<b>🔸 扫描 {idx}</b><br>")
-            for res in filtered_results:
-                ip = res.get("ip", "未知IP")
-                scan_type = res.get("scan_type", "unknown")
-
-                if scan_type == "port":
-                    ports = ", ".join(map(str, res.get("open_ports", [])))
-                    result_text = f"<span style='color:#27ae60;'>{ports}</span>"
-                elif scan_type == "host":
-                    status = res.get("status", "未知状态")
-                    result_text = f"<span style='color:#e67e22;'>{status}</span>"
-                else:
-                    result_text = "<span style='color:gray;'>未知结果</span>"
-
-                entry = (
-                    f"<span style='color:#2980b9;'>IP</span>: {ip} | "
-                    f"<span style='color:#2980b9;'>类型</span>: {scan_type} | "
-                    f"<span style='color:#2980b9;'>结果</span>: {result_text}<br>"
-                )
-                text_edit.append(entry)
+        # 只读取当前页，跳过无开放端口的端口扫描结果
+        rows = store.query(interesting=True, offset=self.history_page * self.HISTORY_PAGE_SIZE,
+                           limit=self.HISTORY_PAGE_SIZE, **conditions)
+        lines = []
+        current_scan = None
+        for res in rows:
+            if res["scan_id"] != current_scan:
+                current_scan = res["scan_id"]
+                when = time.strftime("%Y-%m-%d %H:%M", time.localtime(res["scan_time"]))
+                target = f" · {res['scan_target']}" if res.get("scan_target") else ""
+                if lines:
+                    lines.append("<br>")
+                lines.append(f"<b>🔸 扫描 {current_scan}</b> <span style='color:gray;'>{when}{target}</span><br>")
+
+            ip = res.get("ip", "未知IP")
+            scan_type = res.get("scan_type", "unknown")
 
-            text_edit.append("<br>")
+            if scan_type == "port":
+                ports = ", ".join(map(str, res.get("open_ports", [])))
+                result_text = f"<span style='color:#27ae60;'>{ports}</span>"
+            elif scan_type == "host":
+                status = res.get("status", "未知状态")
+                result_text = f"<span style='color:#e67e22;'>{status}</span>"
+            else:
+                result_text = "<span style='color:gray;'>未知结果</span>"
 
+            lines.append(
+                f"<span style='color:#2980b9;'>IP</span>: {ip} | "
+                f"<span style='color:#2980b9;'>类型</span>: {scan_type} | "
+                f"<span style='color:#2980b9;'>结果</span>: {result_text}<br>"
+            )
+        text_edit.append("".join(lines))
 
-    def handle_scan_result(self, results):
+
+    def handle_scan_result(self, results, target=None, ports=None):
         if not results or not isinstance(results, list):
             print("⚠️ 无效扫描结果")
             return
 
         new_results = []
         for res in results:
-            scan_type = "port" if "open_ports" in res else "host" if "status" in res else "unknown"
+            scan_type = result_type(res)
             new_result = {
                 "ip": res.get("ip", "unknown"),
                 "scan_type": scan_type,
@@ -218,19 +295,19 @@ class MainWindow(QMainWindow):
 
             if scan_type == "port":
                 new_result["open_ports"] = res.get("open_ports", [])
+                for key in ("services", "os"):
+                    if res.get(key):
+                        new_result[key] = res[key]
             elif scan_type == "host":
                 new_result["status"] = res.get("status", "未知状态")
 
             new_results.append(new_result)
 
-        scan_record = {
-            "results": new_results
-        }
-
-        self.scan_history.append(scan_record)
-        self.save_scan_history()
-
-        # 保存扫描历史到文件
+        # 追加到历史数据库（只写入本次扫描，不重写已有记录）
+        try:
+            get_history_store().add_scan(new_results, target=target, started=self.scan_started, ports=ports)
+        except sqlite3.Error as e:
+            print(f"保存扫描历史时发生错误: {e}")
 
 
     def setup_toolbar(self):
@@ -265,37 +342,10 @@ class MainWindow(QMainWindow):
     #     pos = nx.spring_layout(G)
     #     nx.draw(G, pos, ax=ax, with_labels=True, node_color="skyblue", edge_color="gray", node_size=1200, font_size=10)
     #     self.topology_canvas.draw()
-    def draw_topology_graph(self):
-        if not hasattr(self, "topology_figure"):
-            return
-
-        self.topology_figure.clear()
-        ax = self.topology_figure.add_subplot(111)
-
-        G = nx.Graph()
-        G.add_node("localhost")
-
-        for item in self.latest_scan_results:
-            ip = item.get("ip")
-            # 主机扫描模式，判断是否是 "UP"
-            if item.get("status") == "UP":
-                G.add_node(ip)
-                G.add_edge("localhost", ip)
-            # 端口扫描模式，判断是否有开放端口
-            elif "open_ports" in item and item["open_ports"]:
-                G.add_node(ip)
-                G.add_edge("localhost", ip)
-
-        pos = nx.spring_layout(G)
-        nx.draw(
-            G, pos, ax=ax,
-            with_labels=True,
-            node_color="skyblue",
-            edge_color="gray",
-            node_size=1200,
-            font_size=10
-        )
-        self.topology_canvas.draw()
+    def draw_topology_graph(self, immediate=True):
+        """把在线主机（主机扫描在线或端口扫描有开放端口）交给拓扑图，结果未变时不重新布局"""
+        self.topology_view.set_hosts((item["ip"] for item in self.live_hosts() if item.get("ip")),
+                                     immediate=immediate)
 
     def create_new_window(self):
         new_win = MainWindow()
@@ -324,149 +374,370 @@ class MainWindow(QMainWindow):
     def on_scan_clicked(self):
         target = self.target_input.text().strip()
         profile = self.profile_box.currentText()
+        timing = self.timing_box.currentData()
 
         if not target:
             self.output_tabs["Nmap Output"].append("❗ 请先输入要扫描的目标地址。")
             return
 
-        self.command_line.setText(f"正在扫描：{target}，配置：{profile}")
+        self.command_line.setText(f"正在扫描：{target}，配置：{profile}，时序：-{timing}")
         self.output_tabs["Nmap Output"].append(f"📡 正在扫描目标：{target}，配置：{profile}")
 
         if profile == "主机扫描":
-            self.thread = ScanThread(target, scan_type="host")
-            self.thread.result_signal.connect(self.display_ping_results)
-            self.thread.result_signal.connect(partial(self.on_scan_finished, scan_type="host"))
+            self.thread = ScanThread(target, scan_type="host", timing=timing)
+            result_type = "host"
         elif profile == "端口扫描":
-            self.thread = ScanThread(target, scan_type="port")
-            self.thread.result_signal.connect(self.display_port_results)
-            self.thread.result_signal.connect(partial(self.on_scan_finished, scan_type="port"))
+            proceed, checkpoint = self.claim_checkpoint()
+            if not proceed:
+                return
+            self.thread = ScanThread(target, scan_type="port", timing=timing, checkpoint=checkpoint)
+            result_type = "port"
+        elif profile == "增量扫描":
+            # 按历史状态复查已知主机，其余地址轮换扫描，只输出和保存变化
+            self.thread = ScanThread(target, scan_type="incremental", timing=timing)
+            result_type = "port"
+        elif profile == "多进程扫描":
+            # 与端口扫描相同，目标分给多个进程并行扫描
+            self.thread = ScanThread(target, scan_type="sharded", timing=timing)
+            result_type = "port"
+        elif profile == "流水线扫描":
+            # 发现 → 端口 → 服务 → 操作系统，结果中带有服务和系统信息
+            self.thread = ScanThread(target, scan_type="pipeline", timing=timing)
+            result_type = "port"
         else:
-            self.thread = ScanThread(target, scan_type="quick", scan_ports="80,443")
-            self.thread.result_signal.connect(self.display_port_results)
-            self.thread.result_signal.connect(partial(self.on_scan_finished, scan_type="port"))
+            self.thread = ScanThread(target, scan_type="quick", scan_ports="80,443", timing=timing)
+            result_type = "port"
+
+        self.start_scan_thread(result_type)
 
+    def start_scan_thread(self, result_type):
+        get_registry().reset()
+        self.thread.profile = self.metrics_panel.take_profile()
+        self.latest_scan_results = []
+        self.result_table.clear()
+        self.scan_started = time.time()
+        self.progress_bar.setValue(0)
+        self.progress_label.setText("准备中…")
+        self.scan_button.setEnabled(False)
+        self.resume_button.setEnabled(False)
+        self.thread.partial_signal.connect(partial(self.on_partial_results, scan_type=result_type))
+        self.thread.progress_signal.connect(self.update_progress)
+        self.thread.result_signal.connect(partial(self.on_scan_finished, scan_type=result_type))
         self.thread.start()
 
+    def refresh_resume_button(self):
+        info = read_checkpoint_info()
+        self.resume_button.setEnabled(info is not None)
+        if info is None:
+            self.resume_button.setToolTip("没有可恢复的扫描")
+            return
+        updated = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(info["updated"]))
+        self.resume_button.setToolTip(f"{info['target']}：已完成 {info['scanned']}/{info['total']} 台主机，"
+                                      f"{info['open_hosts']} 台有开放端口，保存于 {updated}")
+
+    def claim_checkpoint(self):
+        """
+        完整端口扫描开始前占用断点文件，返回 (是否继续扫描, 断点路径)。
+        另一个窗口正在使用断点时本次不保存断点（路径为 None）；
+        已有未完成的扫描时先询问是否覆盖它的断点。
+        """
+        global _checkpoint_owner
+        if _checkpoint_owner is not None and _checkpoint_owner is not self:
+            self.output_tabs["Nmap Output"].append("⚠️ 另一个窗口正在使用扫描断点，本次扫描不保存断点。")
+            return True, None
+        info = read_checkpoint_info()
+        if info is not None:
+            answer = QMessageBox.question(
+                self, "覆盖未完成的扫描",
+                f"上次对 {info['target']} 的扫描尚未完成（{info['scanned']}/{info['total']} 台主机）。\n"
+                f"开始新的端口扫描会覆盖它的断点，之后无法再继续。是否继续？",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if answer != QMessageBox.Yes:
+                return False, None
+        _checkpoint_owner = self
+        return True, default_checkpoint_path()
+
+    def release_checkpoint(self):
+        global _checkpoint_owner
+        if _checkpoint_owner is self:
+            _checkpoint_owner = None
+
+    def on_resume_clicked(self):
+        global _checkpoint_owner
+        if _checkpoint_owner is not None and _checkpoint_owner is not self:
+            self.output_tabs["Nmap Output"].append("❗ 另一个窗口正在使用扫描断点，请等待其扫描结束后再继续。")
+            return
+        info = read_checkpoint_info()
+        if info is None:
+            self.output_tabs["Nmap Output"].append("❗ 没有可恢复的扫描。")
+            self.refresh_resume_button()
+            return
+        timing = self.timing_box.currentData()
+        self.target_input.setText(info["target"])
+        self.command_line.setText(f"正在恢复扫描：{info['target']}，时序：-{timing}")
+        self.output_tabs["Nmap Output"].append(
+            f"📡 恢复扫描目标：{info['target']}，已完成 {info['scanned']}/{info['total']} 台主机")
+        _checkpoint_owner = self
+        self.thread = ScanThread(info["target"], scan_type="resume", timing=timing)
+        self.start_scan_thread("port")
+
+    def on_partial_results(self, batch, scan_type):
+        """扫描过程中按批次（约 100ms 一批）追加结果，避免逐条刷新界面"""
+        with _GUI_BATCH_SECONDS.time():
+            self._append_partial_results(batch, scan_type)
+
+    def _append_partial_results(self, batch, scan_type):
+        for item in batch:
+            item["scan_type"] = scan_type
+        self.latest_scan_results.extend(batch)
+        self.result_table.append_results(batch)
+        if self.tab_widget.tabText(self.tab_widget.currentIndex()) == "拓扑结构":
+            # 拓扑图会合并短时间内的多次更新
+            self.draw_topology_graph(immediate=False)
+
+        if scan_type == "host":
+            self.display_ping_results(batch)
+        else:
+            self.display_port_results(batch)
+
+    def update_progress(self, done, total, eta):
+        if not total:
+            return
+        self.progress_bar.setValue(int(1000 * min(done, total) / total))
+        text = f"{done}/{total} 探测"
+        if eta is not None:
+            minutes, seconds = divmod(int(eta), 60)
+            hours, minutes = divmod(minutes, 60)
+            text += f" · 预计剩余 {hours:d}:{minutes:02d}:{seconds:02d}"
+        self.progress_label.setText(text)
+
     def on_scan_finished(self, results, scan_type):
     # 标记每条记录的扫描类型
         for item in results:
             item["scan_type"] = scan_type
 
         self.latest_scan_results = results
-        self.handle_scan_result(results)
+        self.progress_bar.setValue(1000)
+        self.scan_button.setEnabled(True)
+        self.release_checkpoint()
+        self.refresh_resume_button()
+        if self.thread.error:
+            self.progress_label.setText("扫描失败")
+            self.output_tabs["Nmap Output"].append(f"❗ 扫描失败：{self.thread.error}")
+            return
+        self.progress_label.setText("扫描完成")
+        if self.tab_widget.tabText(self.tab_widget.currentIndex()) == "拓扑结构":
+            self.draw_topology_graph()
+        if self.thread.diff is not None:
+            # 增量扫描的变化已由 IncrementalScan 写入历史
+            self.display_scan_diff(self.thread.diff)
+        else:
+            self.handle_scan_result(results, target=self.thread.target, ports=self.thread.ports)
 
-        # 分类型展示
+        # 结果已在扫描过程中逐批展示，这里只输出汇总
         if scan_type == "host":
-            self.display_ping_results(results)
-        elif scan_type == "port":
-            self.display_port_results(results)
-        elif scan_type == "service":
-            self.display_service_results(results)
+            alive = sum(1 for item in results if item.get("status") == "UP")
+        else:
+            alive = sum(1 for item in results if item.get("open_ports"))
+        self.output_tabs["Nmap Output"].append(f"✅ 扫描完成：共 {len(results)} 台主机，{alive} 台在线\n")
+
+    def display_scan_diff(self, diff):
+        lines = [f"📊 与上次相比（复查 {diff['checked']} 台已知主机，轮换扫描 {diff['swept']} 个地址）："]
+        for host in diff["new_hosts"]:
+            lines.append(f"  ➕ 新主机 {host['ip']}，开放端口: {', '.join(map(str, host['open_ports']))}")
+        for ip in diff["lost_hosts"]:
+            lines.append(f"  ➖ 主机离线 {ip}")
+        for ip, ports in diff["opened"].items():
+            lines.append(f"  🟢 {ip} 新开放端口: {', '.join(map(str, ports))}")
+        for ip, ports in diff["closed"].items():
+            lines.append(f"  🔴 {ip} 端口已关闭: {', '.join(map(str, ports))}")
+        if len(lines) == 1:
+            lines.append("  无变化")
+        self.output_tabs["Nmap Output"].append("\n".join(lines))
 
     def display_ping_results(self, results):
-        self.latest_scan_results = results
-        self.output_tabs["Nmap Output"].append("✅ 扫描完成，结果如下：\n")
+        lines = []
         for item in results:
             if item['status'] == 'UP':
                 line = f"{item['ip']} - 🟢在线"
                 if item.get("hostname"):
                     line += f" ({item['hostname']})"
-                self.output_tabs["Nmap Output"].append(line)
+                lines.append(line)
+        if lines:
+            self.output_tabs["Nmap Output"].append("\n".join(lines))
 
     def display_port_results(self, results):
-        self.latest_scan_results = results
-        self.output_tabs["Nmap Output"].append("✅ 扫描完成，结果如下：\n")
+        # 完整结果在“端口与服务”表格中，这里只记录有开放端口的主机
+        lines = []
         for item in results:
-            if "open_ports" in item and item["open_ports"]:
-                line = f"{item['ip']} - 🟢在线, 开放端口: {', '.join(map(str, item['open_ports']))}"
-            else:
-                line = f"{item['ip']} - 🔴离线 或 无开放端口"
+            if not item.get("open_ports"):
+                continue
+            line = f"{item['ip']} - 🟢在线, 开放端口: {', '.join(map(str, item['open_ports']))}"
             if item.get("hostname"):
                 line += f" ({item['hostname']})"
-            self.output_tabs["Nmap Output"].append(line)
-    # 展示端口与服务的结果
-    def display_service_results(self, results):
-        self.latest_scan_results = results
-        self.output_tabs["Ports / Hosts"].clear()
-        self.output_tabs["Ports / Hosts"].append("✅ 扫描完成，结果如下：\n")
+            if item.get("os"):
+                line += f" | 操作系统: {item['os']}"
+            lines.append(line)
+        if lines:
+            self.output_tabs["Nmap Output"].append("\n".join(lines))
+    def live_hosts(self):
+        """需要识别操作系统的主机：主机扫描在线，或端口扫描有开放端口"""
+        for item in self.latest_scan_results:
+            if item.get("status") == "UP" or item.get("open_ports"):
+                yield item
 
-        # 遍历每个扫描结果
-        for item in results:
+    def show_host_details(self):
+        """先显示已知结果，其余主机交给后台识别服务，不阻塞界面"""
+        missing = []
+        for item in self.live_hosts():
             ip = item.get("ip", "未知IP")
-            open_ports = item.get("open_ports", [])
-
-            if open_ports:
-                self.output_tabs["Ports / Hosts"].append(f"🔹 {ip} - 开放端口与服务：")
-                
-                # 如果 open_ports 只是端口号列表，则直接迭代端口号
-                for port in open_ports:
-                    # 使用 guess_service 函数获取服务名称
-                    service = guess_service(port)
-                    
-                    # 更加可视化地输出端口和服务对应关系
-                    line = f"    🌐 端口 {port} → {service}"
-                    self.output_tabs["Ports / Hosts"].append(line)
-                
-                self.output_tabs["Ports / Hosts"].append("")  # 空行分隔不同的IP
+            if item.get("os"):
+                self.host_os[ip] = item["os"]
+            elif self.host_os.get(ip) in (None, ERROR_OS):
+                missing.append(ip)
+        if missing:
+            cached = self.os_service.submit(missing, self.os_result_signal.emit)
+            self.host_os.update(cached)
+            for ip, os_result in cached.items():
+                self.result_table.set_os(ip, os_result)
+        self.render_host_details()
+
+    def on_os_result(self, ip, os_result):
+        self.host_os[ip] = os_result
+        if os_result != ERROR_OS:
+            self.result_table.set_os(ip, os_result)
+        if self.tab_widget.tabText(self.tab_widget.currentIndex()) == "主机详情" \
+                and not self._host_details_timer.isActive():
+            self._host_details_timer.start()
+
+    def render_host_details(self):
+        self.output_tabs["Host Details"].clear()
+        if not self.latest_scan_results:
+            self.output_tabs["Host Details"].setText('<span style="color:gray;">尚无扫描结果。</span>')
+            return
+
+        lines = []
+        for item in self.live_hosts():
+            ip = item.get("ip", "未知IP")
+            os_result = self.host_os.get(ip)
+            if os_result is None:
+                line = (
+                    f"<span style='color:gray;'>⏳</span> "
+                    f"<b>{ip}</b> - <span style='color:gray;'>正在识别操作系统…</span><br><br>"
+                )
+            elif os_result == ERROR_OS:
+                line = (
+                    f"<span style='color:#f39c12;'>🟡</span> "
+                    f"<b>{ip}</b> - <span style='color:#e74c3c;'>操作系统识别失败</span><br><br>"
+                )
+            else:
+                line = (
+                    f"<span style='color:#27ae60;'>🟢</span> "
+                    f"<b>{ip}</b> - <span style='color:#2980b9;'>识别到操作系统：</span> "
+                    f"<span style='color:#27ae60; font-weight:bold;'>{os_result}</span><br><br>"
+                )
+            lines.append(line)
+        if lines:
+            self.output_tabs["Host Details"].append("".join(lines))
 
     def on_tab_changed(self, index):
-        line = ""
         tab_name = self.tab_widget.tabText(index)
         if tab_name == "主机详情":
-            self.output_tabs["Host Details"].clear()
-            if not self.latest_scan_results:
-                self.output_tabs["Host Details"].setText('<span style="color:gray;">尚无扫描结果。</span>')
-                return
-
-            for item in self.latest_scan_results:
-                ip = item.get("ip", "未知IP")
-                show_os = False
-
-                # 主机扫描结果
-                if item.get("status") == "UP":
-                    show_os = True
-                # 端口扫描结果，且有开放端口
-                elif "open_ports" in item and item["open_ports"]:
-                    show_os = True
-
-                if show_os:
-                    try:
-                        os_result = os_fingerprint(ip)
-                        line = (
-                            f"<span style='color:#27ae60;'>🟢</span> "
-                            f"<b>{ip}</b> - <span style='color:#2980b9;'>识别到操作系统：</span> "
-                            f"<span style='color:#27ae60; font-weight:bold;'>{os_result}</span><br><br>"
-                        )
-                    except Exception as e:
-                        line = (
-                            f"<span style='color:#f39c12;'>🟡</span> "
-                            f"<b>{ip}</b> - <span style='color:#e74c3c;'>操作系统识别失败：</span> "
-                            f"<span style='color:gray;'>{str(e)}</span><br><br>"
-                        )
-                    self.output_tabs["Host Details"].append(line)
+            self.show_host_details()
         elif tab_name == "拓扑结构":
             self.draw_topology_graph()
-        elif tab_name == "端口与服务":
-            self.display_service_results(self.latest_scan_results)
         elif tab_name == "扫描历史":
             self.display_scan_history() 
 
 
+_GUI_BATCH_SECONDS = metrics.STAGE_SECONDS.labels("gui_batch")
+
+
 class ScanThread(QThread):
     result_signal = pyqtSignal(list)
+    # 扫描过程中合并后的部分结果批次
+    partial_signal = pyqtSignal(list)
+    # (已完成探测数, 总探测数, 预计剩余秒数)，数值可能超过 32 位整数，用 object 传递
+    progress_signal = pyqtSignal(object, object, object)
+
+    FLUSH_INTERVAL_MS = 100
+    PORTS = list(range(1, 1025))   # 端口扫描、多进程扫描和流水线扫描的端口
 
-    def __init__(self, target, scan_type="port", scan_ports=None):
+    def __init__(self, target, scan_type="port", scan_ports=None, timing=None, checkpoint=None):
         super().__init__()
         self.target = target
         self.scan_type = scan_type
         self.scan_ports = scan_ports
+        self.timing = timing
+        # 断点文件：只有完整端口扫描保存断点（快速扫描等不覆盖可恢复的扫描）
+        self.checkpoint = checkpoint
+        # 本次扫描检查的端口，写入历史时主机状态只按这些端口更新
+        self.ports = None
+        self.results = []
+        self.error = None
+        self.diff = None
+        self.progress = ScanProgress()
+        self.profile = None  # 剖析方式（cprofile / sample），由性能指标标签页设置
+        # 扫描线程只往队列里追加结果，由主线程的定时器按批次取出并发送信号
+        self._pending = deque()
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setInterval(self.FLUSH_INTERVAL_MS)
+        self._flush_timer.timeout.connect(self.flush)
+        # 等待界面取走的结果数：持续增长说明界面刷新跟不上扫描
+        metrics.QUEUE_DEPTH.labels("gui").set_function(self._pending.__len__)
+        self.started.connect(self._flush_timer.start)
+        self.finished.connect(self._on_finished)
+
+    def flush(self):
+        batch = []
+        while self._pending:
+            batch.append(self._pending.popleft())
+        if batch:
+            self.partial_signal.emit(batch)
+        self.progress_signal.emit(self.progress.done, self.progress.total, self.progress.eta())
+
+    def _on_finished(self):
+        self._flush_timer.stop()
+        self.flush()
+        self.result_signal.emit(self.results)
 
     def run(self):
-        if self.scan_type == "host":
-            results = scan_subnet(self.target)
-        elif self.scan_type == "port":
-            results = scan_port(self.target)
-        elif self.scan_type == "quick":
-            ports = [80, 443]
-            results = scan_port(self.target, ports=ports)
-        self.result_signal.emit(results)
+        if self.profile:
+            with ScanProfiler(self.profile):
+                self._run()
+        else:
+            self._run()
+
+    def _run(self):
+        options = {"on_result": self._pending.append, "progress": self.progress, "timing": self.timing}
+        try:
+            if self.scan_type == "host":
+                results = scan_subnet(self.target, **options)
+            elif self.scan_type == "port":
+                self.ports = self.PORTS
+                results = scan_port(self.target, ports=self.ports, checkpoint=self.checkpoint, **options)
+            elif self.scan_type == "quick":
+                self.ports = [80, 443]
+                results = scan_port(self.target, ports=self.ports, **options)
+            elif self.scan_type == "resume":
+                self.ports = ScanCheckpoint.load(default_checkpoint_path()).ports
+                results = resume_scan(**options)
+            elif self.scan_type == "sharded":
+                # 目标分给与 CPU 核数相同的进程并行扫描，不保存断点
+                self.ports = self.PORTS
+                results = sharded_scan_port(self.target, ports=self.ports, **options)
+            elif self.scan_type == "pipeline":
+                self.ports = self.PORTS
+                results = pipeline_scan(self.target, ports=self.ports, **options)
+            elif self.scan_type == "incremental":
+                scanner = IncrementalScan(**options)
+                self.diff = scanner.run(self.target)
+                results = scanner.results
+        except (ValueError, OSError) as e:
+            self.error = str(e)
+            return
+        except Exception as e:
+            # 线程边界：其他异常（如 sqlite3.Error）也要交给界面显示，不能让线程悄悄结束
+            self.error = f"{type(e).__name__}: {e}"
+            return
+        self.results = results
@@ -0,0 +1,127 @@
+"""
+性能指标标签页：定时读取 core.metrics 的注册表，显示扫描过程中的计数器、仪表和各阶段耗时。
+
+只在标签页可见时刷新（每秒一次），不影响扫描时界面的其余部分。
+可把当前指标导出为 Prometheus 文本或 JSON 文件，并可勾选对下一次扫描做性能剖析。
+"""
+import os
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import (
+    QCheckBox, QComboBox, QFileDialog, QHBoxLayout, QHeaderView, QLabel, QPushButton, QTableWidget,
+    QTableWidgetItem, QVBoxLayout, QWidget,
+)
+
+from core.metrics import get_registry
+
+REFRESH_INTERVAL_MS = 1000
+COLUMNS = ["指标", "标签", "数值"]
+PROFILE_MODES = [("cProfile（扫描线程）", "cprofile"), ("调用栈采样（所有线程）", "sample")]
+
+
+def _format_seconds(value) -> str:
+    if value is None:
+        return "-"
+    return f"{value * 1000:.1f}ms" if value < 1 else f"{value:.2f}s"
+
+
+def metric_rows(snapshot: dict):
+    """把注册表快照展开成 (指标, 标签, 数值) 行；直方图显示次数、平均值和估算的分位数"""
+    rows = []
+    for name, metric in snapshot["metrics"].items():
+        for value in metric["values"]:
+            labels = ", ".join(f"{key}={label}" for key, label in value["labels"].items())
+            if metric["type"] == "histogram":
+                if not value["count"]:
+                    continue
+                average = value["sum"] / value["count"]
+                text = (f"{value['count']} 次 · 平均 {_format_seconds(average)} · "
+                        f"p50 ≤{_format_seconds(value['p50'])} · p95 ≤{_format_seconds(value['p95'])}")
+            else:
+                if not value["value"] and metric["type"] == "counter":
+                    continue  # 本次扫描未用到的引擎不显示
+                text = f"{value['value']:g}"
+            rows.append((name, labels, text))
+    return rows
+
+
+class MetricsPanel(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.registry = get_registry()
+
+        toolbar = QHBoxLayout()
+        self.summary = QLabel("")
+        toolbar.addWidget(self.summary)
+        toolbar.addStretch()
+        self.profile_check = QCheckBox("剖析下一次扫描")
+        toolbar.addWidget(self.profile_check)
+        self.profile_mode = QComboBox()
+        for label, mode in PROFILE_MODES:
+            self.profile_mode.addItem(label, mode)
+        toolbar.addWidget(self.profile_mode)
+        export_prometheus = QPushButton("导出 Prometheus")
+        export_prometheus.clicked.connect(lambda: self.export("Prometheus 文本 (*.prom *.txt)", ".prom"))
+        toolbar.addWidget(export_prometheus)
+        export_json = QPushButton("导出 JSON")
+        export_json.clicked.connect(lambda: self.export("JSON (*.json)", ".json"))
+        toolbar.addWidget(export_json)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setStretchLastSection(True)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(toolbar)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(REFRESH_INTERVAL_MS)
+        self._timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.refresh()
+        self._timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self._timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        snapshot = self.registry.snapshot()
+        rows = metric_rows(snapshot)
+        self.table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, text in enumerate(values):
+                item = self.table.item(row, column)
+                if item is None:
+                    self.table.setItem(row, column, QTableWidgetItem(text))
+                elif item.text() != text:
+                    item.setText(text)
+        self.summary.setText(f"自本次扫描开始 {snapshot['collected'] - snapshot['started']:.0f} 秒")
+
+    def take_profile(self):
+        """勾选了剖析时返回剖析方式（cprofile / sample）并取消勾选，只剖析下一次扫描；否则返回 None"""
+        if not self.profile_check.isChecked():
+            return None
+        self.profile_check.setChecked(False)
+        return self.profile_mode.currentData()
+
+    def export(self, file_filter: str, suffix: str):
+        path, _ = QFileDialog.getSaveFileName(self, "导出扫描指标", "scan-metrics" + suffix, file_filter)
+        if not path:
+            return
+        if not os.path.splitext(path)[1]:
+            path += suffix  # 格式按扩展名决定，与命令行的 --metrics 相同
+        try:
+            self.registry.write(path)
+        except OSError as e:
+            self.summary.setText(f"❗ 导出失败：{e}")
+            return
+        self.summary.setText(f"✅ 已导出到 {path}")
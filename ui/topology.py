@@ -0,0 +1,323 @@
+"""
+拓扑结构标签页：按子网聚合的星形拓扑，布局在后台线程计算并缓存。
+
+- 在线主机按 /24 子网聚合成簇（簇过多时再按 /16 聚合），点击簇可以逐级展开；
+  子网内存在 .1 / .254 主机时视为网关，展开后主机连到网关上。
+- 布局是解析式的（簇在圆周上均匀分布，簇内主机按葵花籽螺旋排列），计算量与节点数成线性，
+  同样数量的节点位置只算一次；整个布局按 (展开的子网, 主机集合) 缓存，结果没有变化时直接复用。
+- 绘制使用 matplotlib 的 LineCollection 和一次 scatter，节点多时只标注簇名，不为每个节点创建文字。
+matplotlib 在第一次绘制时才导入。
+"""
+import ipaddress
+import math
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QHBoxLayout, QLabel, QPushButton, QVBoxLayout, QWidget
+
+CLUSTER_PREFIX = 24
+SUPER_PREFIX = 16
+MAX_CLUSTERS = 64      # 顶层最多显示的簇数，超过时改按 SUPER_PREFIX 聚合
+MAX_LABELS = 150       # 节点数不超过该值时为每个节点标注文字
+LAYOUT_CACHE_SIZE = 32
+GATEWAY_SUFFIXES = (1, 254)
+ROOT_LABEL = "localhost"   # 画布上的文字只用 ASCII，matplotlib 默认字体没有中文字形
+
+NODE_COLORS = {"root": "#e67e22", "gateway": "#8e44ad", "cluster": "#2e86de", "host": "#7fb3d5"}
+
+
+class TopologyLayout(NamedTuple):
+    focus: Optional[str]             # 展开的子网，None 表示顶层
+    title: str
+    xs: List[float]
+    ys: List[float]
+    labels: List[str]
+    kinds: List[str]                 # root / gateway / cluster / host
+    sizes: List[float]
+    targets: List[Optional[str]]     # 点击节点后展开的子网，不可展开时为 None
+    edges: List[Tuple[Tuple[float, float], Tuple[float, float]]]
+
+
+def cluster_hosts(hosts: Iterable[str], prefix: int) -> Dict[str, List[str]]:
+    """按前缀长度把主机分组：{"10.0.1.0/24": [ip, ...]}，组和组内主机都按地址排序"""
+    groups: Dict[str, List[Tuple[int, str]]] = {}
+    mask = (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
+    for ip in hosts:
+        value = int(ipaddress.IPv4Address(ip))
+        network = f"{ipaddress.IPv4Address(value & mask)}/{prefix}"
+        groups.setdefault(network, []).append((value, ip))
+    return {network: [ip for _, ip in sorted(members)]
+            for network, members in sorted(groups.items(), key=lambda item: item[1][0][0] >> (32 - prefix))}
+
+
+@lru_cache(maxsize=256)
+def ring_positions(count: int, radius: float = 1.0) -> Tuple[Tuple[float, float], ...]:
+    """count 个点均匀分布在圆周上"""
+    return tuple((radius * math.cos(2 * math.pi * i / count), radius * math.sin(2 * math.pi * i / count))
+                 for i in range(count))
+
+
+@lru_cache(maxsize=256)
+def spiral_positions(count: int, radius: float = 1.0) -> Tuple[Tuple[float, float], ...]:
+    """葵花籽螺旋：count 个点大致均匀地铺满半径为 radius 的圆盘，不需要迭代求解"""
+    golden = math.pi * (3 - math.sqrt(5))
+    return tuple((radius * math.sqrt((i + 0.5) / count) * math.cos(i * golden),
+                  radius * math.sqrt((i + 0.5) / count) * math.sin(i * golden)) for i in range(count))
+
+
+def _member_positions(count: int):
+    return ring_positions(count) if count <= 24 else spiral_positions(count)
+
+
+def _gateway(members: List[str]) -> Optional[str]:
+    for suffix in GATEWAY_SUFFIXES:
+        for ip in members:
+            if int(ip.rsplit(".", 1)[1]) == suffix:
+                return ip
+    return None
+
+
+def compute_layout(hosts: Iterable[str], focus: Optional[str] = None) -> TopologyLayout:
+    """
+    计算拓扑布局。focus 为 None 时显示顶层（本机 → 各子网簇），否则显示该子网内的主机或下一级子网。
+    只有一个簇时直接展开。
+    """
+    hosts = list(hosts)
+    if focus is not None:
+        network = ipaddress.IPv4Network(focus)
+        hosts = [ip for ip in hosts if ipaddress.IPv4Address(ip) in network]
+
+    if focus is None:
+        groups = cluster_hosts(hosts, CLUSTER_PREFIX)
+        if len(groups) > MAX_CLUSTERS:
+            groups = cluster_hosts(hosts, SUPER_PREFIX)
+        if len(groups) == 1:
+            return compute_layout(hosts, next(iter(groups)))
+        return _cluster_layout(None, f"{len(hosts)} 台在线主机 · {len(groups)} 个子网", ROOT_LABEL, groups)
+
+    if ipaddress.IPv4Network(focus).prefixlen < CLUSTER_PREFIX:
+        groups = cluster_hosts(hosts, CLUSTER_PREFIX)
+        if len(groups) > 1:
+            return _cluster_layout(focus, f"{focus} · {len(hosts)} 台在线主机 · {len(groups)} 个子网", focus, groups)
+
+    # 子网内的主机：有网关时主机连到网关，否则连到子网节点
+    gateway = _gateway(hosts)
+    members = [ip for ip in hosts if ip != gateway]
+    center_label, center_kind = (gateway, "gateway") if gateway else (focus, "cluster")
+    xs, ys, labels, kinds, sizes, targets, edges = [0.0], [0.0], [center_label], [center_kind], [300.0], [None], []
+    for ip, (x, y) in zip(members, _member_positions(len(members))):
+        xs.append(x)
+        ys.append(y)
+        labels.append(ip)
+        kinds.append("host")
+        sizes.append(40.0 if len(members) > MAX_LABELS else 120.0)
+        targets.append(None)
+        edges.append(((0.0, 0.0), (x, y)))
+    title = f"{focus} · {len(hosts)} 台在线主机" + (f" · 网关 {gateway}" if gateway else "")
+    return TopologyLayout(focus, title, xs, ys, labels, kinds, sizes, targets, edges)
+
+
+def _cluster_layout(focus, title, center_label, groups: Dict[str, List[str]]) -> TopologyLayout:
+    xs, ys, labels, kinds, sizes, targets, edges = [0.0], [0.0], [center_label], ["root"], [400.0], [None], []
+    for (network, members), (x, y) in zip(groups.items(), ring_positions(len(groups))):
+        gateway = _gateway(members) if network.endswith(f"/{CLUSTER_PREFIX}") else None
+        xs.append(x)
+        ys.append(y)
+        labels.append(f"{network}\n{len(members)} hosts" + (f", gw {gateway}" if gateway else ""))
+        kinds.append("cluster")
+        sizes.append(150.0 + 60.0 * math.sqrt(len(members)))
+        targets.append(network)
+        edges.append(((0.0, 0.0), (x, y)))
+    return TopologyLayout(focus, title, xs, ys, labels, kinds, sizes, targets, edges)
+
+
+class LayoutCache:
+    """按 (展开的子网, 主机集合) 缓存布局，容量有上限"""
+
+    def __init__(self, max_size: int = LAYOUT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple, TopologyLayout]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(hosts: frozenset, focus: Optional[str]) -> tuple:
+        # 直接用主机集合做键：只用哈希值时，不同的集合可能碰撞而取到别的布局
+        return focus, hosts
+
+    def get(self, key) -> Optional[TopologyLayout]:
+        with self._lock:
+            layout = self._entries.get(key)
+            if layout is not None:
+                self._entries.move_to_end(key)
+            return layout
+
+    def put(self, key, layout: TopologyLayout):
+        with self._lock:
+            self._entries[key] = layout
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class LayoutThread(QThread):
+    """在后台线程计算一个布局，完成后通过 done 信号交回主线程"""
+
+    done = pyqtSignal(object, object)   # (缓存键, TopologyLayout)
+
+    def __init__(self, hosts: frozenset, focus: Optional[str], key, parent=None):
+        super().__init__(parent)
+        self.hosts = hosts
+        self.focus = focus
+        self.key = key
+
+    def run(self):
+        layout = compute_layout(self.hosts, self.focus)
+        if not self.isInterruptionRequested():
+            self.done.emit(self.key, layout)
+
+
+class TopologyView(QWidget):
+    """拓扑图控件：set_hosts 更新在线主机（合并 500ms 内的多次更新），点击簇展开，返回按钮回到上一级"""
+
+    UPDATE_DELAY_MS = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cache = LayoutCache()
+        self.hosts: frozenset = frozenset()
+        self._focus_stack: List[Optional[str]] = [None]
+        self._thread: Optional[LayoutThread] = None
+        self._pending = False
+        self._shown_key = None
+        self._layout: Optional[TopologyLayout] = None
+        self.figure = None
+        self.canvas = None
+
+        self.back_button = QPushButton("返回上一级")
+        self.back_button.clicked.connect(self.go_back)
+        self.back_button.setEnabled(False)
+        self.status_label = QLabel("尚无扫描结果")
+        header = QHBoxLayout()
+        header.addWidget(self.back_button)
+        header.addWidget(self.status_label, 1)
+        self._layout_box = QVBoxLayout()
+        self._layout_box.addLayout(header)
+        self.setLayout(self._layout_box)
+
+        self._update_timer = QTimer(self)
+        self._update_timer.setSingleShot(True)
+        self._update_timer.setInterval(self.UPDATE_DELAY_MS)
+        self._update_timer.timeout.connect(self.refresh)
+
+    @property
+    def focus(self) -> Optional[str]:
+        return self._focus_stack[-1]
+
+    def set_hosts(self, hosts: Iterable[str], immediate: bool = False):
+        hosts = frozenset(hosts)
+        if hosts == self.hosts and self._shown_key is not None:
+            return
+        if not hosts >= self.hosts:
+            # 新的一次扫描：回到顶层
+            self._focus_stack = [None]
+        self.hosts = hosts
+        if immediate:
+            self.refresh()
+        elif not self._update_timer.isActive():
+            self._update_timer.start()
+
+    def drill(self, network: str):
+        self._focus_stack.append(network)
+        self.refresh()
+
+    def go_back(self):
+        if len(self._focus_stack) > 1:
+            self._focus_stack.pop()
+            self.refresh()
+
+    def refresh(self):
+        """缓存命中时直接绘制，否则交给后台线程；计算中又有更新时，完成后再算一次最新的"""
+        key = LayoutCache.key(self.hosts, self.focus)
+        if key == self._shown_key:
+            return
+        layout = self.cache.get(key)
+        if layout is not None:
+            self._draw(key, layout)
+            return
+        if self._thread is not None and self._thread.isRunning():
+            self._pending = True
+            return
+        self.status_label.setText("正在计算布局…")
+        self._thread = LayoutThread(self.hosts, self.focus, key, self)
+        self._thread.done.connect(self._on_layout)
+        self._thread.finished.connect(self._on_thread_finished)
+        # 线程对象持有一份主机集合，结束后释放，避免流式扫描时每次刷新都留下一个线程对象
+        self._thread.finished.connect(self._thread.deleteLater)
+        self._thread.start()
+
+    def _on_layout(self, key, layout: TopologyLayout):
+        self.cache.put(key, layout)
+        if key == LayoutCache.key(self.hosts, self.focus):
+            self._draw(key, layout)
+
+    def _on_thread_finished(self):
+        self._thread = None
+        if self._pending:
+            self._pending = False
+            self.refresh()
+
+    def shutdown(self):
+        """窗口关闭时调用：停止合并更新的定时器，等待正在计算的布局线程结束"""
+        self._update_timer.stop()
+        self._pending = False
+        thread, self._thread = self._thread, None
+        if thread is not None and thread.isRunning():
+            thread.requestInterruption()
+            thread.wait()
+
+    def _ensure_canvas(self):
+        if self.canvas is not None:
+            return
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+
+        self.figure = Figure()
+        self.canvas = FigureCanvas(self.figure)
+        self.canvas.mpl_connect("pick_event", self._on_pick)
+        self._layout_box.addWidget(self.canvas, 1)
+
+    def _draw(self, key, layout: TopologyLayout):
+        from matplotlib.collections import LineCollection
+
+        self._ensure_canvas()
+        self._shown_key = key
+        self._layout = layout
+        self.back_button.setEnabled(len(self._focus_stack) > 1)
+        self.status_label.setText(layout.title if self.hosts else "尚无在线主机")
+
+        self.figure.clear()
+        ax = self.figure.add_subplot(111)
+        ax.set_axis_off()
+        ax.set_aspect("equal")
+        if layout.edges:
+            ax.add_collection(LineCollection(layout.edges, colors="#bbbbbb", linewidths=0.6, zorder=1))
+        ax.scatter(layout.xs, layout.ys, s=layout.sizes, c=[NODE_COLORS[kind] for kind in layout.kinds],
+                   edgecolors="white", linewidths=0.5, zorder=2, picker=True)
+        label_all = len(layout.xs) <= MAX_LABELS
+        for x, y, label, kind in zip(layout.xs, layout.ys, layout.labels, layout.kinds):
+            if label_all or kind != "host":
+                ax.annotate(label, (x, y), xytext=(0, -14), textcoords="offset points", ha="center",
+                            va="top", fontsize=8 if kind == "host" else 9, zorder=3)
+        ax.set_xlim(-1.25, 1.25)
+        ax.set_ylim(-1.25, 1.25)
+        self.canvas.draw_idle()
+
+    def _on_pick(self, event):
+        if self._layout is None or not len(event.ind):
+            return
+        target = self._layout.targets[event.ind[0]]
+        if target is not None:
+            self.drill(target)
@@ -0,0 +1,260 @@
+"""
+自定义控件：基于 QAbstractTableModel 的扫描结果表。
+
+结果按 (主机, 端口) 一行保存在模型的列表中，视图只绘制可见的行；
+扫描过程中的结果批次直接插入模型（已排序时二分查找插入位置），不重建整张表。
+排序和过滤都在模型内对行列表完成，不经过逐格的 data() 调用，也不使用 QSortFilterProxyModel
+（代理模型在每次布局变化时都会对所有行重新调用 Python 的过滤函数）。
+"""
+import bisect
+import ipaddress
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtWidgets import QHBoxLayout, QHeaderView, QLabel, QLineEdit, QTableView, QVBoxLayout, QWidget
+
+from core.service_probe import guess_service
+
+# 行的字段下标
+IP_INT, IP, PORT, SERVICE, OS = range(5)
+
+COLUMNS = ["IP", "端口", "服务", "操作系统"]
+FILTER_FIELDS = {"ip": IP, "port": PORT, "service": SERVICE, "os": OS}
+
+# 各列的排序键：itemgetter 在 C 中取值，排序时不必为每行调用 Python 函数
+_SORT_KEYS = [
+    itemgetter(IP_INT, PORT),
+    itemgetter(PORT, IP_INT),
+    itemgetter(SERVICE, IP_INT, PORT),
+    itemgetter(OS, IP_INT, PORT),
+]
+
+
+def parse_filter(text: str) -> List[tuple]:
+    """
+    "ip:10.0. port:22 ssh" -> [(IP, "10.0."), (PORT, "22"), (None, "ssh")]
+    字段名可为 ip / port / service / os，没有字段名时匹配任意一列；多个条件需同时满足。
+    """
+    conditions = []
+    for token in text.lower().split():
+        field, sep, value = token.partition(":")
+        if sep and field in FILTER_FIELDS:
+            conditions.append((FILTER_FIELDS[field], value))
+        else:
+            conditions.append((None, token))
+    return conditions
+
+
+def row_matches(row: list, conditions: List[tuple]) -> bool:
+    for field, value in conditions:
+        if field is None:
+            texts = (row[IP], str(row[PORT] or ""), row[SERVICE], row[OS])
+            if not any(value in text.lower() for text in texts):
+                return False
+        elif field == PORT:
+            if str(row[PORT] or "") != value:
+                return False
+        elif value not in row[field].lower():
+            return False
+    return True
+
+
+class ResultTableModel(QAbstractTableModel):
+    """
+    扫描结果表的数据：每行 [ip 整数, ip, 端口, 服务, 操作系统]，主机扫描的在线主机端口为 0，未知的文本列为空串。
+    行列表始终按当前排序列升序保存，降序只在取行时倒过来；过滤结果是同样顺序的子列表。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: List[list] = []
+        self._visible: List[list] = self._rows     # 没有过滤条件时与 _rows 是同一个列表
+        self._hosts: Dict[str, List[list]] = {}    # ip -> 该主机的各行，用于更新操作系统
+        self._conditions: List[tuple] = []
+        self._sort_column: Optional[int] = None
+        self._descending = False
+
+    # ---- Qt 模型接口 ----
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._visible)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return None
+
+    def _row(self, position: int) -> list:
+        return self._visible[-1 - position] if self._descending else self._visible[position]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        row = self._row(index.row())
+        column = index.column()
+        if column == 0:
+            return row[IP]
+        if column == 1:
+            return str(row[PORT]) if row[PORT] else ""
+        return row[SERVICE if column == 2 else OS]
+
+    def _resort(self):
+        key = _SORT_KEYS[self._sort_column]
+        self._rows.sort(key=key)
+        if self._visible is not self._rows:
+            self._visible.sort(key=key)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        if column < 0:
+            # 取消排序：保持当前显示的顺序，之后的结果追加到末尾
+            if self._descending:
+                self._rows.reverse()
+                if self._visible is not self._rows:
+                    self._visible.reverse()
+            self._sort_column, self._descending = None, False
+        else:
+            if column != self._sort_column:
+                self._sort_column = column
+                self._resort()
+            self._descending = order == Qt.DescendingOrder
+        self.layoutChanged.emit()
+
+    def set_filter(self, conditions: List[tuple]):
+        """设置过滤条件（见 parse_filter），只重新筛选行列表，不重建行"""
+        self.beginResetModel()
+        self._conditions = conditions
+        self._visible = [row for row in self._rows if row_matches(row, conditions)] if conditions else self._rows
+        self.endResetModel()
+
+    # ---- 数据更新 ----
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self._visible = [] if self._conditions else self._rows
+        self._hosts.clear()
+        self.endResetModel()
+
+    def append_results(self, results: Iterable[Dict]):
+        """追加一批扫描结果；只收录有开放端口或在线的主机"""
+        rows = []
+        for item in results:
+            ip = item.get("ip")
+            if not ip:
+                continue
+            ip_int = int(ipaddress.IPv4Address(ip))
+            os_name = item.get("os") or (self._hosts[ip][0][OS] if ip in self._hosts else "")
+            services = item.get("services", {})
+            if item.get("open_ports"):
+                rows.extend([ip_int, ip, port, services.get(port) or guess_service(port), os_name]
+                            for port in item["open_ports"])
+            elif item.get("status") == "UP":
+                rows.append([ip_int, ip, 0, "", os_name])
+        for row in rows:
+            self._hosts.setdefault(row[IP], []).append(row)
+
+        filtered = self._visible is not self._rows
+        shown = [row for row in rows if row_matches(row, self._conditions)] if filtered else rows
+        if self._sort_column is None:
+            if filtered:
+                self._rows.extend(rows)
+            if shown:
+                first = len(self._visible)
+                self.beginInsertRows(QModelIndex(), first, first + len(shown) - 1)
+                self._visible.extend(shown)
+                self.endInsertRows()
+            return
+
+        key = _SORT_KEYS[self._sort_column]
+        if filtered:
+            for row in rows:
+                self._rows.insert(bisect.bisect_right(self._rows, key(row), key=key), row)
+        for row in shown:
+            position = bisect.bisect_right(self._visible, key(row), key=key)
+            view_row = len(self._visible) - position if self._descending else position
+            self.beginInsertRows(QModelIndex(), view_row, view_row)
+            self._visible.insert(position, row)
+            self.endInsertRows()
+
+    def set_os(self, ip: str, os_name: str):
+        """更新某台主机所有行的操作系统列（按操作系统过滤时，新结果在下次过滤时生效）"""
+        rows = self._hosts.get(ip)
+        if not rows:
+            return
+        for row in rows:
+            row[OS] = os_name
+        if self._sort_column == 3:
+            # 按操作系统排序时重新排序以保持顺序
+            self.layoutAboutToBeChanged.emit()
+            self._resort()
+            self.layoutChanged.emit()
+        elif self._visible:
+            self.dataChanged.emit(self.index(0, 3), self.index(len(self._visible) - 1, 3), [Qt.DisplayRole])
+
+    def host_count(self) -> int:
+        return len(self._hosts)
+
+    def total_rows(self) -> int:
+        return len(self._rows)
+
+
+class ResultTable(QWidget):
+    """过滤框 + 结果表 + 计数，供“端口与服务”标签页使用"""
+
+    ROW_HEIGHT = 22
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.model = ResultTableModel(self)
+
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("过滤：10.0.1 / port:22 / service:http / os:linux，多个条件用空格分隔")
+        self.filter_input.returnPressed.connect(self.apply_filter)
+        self.count_label = QLabel("")
+
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setSortingEnabled(True)
+        self.view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.view.horizontalHeader().setStretchLastSection(True)
+        # 固定行高，视图不必为计算行高访问不可见的行
+        self.view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.view.verticalHeader().setDefaultSectionSize(self.ROW_HEIGHT)
+        self.view.verticalHeader().hide()
+        self.view.setSelectionBehavior(QTableView.SelectRows)
+        self.view.setAlternatingRowColors(True)
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(self.filter_input)
+        filter_layout.addWidget(self.count_label)
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(filter_layout)
+        layout.addWidget(self.view)
+        self.setLayout(layout)
+
+        self.model.modelReset.connect(self.update_count)
+
+    def apply_filter(self):
+        self.model.set_filter(parse_filter(self.filter_input.text()))
+
+    def append_results(self, results: Iterable[Dict]):
+        self.model.append_results(results)
+        self.update_count()
+
+    def set_os(self, ip: str, os_name: str):
+        self.model.set_os(ip, os_name)
+
+    def clear(self):
+        self.model.clear()
+
+    def update_count(self, *args):
+        shown, total = self.model.rowCount(), self.model.total_rows()
+        text = f"{self.model.host_count()} 台主机，{total} 行"
+        if shown != total:
+            text += f"（显示 {shown} 行）"
+        self.count_label.setText(text)